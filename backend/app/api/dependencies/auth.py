@@ -5,10 +5,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.config import SECRET_KEY, API_PREFIX
-from app.models.user import UserInDB
+from app.models.user import UserInDB, UserAuth
 from app.api.dependencies.database import get_repository
 from app.db.repositories.users import UsersRepository
-from app.services import auth_service
+from app.services import auth_service, auth_users_service
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{API_PREFIX}/users/login/token/")
@@ -32,12 +32,38 @@ async def get_user_from_token(
 
     return user
 
-async def get_user_from_token_optional(
+async def get_user_auth_by_id(*, userid: int, user_repo: UsersRepository) -> Optional[UserAuth]:
+    user = auth_users_service.get(userid)
+    if not user:
+        user = await user_repo.get_user_auth_by_id(userid=userid)
+        if user:
+            auth_users_service.set(user)
+    return user
+
+async def get_user_auth_from_token(
+    *,
+    token: str = Depends(oauth2_scheme),
+    user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
+    token_type: str = 'bearer'
+) -> Optional[UserAuth]:
+    try:
+        userid = auth_service.get_userid_from_token(
+                token=token, 
+                secret_key=str(SECRET_KEY),
+                token_type=token_type,)
+        user = await get_user_auth_by_id(userid=userid, user_repo=user_repo)
+    except Exception as e:
+        logging.exception(e)
+        raise e
+
+    return user
+
+async def get_user_auth_from_token_optional(
     *,
     token: Optional[str] = Depends(oauth2_scheme_optional),
     user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
     token_type: str = 'bearer'
-) -> Optional[UserInDB]:
+) -> Optional[UserAuth]:
     user = None
     if token:
         try:
@@ -45,7 +71,7 @@ async def get_user_from_token_optional(
                     token=token, 
                     secret_key=str(SECRET_KEY),
                     token_type=token_type,)
-            user = await user_repo.get_user_by_id(userid=userid)
+            user = await get_user_auth_by_id(userid=userid, user_repo=user_repo)
         except Exception as e:
             logging.exception(e)
 
@@ -55,7 +81,7 @@ async def get_user_from_token_optional(
 
 def get_current_active_user(
     token_type: str = 'bearer',
-    current_user: UserInDB = Depends(get_user_from_token)) -> Optional[UserInDB]:
+    current_user: UserAuth = Depends(get_user_auth_from_token)) -> Optional[UserAuth]:
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
@@ -67,7 +93,19 @@ def get_current_active_user(
 
 def get_current_optional_user(
     token_type: str = 'bearer',
-    current_user: Optional[UserInDB] = Depends(get_user_from_token_optional)) -> Optional[UserInDB]:
+    current_user: Optional[UserAuth] = Depends(get_user_auth_from_token_optional)) -> Optional[UserAuth]:
+
+    return current_user
+
+def get_current_full_user(
+    token_type: str = 'bearer',
+    current_user: UserInDB = Depends(get_user_from_token)) -> Optional[UserInDB]:
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, 
+            detail="No authenticated user.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
     return current_user
 
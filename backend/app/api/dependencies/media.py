@@ -4,11 +4,11 @@ from app.api.dependencies.database import get_repository
 from app.api.dependencies.auth import get_current_active_user
 from app.db.repositories.media import MediaRepository
 from app.models.media import MediaInDB
-from app.models.user import UserInDB
+from app.models.user import UserAuth
 
 
 async def get_media_for_update(media_id: int, 
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
     media_repo: MediaRepository = Depends(get_repository(MediaRepository))) -> MediaInDB:
 
     media = await media_repo.get_media_by_id(id=media_id)
@@ -5,7 +5,7 @@ from app.api.dependencies.database import get_repository
 from app.api.dependencies.auth import get_current_optional_user, get_current_active_user
 from app.db.repositories.posts import PostsRepository
 from app.models.post import PostInDB, PostVisibility
-from app.models.user import UserInDB
+from app.models.user import UserAuth
 
 
 async def get_post_by_id(post_id: int, 
@@ -23,7 +23,7 @@ async def get_post_by_id(post_id: int,
 
 def get_post_for_update(post_id: int, 
     post: PostInDB = Depends(get_post_by_id),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
     posts_repo: PostsRepository = Depends(get_repository(PostsRepository))) -> Optional[PostInDB]:
 
     if int(post.user_id) != int(current_user.id) and not current_user.is_admin:
@@ -35,7 +35,7 @@ def get_post_for_update(post_id: int,
     return post
 
 def get_visibility_level(user_id: Optional[int] = None, 
-    current_user: Optional[UserInDB] = Depends(get_current_optional_user)) -> PostVisibility:
+    current_user: Optional[UserAuth] = Depends(get_current_optional_user)) -> PostVisibility:
     if not current_user:
         return PostVisibility.everybody
 
@@ -46,7 +46,7 @@ def get_visibility_level(user_id: Optional[int] = None,
 
 async def get_post_for_view(post_id: int, 
     post: PostInDB = Depends(get_post_by_id),
-	current_user: Optional[UserInDB] = Depends(get_current_optional_user),
+	current_user: Optional[UserAuth] = Depends(get_current_optional_user),
     ) -> PostInDB:
 
     if get_visibility_level(post.user_id, current_user) > post.visibility:
@@ -4,11 +4,12 @@ from app.api.dependencies.database import get_repository
 from app.api.dependencies.auth import get_current_active_user
 from app.db.repositories.qso_logs import QsoLogsRepository
 from app.models.qso_log import QsoLogInDB
-from app.models.user import UserInDB
+from app.models.user import UserAuth
+from app.services import qso_log_owners_service
 
 
 async def get_qso_log_for_update(log_id: int, 
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
     qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository))) -> QsoLogInDB:
 
     log = await qso_logs_repo.get_log_by_id(id=log_id)
@@ -19,6 +20,8 @@ async def get_qso_log_for_update(log_id: int,
             detail="Qso log not found"
         )
 
+    qso_log_owners_service.set(log.id, log.user_id)
+
     if int(log.user_id) != int(current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -27,3 +30,23 @@ async def get_qso_log_for_update(log_id: int,
 
     return log
 
+async def check_qso_log_owner(log_id: int, 
+	current_user: UserAuth = Depends(get_current_active_user),
+    qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository))) -> int:
+
+    user_id = await qso_log_owners_service.get_owner(log_id=log_id, qso_logs_repo=qso_logs_repo)
+
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Qso log not found"
+        )
+
+    if int(user_id) != int(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Permission denied"
+        )
+
+    return log_id
+
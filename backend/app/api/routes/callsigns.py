@@ -1,29 +1,23 @@
 from typing import List
 
 from pydantic import constr
-from fastapi import APIRouter, HTTPException, Depends
-from starlette.status import HTTP_404_NOT_FOUND
+from fastapi import APIRouter, HTTPException, Depends, Query
+from starlette.status import HTTP_404_NOT_FOUND, HTTP_403_FORBIDDEN
 
 from app.services import callsigns_autocomplete_service
 from app.services import qrz_client_service
 from app.api.dependencies.auth import get_current_active_user
 from app.models.core import Callsign
-from app.models.user import UserInDB
+from app.models.user import UserAuth
+from app.utils.callsigns_index import TOP_K
 
 router = APIRouter()
 
 @router.get("/autocomplete/{start}", response_model=List[str], name="callsigns:autocomplete")
 async def callsigns_autocomplete(*, 
     start: constr(to_upper=True),
-    limit: int = 20) -> List[str]:
-    suggestions = []
-    try:
-        for callsign in callsigns_autocomplete_service.find_all(start):
-            suggestions.append(callsign[0])
-            if len(suggestions) == limit:
-                break
-    except StopIteration:
-        pass
+    limit: int = Query(TOP_K, ge=1, le=TOP_K)) -> List[str]:
+    suggestions = [callsign for callsign, _ in callsigns_autocomplete_service.top(start, limit)]
 
     if not suggestions:
         raise HTTPException(
@@ -34,9 +28,20 @@ async def callsigns_autocomplete(*,
     return suggestions
 
 
+@router.get("/metrics/autocomplete", response_model=dict, name="callsigns:autocomplete-metrics")
+async def callsigns_autocomplete_metrics(*,
+    current_user: UserAuth = Depends(get_current_active_user)) -> dict:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=HTTP_403_FORBIDDEN,
+            detail="Permission denied"
+        )
+
+    return callsigns_autocomplete_service.metrics()
+
 @router.get("/qrz/{callsign}", response_model=dict, name="callsigns:qrz-lookup")
 async def callsigns_qrz_lookup(*, 
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
     callsign: Callsign) -> dict:
 
     lookup_data = await qrz_client_service.lookup(callsign.lower())
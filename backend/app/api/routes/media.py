@@ -11,7 +11,7 @@ from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
 from app.api.dependencies.media import get_media_for_update
 from app.models.media import MediaUpload, MediaInDB, MediaPublic, MediaType
-from app.models.user import UserInDB
+from app.models.user import UserAuth
 from app.db.repositories.media import MediaRepository, mediaPublicFromDB
 from app.services.static_files import get_url_by_path
 
@@ -23,7 +23,7 @@ router = APIRouter()
 async def upload_media(*,
     media_type: MediaType = Form(...),
     file: UploadFile = File(...),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	media_repo: MediaRepository = Depends(get_repository(MediaRepository)),    
 ) -> MediaPublic:
 
@@ -44,7 +44,7 @@ async def upload_media(*,
 @router.delete("/{media_id}", response_model=dict, name="media:delete")
 async def delete_media(*,
     media_id: int,
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	media_repo: MediaRepository = Depends(get_repository(MediaRepository)),    
     media: MediaInDB = Depends(get_media_for_update)
 ) -> dict:
@@ -11,7 +11,7 @@ from app.api.dependencies.database import get_repository
 from app.api.dependencies.posts import get_post_for_update, get_post_for_view, get_visibility_level
 from app.api.dependencies.media import get_media_for_update
 from app.models.post import PostBase, PostUpdate, PostInDB, PostPublic, PostVisibility, PostType
-from app.models.user import UserInDB
+from app.models.user import UserAuth
 from app.db.repositories.posts import PostsRepository
 from app.db.repositories.media import MediaRepository
 
@@ -20,7 +20,7 @@ router = APIRouter()
 async def update_post_images(*,
     post_update: PostUpdate,
     post_id: int,
-    current_user: UserInDB,
+    current_user: UserAuth,
     media_repo: MediaRepository) -> None:
 
     for media_id in post_update.post_images:
@@ -34,7 +34,7 @@ async def update_post_images(*,
 @router.post("/", response_model=PostPublic, name="posts:create-post")
 async def create_post(*,
     new_post: PostUpdate = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	posts_repo: PostsRepository = Depends(get_repository(PostsRepository)),    
     media_repo: MediaRepository = Depends(get_repository(MediaRepository)),
 ) -> PostPublic:
@@ -54,7 +54,7 @@ async def create_post(*,
 @router.delete("/{post_id}", response_model=dict, name="posts:delete-post")
 async def delete_post(*,
     post_id: int,
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	posts_repo: PostsRepository = Depends(get_repository(PostsRepository)),    
     post: PostInDB = Depends(get_post_for_update)
 ) -> dict:
@@ -66,7 +66,7 @@ async def delete_post(*,
 @router.put("/{post_id}", response_model=PostPublic, name="posts:update-post")
 async def update_post(*,
     post_update: PostUpdate = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	posts_repo: PostsRepository = Depends(get_repository(PostsRepository)),    
     media_repo: MediaRepository = Depends(get_repository(MediaRepository)),
     post: PostInDB = Depends(get_post_for_update)
@@ -115,7 +115,7 @@ async def posts_site(*,
 @router.get("/{post_id}", response_model=PostPublic, name="posts:query-by-post-id")
 async def post_by_id(*,
     post_id: int,
-	current_user: Optional[UserInDB] = Depends(get_current_optional_user),
+	current_user: Optional[UserAuth] = Depends(get_current_optional_user),
     post: PostInDB = Depends(get_post_for_view)
 ) -> PostPublic:
 
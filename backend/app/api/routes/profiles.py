@@ -3,7 +3,7 @@ from pydantic import constr
 
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
-from app.models.user import UserCreate, UserInDB, UserPublic
+from app.models.user import UserCreate, UserAuth, UserPublic
 from app.models.core import Callsign, CallsignModel
 from app.models.profile import ProfileUpdate, ProfilePublic
 from app.db.repositories.profiles import ProfilesRepository
@@ -34,7 +34,7 @@ async def get_profile_by_callsign(*,
 @router.put("/me/", response_model=ProfilePublic, name="profiles:update-own-profile")
 async def update_own_profile(
 	profile_update: ProfileUpdate = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	profiles_repo: ProfilesRepository = Depends(get_repository(ProfilesRepository)),    
 ) -> ProfilePublic:
 	updated_profile = await profiles_repo.update_profile(profile_update=profile_update, requesting_user=current_user)
@@ -1,28 +1,35 @@
 from typing import List, Optional
-
-import logging
+from datetime import datetime, date
 
 from pydantic import constr
-from fastapi import Depends, APIRouter, HTTPException, Path, Body, Form, status, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import (Depends, APIRouter, HTTPException, Path, Body, Form, Query, status, UploadFile, File, 
+        Request, Response)
+from fastapi.responses import StreamingResponse, FileResponse
 from starlette.status import (
+        HTTP_304_NOT_MODIFIED, 
         HTTP_400_BAD_REQUEST, 
         HTTP_401_UNAUTHORIZED, 
-        HTTP_404_NOT_FOUND )
+        HTTP_404_NOT_FOUND,
+        HTTP_422_UNPROCESSABLE_ENTITY,
+        HTTP_503_SERVICE_UNAVAILABLE )
 
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
-from app.api.dependencies.qso_logs import get_qso_log_for_update
+from app.api.dependencies.qso_logs import check_qso_log_owner
 from app.api.dependencies.qso import get_qso_for_update
-from app.models.qso_log import QsoLogInDB
-from app.models.qso import QsoBase, QsoInDB, QsoUpdate, QsoPublic, Band, QsoMode, QsoFilter
-from app.models.user import UserInDB
+from app.models.task import TaskBase
+from app.models.qso import (QsoBase, QsoInDB, QsoUpdate, QsoPublic, Band, QsoMode, QsoFilter, QsoOrder, 
+        AdifExportFormat, AdifFieldName, QsoChangesFormat, QsoChange, QsoChanges)
+from app.models.user import UserAuth
 from app.models.core import FullCallsign
-from app.db.repositories.qso import QsoRepository, DuplicateQsoError  
+from app.db.repositories.qso import (QsoRepository, DuplicateQsoError, QsoLogNotFoundError, 
+        InvalidQsoCursorError, create_qso_cursor, create_qso_changes_cursor)
 from app.db.repositories.qso_logs import QsoLogsRepository
-from app.utils.adif import create_adif
-
-import logging
+from app.services import qso_dupes_service, qso_log_owners_service, adif_export_cache, qso_events_service
+from app.services.qso_events import QsoEventsSubscribersLimitError
+from app.utils.adif import create_adif, create_adif_changes, gzip_adif, adif_export_fields
+from app.celery.worker import task_adif_export
+from app.core.config import QSO_EVENTS_KEEPALIVE
 
 router = APIRouter()
 
@@ -32,21 +39,46 @@ async def write_qso(*, qso_repo: QsoRepository,
         qso_update: QsoUpdate = None) -> QsoPublic:
 
     try:
-        qso_from_db = (await qso_repo.update_qso(qso=qso, qso_update=qso_update) if qso_update
-                else await qso_repo.create_qso(new_qso=qso, log_id=log_id))
-        return QsoPublic(**qso_from_db.dict())
+        if qso_update:
+            qso_from_db = await qso_repo.update_qso(qso=qso, qso_update=qso_update)
+            dupes_index = qso_dupes_service.loaded(qso.log_id)
+            if dupes_index:
+                dupes_index.remove(**qso.dict(include={"callsign", "band", "qso_mode", "qso_datetime"}))
+        else:
+            if await qso_dupes_service.is_dupe(log_id=log_id, qso_repo=qso_repo, 
+                    **qso.dict(include={"callsign", "band", "qso_mode", "qso_datetime"})):
+                raise DuplicateQsoError()
+            qso_from_db = await qso_repo.create_qso(new_qso=qso, log_id=log_id)
+            dupes_index = qso_dupes_service.loaded(log_id)
+        if dupes_index:
+            dupes_index.add(**qso_from_db.dict(include={"callsign", "band", "qso_mode", "qso_datetime"}))
+        qso_public = QsoPublic(**qso_from_db.dict())
+        await qso_repo.notify_qso_event(payload=qso_events_service.event_payload(
+            event="update_qso" if qso_update else "create_qso",
+            log_id=qso_from_db.log_id,
+            qso_id=qso_from_db.id,
+            qso=qso_public.json()))
+        return qso_public
     except DuplicateQsoError:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
             detail="The QSO is already in this log."
         )
+    except QsoLogNotFoundError:
+        #the owner of a log deleted by another worker was still cached
+        qso_log_owners_service.drop(log_id)
+        qso_dupes_service.drop(log_id)
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Qso log not found"
+        )
 
 @router.post("/logs/{log_id}", response_model=QsoPublic, name="qso:create-qso")
 async def create_qso(*,
     log_id: int,
     new_qso: QsoBase = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
-    qso_log: QsoLogInDB = Depends(get_qso_log_for_update),
+	current_user: UserAuth = Depends(get_current_active_user),
+    qso_log_id: int = Depends(check_qso_log_owner),
     qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),    
 ) -> QsoPublic:
 
@@ -55,19 +87,24 @@ async def create_qso(*,
 @router.delete("/{qso_id}", response_model=dict, name="qso:delete-qso")
 async def delete_qso(*,
     qso_id: int,
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),    
     qso_log: QsoInDB = Depends(get_qso_for_update)
 ) -> dict:
 
     await qso_repo.delete_qso(id=qso_id)
+    dupes_index = qso_dupes_service.loaded(qso_log.log_id)
+    if dupes_index:
+        dupes_index.remove(**qso_log.dict(include={"callsign", "band", "qso_mode", "qso_datetime"}))
+    await qso_repo.notify_qso_event(payload=qso_events_service.event_payload(
+        event="delete_qso", log_id=qso_log.log_id, qso_id=qso_id))
 
     return {"result": "Ok"}
 
 @router.put("/{qso_id}", response_model=QsoPublic, name="qso:update-qso")
 async def update_qso(*,
     qso_update: QsoUpdate = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),    
     qso: QsoInDB = Depends(get_qso_for_update)
 ) -> QsoPublic:
@@ -77,24 +114,43 @@ async def update_qso(*,
 @router.get("/logs/{log_id}/qso", response_model=List[QsoPublic], name="qso:query-by-log")
 async def qso_query_by_log(*,
     log_id: int,
+    response: Response,
 	qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),
     callsign_search: Optional[constr(to_upper=True, min_length=2)] = None,
     band: Optional[Band] = None,
     qso_mode: Optional[QsoMode] = None, 
+    date_begin: Optional[date] = None,
+    date_end: Optional[date] = None,
+    order_by: QsoOrder = QsoOrder.id,
+    cursor: Optional[str] = None,
     limit: Optional[int] = 50,
     offset: Optional[int] = None
 ) -> List[QsoPublic]:
 
-    if callsign_search:
-        callsign_search = callsign_search.replace('*', '%')
-        logging.warning(callsign_search)
-    qso = await qso_repo.get_qso_by_log_id(
-            log_id=log_id, 
-            callsign_search=callsign_search, 
-            band=band, 
-            qso_mode=qso_mode,
-            limit=limit,
-            offset=offset)
+    if cursor and offset:
+        #the cursor replaces offset, skipping rows after it would scan them again
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Cursor and offset can't be used together"
+        )
+
+    try:
+        qso = await qso_repo.get_qso_by_log_id(
+                log_id=log_id, 
+                callsign_search=callsign_search, 
+                band=band, 
+                qso_mode=qso_mode,
+                date_begin=date_begin,
+                date_end=date_end,
+                order_by=order_by,
+                cursor=cursor,
+                limit=limit,
+                offset=offset)
+    except InvalidQsoCursorError:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
 
     if not qso:
         raise HTTPException(
@@ -102,6 +158,11 @@ async def qso_query_by_log(*,
             detail="Qso not found"
         )
 
+    #the next page is requested with this cursor instead of offset,
+    #it's sent in a header to keep the response a list of qso
+    if limit and len(qso) == limit:
+        response.headers["X-Next-Cursor"] = create_qso_cursor(qso=qso[-1], order_by=order_by)
+
     return [QsoPublic(**qso.dict()) for qso in qso]
 
 @router.get("/logs/{log_id}/callsigns/{callsign_start}", 
@@ -123,21 +184,168 @@ async def callsigns_query_by_log(*,
 
     return callsigns
 
+@router.get("/logs/{log_id}/dupe-check", response_model=dict, name="qso:dupe-check")
+async def qso_dupe_check(*,
+    log_id: int,
+    callsign: FullCallsign,
+    band: Band,
+    qso_mode: QsoMode,
+    qso_datetime: datetime,
+	current_user: UserAuth = Depends(get_current_active_user),
+    qso_log_id: int = Depends(check_qso_log_owner),
+	qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),
+) -> dict:
+
+    return {"dupe": await qso_dupes_service.is_dupe(
+        log_id=log_id,
+        qso_repo=qso_repo,
+        callsign=callsign, 
+        band=band, 
+        qso_mode=qso_mode, 
+        qso_datetime=qso_datetime)}
+
+ADIF_EXPORT_MEDIA_TYPES = {
+    AdifExportFormat.adi: "text/adi",
+    AdifExportFormat.adi_gz: "application/gzip",
+}
+
 @router.post("/logs/{log_id}/adif", response_class=StreamingResponse, name="qso:export-adif")
 async def adif_export(*,
     log_id: int,
+    request: Request,
     qso_filter: Optional[QsoFilter] = Body(..., embed=True),
+    fields: Optional[List[AdifFieldName]] = Body(None, embed=True),
+    export_format: AdifExportFormat = Query(AdifExportFormat.adi, alias="format"),
 	qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),
-) -> StreamingResponse:
+	qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository)),
+) -> Response:
 
-    log_iter = qso_repo.qso_log_iterator(log_id=log_id, qso_filter=qso_filter)
-    adif_iter = create_adif(log_iter)
+    export_settings = await qso_logs_repo.get_log_export_settings(id=log_id)
+    if not export_settings:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Qso log not found"
+        )
+    version, log_extra_fields = export_settings
+    extra_fields = adif_export_fields(fields, log_extra_fields)
+
+    key = adif_export_cache.key(log_id=log_id, version=version, 
+            qso_filter=qso_filter, export_format=export_format, extra_fields=extra_fields)
+    etag = f'"{key}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == '*' or 
+            etag in (tag.strip() for tag in if_none_match.split(','))):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    headers = {
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename={log_id}.{export_format}",
+    }
+    media_type = ADIF_EXPORT_MEDIA_TYPES[export_format]
+
+    cached_path = adif_export_cache.get(key=key, export_format=export_format)
+    if cached_path:
+        return FileResponse(cached_path, media_type=media_type, headers=headers)
+
+    qso_batches = qso_repo.qso_log_batches(log_id=log_id, qso_filter=qso_filter, extra_fields=extra_fields)
+    adif_iter = create_adif(qso_batches, extra_fields=extra_fields)
+    if export_format == AdifExportFormat.adi_gz:
+        adif_iter = gzip_adif(adif_iter)
+
+    async def is_current() -> bool:
+        return await qso_logs_repo.get_log_version(id=log_id) == version
+
+    return StreamingResponse(
+            adif_export_cache.store(key=key, export_format=export_format, 
+                chunks=adif_iter, is_current=is_current), 
+            media_type=media_type,
+            headers=headers)
+
+
+@router.post("/logs/{log_id}/adif/task", response_model=TaskBase, name="qso:export-adif-task")
+async def adif_export_task(*,
+    log_id: int,
+    qso_filter: Optional[QsoFilter] = Body(..., embed=True),
+    fields: Optional[List[AdifFieldName]] = Body(None, embed=True),
+    export_format: AdifExportFormat = Query(AdifExportFormat.adi, alias="format"),
+	current_user: UserAuth = Depends(get_current_active_user),
+    qso_log_id: int = Depends(check_qso_log_owner),
+) -> TaskBase:
+
+    task = task_adif_export.delay(log_id=log_id, qso_filter=qso_filter, fields=fields, 
+            export_format=export_format)
+    return TaskBase(id=task.id)
+
+@router.get("/logs/{log_id}/changes", response_model=QsoChanges, name="qso:changes-since")
+async def qso_changes_since(*,
+    log_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    changes_format: QsoChangesFormat = Query(QsoChangesFormat.json, alias="format"),
+	qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),
+) -> QsoChanges:
+
+    try:
+        changes = await qso_repo.get_qso_changes(log_id=log_id, cursor=cursor, limit=limit)
+    except InvalidQsoCursorError:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    #the client keeps the cursor for the next sync, it doesn't move when there are no changes
+    next_cursor = create_qso_changes_cursor(change=changes[-1]) if changes else cursor
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    if changes_format == QsoChangesFormat.adi:
+        return Response(content=create_adif_changes(changes), media_type="text/adi", headers=headers)
+
+    response.headers.update(headers)
+    return QsoChanges(
+            changes=[QsoChange(
+                id=change["id"], 
+                deleted=change["deleted"], 
+                changed_at=change["changed_at"],
+                qso=None if change["deleted"] else QsoPublic(**change))
+                for change in changes],
+            cursor=next_cursor)
+
+@router.get("/logs/{log_id}/events", response_class=StreamingResponse, name="qso:events")
+async def qso_events(*,
+    log_id: int,
+	qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository)),
+) -> StreamingResponse:
+    """
+    Server-sent events stream of create_qso, update_qso and delete_qso events of the log.
+    The ready event comes once the stream is subscribed: the client loads the qso
+    after it and applies the events on top, on reconnect qso:changes-since fills the gap.
+    """
 
-    response = StreamingResponse(adif_iter, media_type="text/adi")
-    response.headers["Content-Disposition"] = f"attachment; filename={log_id}.adi"
+    if await qso_logs_repo.get_log_version(id=log_id) is None:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Qso log not found"
+        )
 
-    return response
+    if qso_events_service.is_full(log_id):
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many qso events subscribers"
+        )
 
+    async def stream():
+        try:
+            async with qso_events_service.subscribe(log_id) as subscription:
+                yield f"event: ready\ndata: {{\"log_id\": \"{log_id}\"}}\n\n"
+                async for message in qso_events_service.messages(subscription, QSO_EVENTS_KEEPALIVE):
+                    yield message or ": keepalive\n\n"
+        except QsoEventsSubscribersLimitError:
+            #filled up after the check above: the stream ends before the ready event
+            return
+
+    return StreamingResponse(stream(), media_type="text/event-stream", 
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/{qso_id}", response_model=QsoPublic, name="qso:query-by-id")
 async def qso_by_id(*,
@@ -1,4 +1,5 @@
 from typing import List
+import asyncio
 import json
 
 from fastapi import Depends, APIRouter, HTTPException, Path, Body, Form, status, UploadFile, File
@@ -10,10 +11,11 @@ from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
 from app.api.dependencies.qso_logs import get_qso_log_for_update
 from app.models.qso_log import QsoLogBase, QsoLogInDB, QsoLogPublic
-from app.models.user import UserInDB
+from app.models.user import UserAuth
 from app.models.core import FileType
 from app.models.task import TaskBase
 from app.services.static_files import save_file, full_path
+from app.services import qso_dupes_service, qso_log_owners_service, adif_export_cache
 from app.celery.worker import task_adif_import
 from app.db.repositories.qso_logs import QsoLogsRepository
 
@@ -27,7 +29,7 @@ router = APIRouter()
 @router.post("/", response_model=QsoLogPublic, name="qso-logs:create-log")
 async def create_qso_log(*,
     new_log: QsoLogBase = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository)),    
 ) -> QsoLogPublic:
 
@@ -38,19 +40,22 @@ async def create_qso_log(*,
 @router.delete("/{log_id}", response_model=dict, name="qso-logs:delete-log")
 async def delete_qso_log(*,
     log_id: int,
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository)),    
     qso_log: QsoLogInDB = Depends(get_qso_log_for_update)
 ) -> dict:
 
     await qso_logs_repo.delete_log(id=log_id)
+    qso_dupes_service.drop(log_id)
+    qso_log_owners_service.drop(log_id)
+    await asyncio.to_thread(adif_export_cache.drop, log_id)
 
     return {"result": "Ok"}
 
 @router.put("/{log_id}", response_model=QsoLogPublic, name="qso-logs:update-log")
 async def update_qso_log(*,
     log_update: QsoLogBase = Body(..., embed=True),
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository)),    
     qso_log: QsoLogInDB = Depends(get_qso_log_for_update)
 ) -> QsoLogPublic:
@@ -61,7 +66,7 @@ async def update_qso_log(*,
 
 @router.put("/{log_id}/adif", response_model=TaskBase, name="qso-logs:adif-import")
 async def adif_import(*,
-	current_user: UserInDB = Depends(get_current_active_user),
+	current_user: UserAuth = Depends(get_current_active_user),
 	qso_logs_repo: QsoLogsRepository = Depends(get_repository(QsoLogsRepository)),    
     qso_repo: QsoRepository = Depends(get_repository(QsoRepository)),    
     qso_log: QsoLogInDB = Depends(get_qso_log_for_update),
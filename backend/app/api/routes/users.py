@@ -5,6 +5,7 @@ from starlette.status import (
     HTTP_201_CREATED, 
     HTTP_400_BAD_REQUEST, 
     HTTP_401_UNAUTHORIZED, 
+    HTTP_403_FORBIDDEN, 
     HTTP_404_NOT_FOUND, 
     HTTP_422_UNPROCESSABLE_ENTITY,
 )
@@ -13,10 +14,10 @@ from pydantic import EmailStr, constr
 from aiosmtplib.errors import SMTPRecipientsRefused
 
 from app.api.dependencies.database import get_repository
-from app.api.dependencies.auth import get_current_active_user, get_user_from_token
-from app.models.user import UserCreate, UserInDB, UserPublic, UserPasswordReset
+from app.api.dependencies.auth import get_current_full_user, get_current_active_user
+from app.models.user import UserCreate, UserInDB, UserPublic, UserPasswordReset, UserAuth
 from app.models.token import AccessToken
-from app.services import auth_service, email_service, html_templates_service
+from app.services import auth_service, email_service, html_templates_service, password_hashing_service
 from app.db.repositories.users import UsersRepository
 from app.core.config import SRV_URI, API_PREFIX, TEMPORARY_TOKEN_EXPIRE_MINUTES
 
@@ -63,12 +64,25 @@ async def user_login_with_email_and_password(
             token_type="bearer")
     return access_token
 
+@router.get("/login/metrics", response_model=dict, name="users:login-metrics")
+async def login_metrics(current_user: UserAuth = Depends(get_current_active_user)) -> dict:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=HTTP_403_FORBIDDEN,
+            detail="Permission denied"
+        )
+
+    return {
+        "password_hashing": password_hashing_service.metrics(),
+        "token_cache": auth_service.token_cache_metrics(),
+    }
+
 @router.get("/me/", response_model=UserPublic, name="users:get-current-user")
-async def get_currently_authenticated_user(current_user: UserInDB = Depends(get_current_active_user)) -> UserPublic:
+async def get_currently_authenticated_user(current_user: UserInDB = Depends(get_current_full_user)) -> UserPublic:
     return current_user
 
 @router.get("/email_verification/request", response_model=dict, name="users:email-verification-request")
-async def email_verification_request(current_user: UserInDB = Depends(get_current_active_user)) -> dict:
+async def email_verification_request(current_user: UserInDB = Depends(get_current_full_user)) -> dict:
     await send_email_verification(user=current_user)
 
     return {'result': 'Ok'}
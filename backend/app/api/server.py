@@ -18,6 +18,7 @@ def get_application():
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
     app.add_event_handler("startup", tasks.create_start_app_handler(app))
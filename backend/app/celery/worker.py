@@ -1,17 +1,23 @@
 import time
 import asyncio
 from collections import defaultdict
-from typing import Dict
+from typing import Dict, List, Optional
 import logging
 
 from celery import Celery
 from celery.result import AsyncResult
-from app.core.config import RABBITMQ_URL, DATABASE_URL
-from app.models.task import TaskResult
+from celery.exceptions import Ignore
+from app.core.config import (RABBITMQ_URL, DATABASE_URL, ADIF_PARSE_WORKERS, ADIF_PARSE_CHUNK_SIZE, 
+        CALLSIGN_WEIGHTS_INTERVAL)
+from app.models.task import TaskResult, TaskStatus
 from app.models.qso_log import QsoLogInDB
+from app.models.qso import QsoFilter, AdifExportFormat
 from app.db.tasks import connect_to_db
-from app.db.repositories.qso import QsoRepository, DuplicateQsoError
-from app.utils.adif import parse_adif
+from app.db.repositories.qso import QsoRepository, QsoLogNotFoundError
+from app.db.repositories.qso_logs import QsoLogsRepository
+from app.db.repositories.callsigns import CallsignsRepository
+from app.utils.adif import parse_adif, create_adif, gzip_adif, adif_export_fields
+from app.utils.callsigns_index import write_weighted_corpus, build_snapshot, CALLSIGNS_WEIGHTED_PATH
 
 celery_app = Celery(__name__)
 celery_app.conf.broker_url = RABBITMQ_URL
@@ -20,6 +26,12 @@ celery_app.conf.task_serializer = "pickle"
 celery_app.conf.result_serializer = "pickle"
 celery_app.conf.accept_content = ["application/json", "application/x-python-serialize"]
 celery_app.conf.result_accept_content = ["application/json", "application/x-python-serialize"]
+celery_app.conf.beat_schedule = {
+    "callsign_weights": {
+        "task": "callsign_weights",
+        "schedule": CALLSIGN_WEIGHTS_INTERVAL,
+    },
+}
 
 @celery_app.task(name="test")
 def task_test(*, delay: int) -> bool:
@@ -36,21 +48,95 @@ def get_task_status(task_id: str) -> TaskResult:
 def task_adif_import(*, file_path: str, log: QsoLogInDB) -> Dict:
 
     async def _import():
-        qso_errors, qso_dupes, qso_new = defaultdict(int), 0, 0
+        qso_errors = defaultdict(int)
         db = await connect_to_db()
         qso_repository = QsoRepository(db)
-        qso_dupes, qso_new = 0, 0
-        for qso in parse_adif(file_path, log_settings=log.dict(), qso_errors=qso_errors):
-            try:
-                await qso_repository.create_qso(new_qso=qso, log_id=log.id)
-                qso_new += 1
-            except DuplicateQsoError:
-                qso_dupes += 1
-            except Exception as exc:
-                logging.exception(exc)
-                logging.error(qso.dict())
-                qso_errors['Unknown error'] += 1
+
+        qso_new, qso_dupes = await qso_repository.bulk_create_qso(
+                qsos=parse_adif(file_path, 
+                    log_settings=log.dict(), 
+                    qso_errors=qso_errors,
+                    workers=ADIF_PARSE_WORKERS,
+                    chunk_size=ADIF_PARSE_CHUNK_SIZE),
+                log_id=log.id)
 
         return {'invalid': list(qso_errors.items()), 'duplicates': qso_dupes, 'new': qso_new}
 
     return asyncio.run(_import())
+
+@celery_app.task(name="adif_export", bind=True)
+def task_adif_export(self, *, 
+        log_id: int, 
+        qso_filter: QsoFilter, 
+        fields: Optional[List[str]],
+        export_format: AdifExportFormat) -> Dict:
+    #imported here so the import worker doesn't load the services it doesn't use
+    from app.services import adif_export_cache
+    from app.services.static_files import get_url_by_path
+
+    async def _export():
+        db = await connect_to_db()
+        try:
+            qso_repository = QsoRepository(db)
+            qso_logs_repository = QsoLogsRepository(db)
+            log_with_version = await qso_logs_repository.get_log_with_version(id=log_id)
+            if not log_with_version:
+                #deleted after the task was queued: an expected failure, stored without a traceback
+                self.update_state(state=TaskStatus.FAILURE, meta=QsoLogNotFoundError("Qso log not found"))
+                raise Ignore()
+            log, version = log_with_version
+            extra_fields = adif_export_fields(fields, log.extra_fields)
+            key = adif_export_cache.key(log_id=log_id, version=version, 
+                    qso_filter=qso_filter, export_format=export_format, extra_fields=extra_fields)
+
+            if not adif_export_cache.get(key=key, export_format=export_format):
+                qso_exported = 0
+
+                async def qso_batches():
+                    nonlocal qso_exported
+                    async for qso_batch in qso_repository.qso_log_batches(log_id=log_id, 
+                            qso_filter=qso_filter, extra_fields=extra_fields):
+                        yield qso_batch
+                        qso_exported += len(qso_batch)
+                        self.update_state(state=TaskStatus.PROGRESS, 
+                                meta={'exported': qso_exported, 'total': log.qso_count})
+
+                adif_iter = create_adif(qso_batches(), extra_fields=extra_fields)
+                if export_format == AdifExportFormat.adi_gz:
+                    adif_iter = gzip_adif(adif_iter)
+
+                async def is_current() -> bool:
+                    #the result links to this file, keep it even if the log has changed since:
+                    #it's stored under the older version and the api won't serve it for the new one
+                    return True
+
+                async for _ in adif_export_cache.store(key=key, export_format=export_format, 
+                        chunks=adif_iter, is_current=is_current):
+                    pass
+        finally:
+            await db.disconnect()
+
+        return {'url': get_url_by_path(adif_export_cache.path(key=key, export_format=export_format)), 
+                'qso': log.qso_count}
+
+    return asyncio.run(_export())
+
+@celery_app.task(name="callsign_weights")
+def task_callsign_weights() -> Dict:
+    """
+    Adds the qso created since the last run to the qso counts per callsign and
+    rewrites the weighted autocomplete corpus and its snapshot
+    """
+    async def _update():
+        db = await connect_to_db()
+        callsigns_repository = CallsignsRepository(db)
+        updated = await callsigns_repository.count_new_qso()
+        weights = [row async for row in callsigns_repository.callsign_weights()]
+        await db.disconnect()
+        return updated, weights
+
+    updated, weights = asyncio.run(_update())
+    callsigns = write_weighted_corpus(weights)
+    build_snapshot(CALLSIGNS_WEIGHTED_PATH, force=True)
+    logging.info("Callsign weights: %s callsigns updated, %s in the corpus", updated, callsigns)
+    return {'updated': updated, 'callsigns': callsigns}
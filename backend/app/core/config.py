@@ -25,6 +25,7 @@ STATIC_WWW_ROOT = config("STATIC_WWW_ROOT", cast=str)
 JWT_ALGORITHM = config("JWT_ALGORITHM", cast=str, default="HS256")
 JWT_AUDIENCE = config("JWT_AUDIENCE", cast=str, default="hambook.net:auth")
 JWT_TOKEN_PREFIX = config("JWT_TOKEN_PREFIX", cast=str, default="Bearer")
+JWT_CACHE_MAX_TOKENS = config("JWT_CACHE_MAX_TOKENS", cast=int, default=10000)
 
 POSTGRES_USER = config("POSTGRES_USER", cast=str)
 POSTGRES_PASSWORD = config("POSTGRES_PASSWORD", cast=Secret)
@@ -48,3 +49,35 @@ DATABASE_URL = config(
 )
 
 RABBITMQ_URL = config("RABBITMQ_URL", cast=str)
+
+#ADIF files larger than one chunk are parsed in a process pool when workers > 1
+ADIF_PARSE_WORKERS = config("ADIF_PARSE_WORKERS", cast=int, default=1)
+ADIF_PARSE_CHUNK_SIZE = config("ADIF_PARSE_CHUNK_SIZE", cast=int, default=16 * 1024 * 1024)
+
+QSO_DUPES_INDEX_TTL = config("QSO_DUPES_INDEX_TTL", cast=int, default=15 * 60)  # seconds
+QSO_DUPES_INDEX_MAX_LOGS = config("QSO_DUPES_INDEX_MAX_LOGS", cast=int, default=100)
+
+QSO_LOG_OWNERS_TTL = config("QSO_LOG_OWNERS_TTL", cast=int, default=60)  # seconds
+QSO_LOG_OWNERS_MAX = config("QSO_LOG_OWNERS_MAX", cast=int, default=10000)
+
+AUTH_USERS_CACHE_TTL = config("AUTH_USERS_CACHE_TTL", cast=int, default=60)  # seconds
+AUTH_USERS_CACHE_MAX = config("AUTH_USERS_CACHE_MAX", cast=int, default=10000)
+
+#bcrypt runs in a thread pool, requests over the queue limit get 503
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", cast=int, default=2)
+PASSWORD_HASH_MAX_QUEUE = config("PASSWORD_HASH_MAX_QUEUE", cast=int, default=32)
+
+#rendered ADIF exports kept under STATIC_WWW_ROOT, oldest are evicted over the limit
+ADIF_EXPORT_CACHE_MAX_BYTES = config("ADIF_EXPORT_CACHE_MAX_BYTES", cast=int, default=1024 * 1024 * 1024)
+
+#events buffered per qso events subscriber, slower subscribers are disconnected
+QSO_EVENTS_QUEUE_SIZE = config("QSO_EVENTS_QUEUE_SIZE", cast=int, default=256)
+QSO_EVENTS_KEEPALIVE = config("QSO_EVENTS_KEEPALIVE", cast=int, default=15)  # seconds
+#open qso events streams per log in each api worker, more get 503
+QSO_EVENTS_MAX_SUBSCRIBERS = config("QSO_EVENTS_MAX_SUBSCRIBERS", cast=int, default=50)
+
+#autocomplete weights: qso counts per callsign are updated every interval, registered callsigns rank higher
+CALLSIGN_WEIGHTS_INTERVAL = config("CALLSIGN_WEIGHTS_INTERVAL", cast=int, default=60 * 60)  # seconds
+CALLSIGN_REGISTERED_WEIGHT = config("CALLSIGN_REGISTERED_WEIGHT", cast=int, default=100)
+#the autocomplete index is reloaded in the background when the corpus or its snapshot change
+CALLSIGNS_RELOAD_CHECK_INTERVAL = config("CALLSIGNS_RELOAD_CHECK_INTERVAL", cast=int, default=60)  # seconds
@@ -5,6 +5,7 @@ from typing import Callable
 from fastapi import FastAPI
 
 from app.db.tasks import connect_to_db, close_db_connection
+from app.services import password_hashing_service, qso_events_service
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
@@ -17,6 +18,8 @@ def create_start_app_handler(app: FastAPI) -> Callable:
 def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
         await close_db_connection(app)
+        await qso_events_service.close()
+        password_hashing_service.shutdown()
 
     return stop_app
 
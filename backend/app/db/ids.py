@@ -0,0 +1,41 @@
+from typing import List, Optional, Union
+import time
+
+from databases import Database
+from databases.core import Connection
+
+#bit layout of generate_id() from the users table migration:
+#milliseconds since ID_EPOCH_MILLIS << 23 | nextval(seq) % 1024
+ID_EPOCH_MILLIS = 1314220021721
+ID_TIME_SHIFT = 23
+#generate_id() never sets bits 10-22, ids built here always set bit 22 so they can't collide
+#with server side ids and leave 22 bits (4M ids per millisecond) for the sequence value
+ID_CLIENT_FLAG = 1 << 22
+ID_CLIENT_SEQ_MASK = ID_CLIENT_FLAG - 1
+
+RESERVE_SEQUENCE_VALUES_QUERY = """
+    SELECT nextval(cast(:seq_name as regclass)) as value
+    FROM generate_series(1, cast(:count as integer));
+"""
+
+def make_id(seq_value: int, now_millis: Optional[int] = None) -> int:
+    if now_millis is None:
+        now_millis = time.time_ns() // 1_000_000
+    return ((now_millis - ID_EPOCH_MILLIS) << ID_TIME_SHIFT) | ID_CLIENT_FLAG | (seq_value & ID_CLIENT_SEQ_MASK)
+
+class IdAllocator:
+    """
+    Builds ids for bulk inserts client side: sequence values are reserved
+    in one round trip per batch instead of one generate_id() call per row.
+    """
+
+    def __init__(self, seq_name: str):
+        self.seq_name = seq_name
+
+    async def reserve(self, db: Union[Database, Connection], count: int) -> List[int]:
+        if count <= 0:
+            return []
+        seq_values = await db.fetch_all(query=RESERVE_SEQUENCE_VALUES_QUERY, 
+                values={"seq_name": self.seq_name, "count": count})
+        now_millis = time.time_ns() // 1_000_000
+        return [make_id(seq_value["value"], now_millis) for seq_value in seq_values]
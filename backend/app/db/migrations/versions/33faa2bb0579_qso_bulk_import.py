@@ -0,0 +1,56 @@
+"""qso_bulk_import
+
+Revision ID: 33faa2bb0579
+Revises: f7952f921ad1
+Create Date: 2026-10-18 09:12:40.514221
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '33faa2bb0579'
+down_revision = 'f7952f921ad1'
+branch_labels = None
+depends_on = None
+
+CHECK_QSO_DUPES_FUNCTION = """
+        CREATE OR REPLACE FUNCTION check_qso_dupes()
+            RETURNS TRIGGER AS
+        $BODY$
+        BEGIN
+          {bulk_bypass}
+          if exists (select from qso 
+                where qso.callsign = new.callsign and 
+                    qso.log_id = new.log_id and 
+                    qso.id <> new.id and 
+                    qso.qso_mode = new.qso_mode and 
+                    qso.band = new.band and 
+                    qso.qso_datetime > new.qso_datetime - interval '5 minutes' and 
+                    qso.qso_datetime < new.qso_datetime + interval '5 minutes')
+          then
+              raise exception using
+                    errcode='HB001',
+                    message='The QSO is already in this log.';
+          end if;
+          RETURN NEW;
+        END;
+        $BODY$ language 'plpgsql';
+"""
+
+#bulk imports check dupes set based before the insert and switch the trigger off for their transaction
+BULK_BYPASS = """
+          if current_setting('hambook.skip_qso_dupes_check', true) = 'on' then
+              RETURN NEW;
+          end if;
+"""
+
+def upgrade() -> None:
+    op.execute(sa.text(CHECK_QSO_DUPES_FUNCTION.format(bulk_bypass=BULK_BYPASS)))
+    op.create_index("ix_qso_log_id_dupes", "qso", ["log_id", "callsign", "band", "qso_mode", "qso_datetime"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_qso_log_id_dupes", table_name="qso")
+    op.execute(sa.text(CHECK_QSO_DUPES_FUNCTION.format(bulk_bypass="")))
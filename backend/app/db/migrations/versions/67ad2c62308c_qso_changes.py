@@ -0,0 +1,67 @@
+"""qso_changes
+
+Revision ID: 67ad2c62308c
+Revises: 7225006edbc7
+Create Date: 2026-10-18 18:40:12.771305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '67ad2c62308c'
+down_revision = '7225006edbc7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_qso_log_id_updated_at_id", "qso", ["log_id", "updated_at", "id"])
+
+    op.create_table(
+        "qso_tombstones",
+        sa.Column("id", sa.BigInteger, primary_key=True, autoincrement=False),
+        sa.Column("log_id", sa.BigInteger, sa.ForeignKey("qso_logs.id", ondelete="CASCADE"), 
+            nullable=False),
+        sa.Column("deleted_at", sa.TIMESTAMP(timezone=True), nullable=False, 
+            server_default=sa.func.now()),
+    )
+    op.create_index("ix_qso_tombstones_log_id_deleted_at_id", "qso_tombstones", 
+            ["log_id", "deleted_at", "id"])
+
+    #qso deleted with their log are not recorded, the log row is already gone at that point
+    op.execute(sa.text(
+        """
+        CREATE OR REPLACE FUNCTION qso_tombstones_insert()
+            RETURNS TRIGGER AS
+        $BODY$
+        BEGIN
+            INSERT INTO qso_tombstones (id, log_id)
+            SELECT id, log_id
+            FROM old_qso
+            WHERE EXISTS (SELECT 1 FROM qso_logs WHERE qso_logs.id = old_qso.log_id);
+            RETURN NULL;
+        END;
+        $BODY$ language 'plpgsql';
+        """
+    ))
+
+    op.execute(
+        """
+        CREATE TRIGGER qso_tombstones_insert
+            AFTER DELETE
+            ON qso
+            REFERENCING OLD TABLE AS old_qso
+            FOR EACH STATEMENT
+        EXECUTE FUNCTION qso_tombstones_insert();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS qso_tombstones_insert ON qso;")
+    op.execute("DROP FUNCTION IF EXISTS qso_tombstones_insert;")
+    op.drop_index("ix_qso_tombstones_log_id_deleted_at_id", table_name="qso_tombstones")
+    op.drop_table("qso_tombstones")
+    op.drop_index("ix_qso_log_id_updated_at_id", table_name="qso")
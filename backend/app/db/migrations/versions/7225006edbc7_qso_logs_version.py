@@ -0,0 +1,87 @@
+"""qso_logs_version
+
+Revision ID: 7225006edbc7
+Revises: e0afad65961d
+Create Date: 2026-10-18 17:02:44.310958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '7225006edbc7'
+down_revision = 'e0afad65961d'
+branch_labels = None
+depends_on = None
+
+#the qso_logs_stats trigger functions, {version} bumps the log version on every qso write
+QSO_LOGS_STATS_FUNCTIONS = (
+    """
+    CREATE OR REPLACE FUNCTION qso_logs_stats_insert()
+        RETURNS TRIGGER AS
+    $BODY$
+    BEGIN
+        UPDATE qso_logs
+        SET {version}qso_count = qso_logs.qso_count + stats.qso_count,
+            qso_first_datetime = least(qso_logs.qso_first_datetime, stats.qso_first_datetime),
+            qso_last_datetime = greatest(qso_logs.qso_last_datetime, stats.qso_last_datetime)
+        FROM (SELECT log_id, count(*) as qso_count, 
+                min(qso_datetime) as qso_first_datetime, max(qso_datetime) as qso_last_datetime
+            FROM new_qso
+            GROUP BY log_id) as stats
+        WHERE qso_logs.id = stats.log_id;
+        RETURN NULL;
+    END;
+    $BODY$ language 'plpgsql';
+    """,
+    """
+    CREATE OR REPLACE FUNCTION qso_logs_stats_change()
+        RETURNS TRIGGER AS
+    $BODY$
+    BEGIN
+        UPDATE qso_logs
+        SET {version}qso_count = qso_logs.qso_count + changes.qso_count,
+            qso_first_datetime = (SELECT min(qso_datetime) FROM qso WHERE log_id = qso_logs.id),
+            qso_last_datetime = (SELECT max(qso_datetime) FROM qso WHERE log_id = qso_logs.id)
+        FROM (SELECT log_id, sum(qso_count) as qso_count
+            FROM (SELECT log_id, 1 as qso_count FROM new_qso
+                UNION ALL
+                SELECT log_id, -1 as qso_count FROM old_qso) as qso_changes
+            GROUP BY log_id) as changes
+        WHERE qso_logs.id = changes.log_id;
+        RETURN NULL;
+    END;
+    $BODY$ language 'plpgsql';
+    """,
+    """
+    CREATE OR REPLACE FUNCTION qso_logs_stats_delete()
+        RETURNS TRIGGER AS
+    $BODY$
+    BEGIN
+        UPDATE qso_logs
+        SET {version}qso_count = qso_logs.qso_count - stats.qso_count,
+            qso_first_datetime = (SELECT min(qso_datetime) FROM qso WHERE log_id = qso_logs.id),
+            qso_last_datetime = (SELECT max(qso_datetime) FROM qso WHERE log_id = qso_logs.id)
+        FROM (SELECT log_id, count(*) as qso_count
+            FROM old_qso
+            GROUP BY log_id) as stats
+        WHERE qso_logs.id = stats.log_id;
+        RETURN NULL;
+    END;
+    $BODY$ language 'plpgsql';
+    """,
+)
+
+
+def upgrade() -> None:
+    op.add_column("qso_logs", 
+            sa.Column("qso_version", sa.BigInteger, nullable=False, server_default=sa.text('0')))
+    for function in QSO_LOGS_STATS_FUNCTIONS:
+        op.execute(sa.text(function.format(version="qso_version = qso_logs.qso_version + 1,\n            ")))
+
+
+def downgrade() -> None:
+    for function in QSO_LOGS_STATS_FUNCTIONS:
+        op.execute(sa.text(function.format(version="")))
+    op.drop_column("qso_logs", "qso_version")
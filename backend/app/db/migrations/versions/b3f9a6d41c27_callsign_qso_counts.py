@@ -0,0 +1,41 @@
+"""callsign_qso_counts
+
+Revision ID: b3f9a6d41c27
+Revises: 67ad2c62308c
+Create Date: 2026-10-18 21:05:37.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'b3f9a6d41c27'
+down_revision = '67ad2c62308c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_qso_created_at", "qso", ["created_at"])
+
+    op.create_table(
+        "callsign_qso_counts",
+        sa.Column("callsign", sa.Text, primary_key=True),
+        sa.Column("qso_count", sa.BigInteger, nullable=False),
+    )
+
+    #one row: qso created before counted_until are in callsign_qso_counts
+    op.create_table(
+        "callsign_qso_counts_state",
+        sa.Column("id", sa.Boolean, primary_key=True, server_default=sa.true()),
+        sa.Column("counted_until", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.CheckConstraint("id", name="callsign_qso_counts_state_single_row"),
+    )
+    op.execute("INSERT INTO callsign_qso_counts_state (counted_until) VALUES ('-infinity');")
+
+
+def downgrade() -> None:
+    op.drop_table("callsign_qso_counts_state")
+    op.drop_table("callsign_qso_counts")
+    op.drop_index("ix_qso_created_at", table_name="qso")
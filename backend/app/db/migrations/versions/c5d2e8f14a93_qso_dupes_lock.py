@@ -0,0 +1,56 @@
+"""qso_dupes_lock
+
+Revision ID: c5d2e8f14a93
+Revises: b3f9a6d41c27
+Create Date: 2026-10-18 23:41:09.275318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'c5d2e8f14a93'
+down_revision = 'b3f9a6d41c27'
+branch_labels = None
+depends_on = None
+
+CHECK_QSO_DUPES_FUNCTION = """
+        CREATE OR REPLACE FUNCTION check_qso_dupes()
+            RETURNS TRIGGER AS
+        $BODY$
+        BEGIN
+          if current_setting('hambook.skip_qso_dupes_check', true) = 'on' then
+              RETURN NEW;
+          end if;
+          {log_lock}
+          if exists (select from qso
+                where qso.callsign = new.callsign and
+                    qso.log_id = new.log_id and
+                    qso.id <> new.id and
+                    qso.qso_mode = new.qso_mode and
+                    qso.band = new.band and
+                    qso.qso_datetime > new.qso_datetime - interval '5 minutes' and
+                    qso.qso_datetime < new.qso_datetime + interval '5 minutes')
+          then
+              raise exception using
+                    errcode='HB001',
+                    message='The QSO is already in this log.';
+          end if;
+          RETURN NEW;
+        END;
+        $BODY$ language 'plpgsql';
+"""
+
+#the writers of a log check dupes one after another: bulk imports take the same lock
+#before their insert, the check below runs with a snapshot taken after the lock
+LOG_LOCK = """
+          perform pg_advisory_xact_lock(new.log_id);
+"""
+
+def upgrade() -> None:
+    op.execute(sa.text(CHECK_QSO_DUPES_FUNCTION.format(log_lock=LOG_LOCK)))
+
+
+def downgrade() -> None:
+    op.execute(sa.text(CHECK_QSO_DUPES_FUNCTION.format(log_lock="")))
@@ -0,0 +1,146 @@
+"""qso_logs_stats
+
+Revision ID: e0afad65961d
+Revises: eb120e5d02b0
+Create Date: 2026-10-18 15:21:08.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'e0afad65961d'
+down_revision = 'eb120e5d02b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("qso_logs", 
+            sa.Column("qso_count", sa.BigInteger, nullable=False, server_default=sa.text('0')))
+    op.add_column("qso_logs", sa.Column("qso_first_datetime", sa.TIMESTAMP(timezone=True)))
+    op.add_column("qso_logs", sa.Column("qso_last_datetime", sa.TIMESTAMP(timezone=True)))
+
+    op.execute(sa.text(
+        """
+        UPDATE qso_logs
+        SET qso_count = stats.qso_count,
+            qso_first_datetime = stats.qso_first_datetime,
+            qso_last_datetime = stats.qso_last_datetime
+        FROM (SELECT log_id, count(*) as qso_count, 
+                min(qso_datetime) as qso_first_datetime, max(qso_datetime) as qso_last_datetime
+            FROM qso
+            GROUP BY log_id) as stats
+        WHERE qso_logs.id = stats.log_id;
+        """
+    ))
+
+    #statement level triggers so bulk imports update each log once
+    op.execute(sa.text(
+        """
+        CREATE OR REPLACE FUNCTION qso_logs_stats_insert()
+            RETURNS TRIGGER AS
+        $BODY$
+        BEGIN
+            UPDATE qso_logs
+            SET qso_count = qso_logs.qso_count + stats.qso_count,
+                qso_first_datetime = least(qso_logs.qso_first_datetime, stats.qso_first_datetime),
+                qso_last_datetime = greatest(qso_logs.qso_last_datetime, stats.qso_last_datetime)
+            FROM (SELECT log_id, count(*) as qso_count, 
+                    min(qso_datetime) as qso_first_datetime, max(qso_datetime) as qso_last_datetime
+                FROM new_qso
+                GROUP BY log_id) as stats
+            WHERE qso_logs.id = stats.log_id;
+            RETURN NULL;
+        END;
+        $BODY$ language 'plpgsql';
+        """
+    ))
+
+    op.execute(sa.text(
+        """
+        CREATE OR REPLACE FUNCTION qso_logs_stats_change()
+            RETURNS TRIGGER AS
+        $BODY$
+        BEGIN
+            UPDATE qso_logs
+            SET qso_count = qso_logs.qso_count + changes.qso_count,
+                qso_first_datetime = (SELECT min(qso_datetime) FROM qso WHERE log_id = qso_logs.id),
+                qso_last_datetime = (SELECT max(qso_datetime) FROM qso WHERE log_id = qso_logs.id)
+            FROM (SELECT log_id, sum(qso_count) as qso_count
+                FROM (SELECT log_id, 1 as qso_count FROM new_qso
+                    UNION ALL
+                    SELECT log_id, -1 as qso_count FROM old_qso) as qso_changes
+                GROUP BY log_id) as changes
+            WHERE qso_logs.id = changes.log_id;
+            RETURN NULL;
+        END;
+        $BODY$ language 'plpgsql';
+        """
+    ))
+
+    op.execute(sa.text(
+        """
+        CREATE OR REPLACE FUNCTION qso_logs_stats_delete()
+            RETURNS TRIGGER AS
+        $BODY$
+        BEGIN
+            UPDATE qso_logs
+            SET qso_count = qso_logs.qso_count - stats.qso_count,
+                qso_first_datetime = (SELECT min(qso_datetime) FROM qso WHERE log_id = qso_logs.id),
+                qso_last_datetime = (SELECT max(qso_datetime) FROM qso WHERE log_id = qso_logs.id)
+            FROM (SELECT log_id, count(*) as qso_count
+                FROM old_qso
+                GROUP BY log_id) as stats
+            WHERE qso_logs.id = stats.log_id;
+            RETURN NULL;
+        END;
+        $BODY$ language 'plpgsql';
+        """
+    ))
+
+    op.execute(
+        """
+        CREATE TRIGGER qso_logs_stats_insert
+            AFTER INSERT
+            ON qso
+            REFERENCING NEW TABLE AS new_qso
+            FOR EACH STATEMENT
+        EXECUTE FUNCTION qso_logs_stats_insert();
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER qso_logs_stats_change
+            AFTER UPDATE
+            ON qso
+            REFERENCING OLD TABLE AS old_qso NEW TABLE AS new_qso
+            FOR EACH STATEMENT
+        EXECUTE FUNCTION qso_logs_stats_change();
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER qso_logs_stats_delete
+            AFTER DELETE
+            ON qso
+            REFERENCING OLD TABLE AS old_qso
+            FOR EACH STATEMENT
+        EXECUTE FUNCTION qso_logs_stats_delete();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS qso_logs_stats_delete ON qso;")
+    op.execute("DROP TRIGGER IF EXISTS qso_logs_stats_change ON qso;")
+    op.execute("DROP TRIGGER IF EXISTS qso_logs_stats_insert ON qso;")
+    op.execute("DROP FUNCTION IF EXISTS qso_logs_stats_delete;")
+    op.execute("DROP FUNCTION IF EXISTS qso_logs_stats_change;")
+    op.execute("DROP FUNCTION IF EXISTS qso_logs_stats_insert;")
+    op.drop_column("qso_logs", "qso_last_datetime")
+    op.drop_column("qso_logs", "qso_first_datetime")
+    op.drop_column("qso_logs", "qso_count")
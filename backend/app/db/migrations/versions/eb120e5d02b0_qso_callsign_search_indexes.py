@@ -0,0 +1,43 @@
+"""qso_callsign_search_indexes
+
+Revision ID: eb120e5d02b0
+Revises: f8f99084ad0a
+Create Date: 2026-10-18 13:40:51.730164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'eb120e5d02b0'
+down_revision = 'f8f99084ad0a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;"))
+    op.execute(sa.text("CREATE EXTENSION IF NOT EXISTS btree_gin WITH SCHEMA public;"))
+
+    #prefix searches: R7*
+    op.execute(sa.text("""
+        CREATE INDEX ix_qso_log_id_callsign_pattern 
+        ON qso (log_id, callsign text_pattern_ops);
+    """))
+    #suffix searches: */P as prefix searches on the reversed callsign
+    op.execute(sa.text("""
+        CREATE INDEX ix_qso_log_id_callsign_reverse 
+        ON qso (log_id, reverse(callsign) text_pattern_ops);
+    """))
+    #infix and other wildcard searches: *7C*, R*/P
+    op.execute(sa.text("""
+        CREATE INDEX ix_qso_log_id_callsign_trgm 
+        ON qso USING gin (log_id, callsign gin_trgm_ops);
+    """))
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_qso_log_id_callsign_trgm;")
+    op.execute("DROP INDEX IF EXISTS ix_qso_log_id_callsign_reverse;")
+    op.execute("DROP INDEX IF EXISTS ix_qso_log_id_callsign_pattern;")
@@ -0,0 +1,25 @@
+"""qso_keyset_pagination_indexes
+
+Revision ID: f8f99084ad0a
+Revises: 33faa2bb0579
+Create Date: 2026-10-18 11:02:17.288310
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = 'f8f99084ad0a'
+down_revision = '33faa2bb0579'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_qso_log_id_id", "qso", ["log_id", "id"])
+    op.create_index("ix_qso_log_id_qso_datetime_id", "qso", ["log_id", "qso_datetime", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_qso_log_id_qso_datetime_id", table_name="qso")
+    op.drop_index("ix_qso_log_id_id", table_name="qso")
@@ -0,0 +1,67 @@
+from typing import AsyncIterator, Tuple
+
+from app.db.repositories.base import BaseRepository
+
+#locks the counts state: concurrent runs count one after another
+LOCK_CALLSIGN_QSO_COUNTS_QUERY = """
+    SELECT counted_until
+    FROM callsign_qso_counts_state
+    FOR UPDATE;
+"""
+
+#adds the qso created since the last run to the counts, up to the start of the oldest open
+#transaction: qso of the transactions still running are counted by the next run.
+#every part of the statement reads counted_until as it was before the update
+COUNT_NEW_QSO_QUERY = """
+    WITH horizon AS (
+        SELECT least(now(), min(xact_start)) as counted_until
+        FROM pg_stat_activity
+        WHERE datname = current_database() and backend_type = 'client backend' and
+            xact_start is not null
+    ),
+    state AS (
+        UPDATE callsign_qso_counts_state
+        SET counted_until = greatest(counted_until, (SELECT counted_until FROM horizon))
+        RETURNING 1
+    ),
+    counts AS (
+        INSERT INTO callsign_qso_counts (callsign, qso_count)
+        SELECT callsign, count(*)
+        FROM qso
+        WHERE created_at >= (SELECT counted_until FROM callsign_qso_counts_state) and
+            created_at < (SELECT counted_until FROM horizon)
+        GROUP BY callsign
+        ON CONFLICT (callsign) DO UPDATE
+            SET qso_count = callsign_qso_counts.qso_count + excluded.qso_count
+        RETURNING 1
+    )
+    SELECT count(*) as callsigns FROM counts;
+"""
+
+GET_CALLSIGN_WEIGHTS_QUERY = """
+    SELECT coalesce(counts.callsign, registered.callsign) as callsign,
+        coalesce(counts.qso_count, 0) as qso_count,
+        registered.callsign is not null as registered
+    FROM callsign_qso_counts as counts
+        FULL JOIN (
+            SELECT DISTINCT upper(current_callsign) as callsign
+            FROM profiles
+            WHERE current_callsign <> ''
+        ) as registered ON counts.callsign = registered.callsign;
+"""
+
+class CallsignsRepository(BaseRepository):
+
+    async def count_new_qso(self) -> int:
+        #returns the number of callsigns updated
+        async with self.db.connection() as connection:
+            async with connection.transaction():
+                await connection.execute(query=LOCK_CALLSIGN_QSO_COUNTS_QUERY)
+                return await connection.fetch_val(query=COUNT_NEW_QSO_QUERY)
+
+    async def callsign_weights(self) -> AsyncIterator[Tuple[str, int, bool]]:
+        """
+        Yields (callsign, qso count, registered) of the worked or registered callsigns
+        """
+        async for row in self.db.iterate(query=GET_CALLSIGN_WEIGHTS_QUERY):
+            yield row["callsign"], row["qso_count"], row["registered"]
@@ -1,5 +1,7 @@
+from typing import Union
+
 from app.db.repositories.base import BaseRepository
-from app.models.user import UserInDB
+from app.models.user import UserAuth, UserInDB
 from app.models.friend import FriendBase, FriendInDB, FriendPublic
 import logging
 
@@ -16,7 +18,7 @@ DELETE_FRIEND_QUERY = """
 
 class FriendsRepository(BaseRepository):
     async def add_friend(self, *, 
-        requesting_user: UserInDB,
+        requesting_user: Union[UserAuth, UserInDB],
         friend_id: int) -> FriendInDB:
 
         added_friend = await self.db.fetch_one(query=ADD_FRIEND_QUERY, 
@@ -25,7 +27,7 @@ class FriendsRepository(BaseRepository):
         return FriendInDB(**added_friend)
 
     async def delete_friend(self, *, 
-        requesting_user: UserInDB,
+        requesting_user: Union[UserAuth, UserInDB],
         friend_id: int) -> None:
             await self.db.execute(query=DELETE_FRIEND_QUERY, 
                     values={'user_id': int(requesting_user.id), 'friend_id': friend_id})
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Union
 
 from databases import Database
 
@@ -6,7 +6,7 @@ from app.db.repositories.base import BaseRepository
 from app.db.repositories.media import MediaRepository
 
 from app.models.post import PostUpdate, PostInDB, PostPublic, PostVisibility
-from app.models.user import UserInDB
+from app.models.user import UserAuth, UserInDB
 
 CREATE_POST_QUERY = """
     INSERT INTO posts (post_type, visibility, title,  contents, user_id)
@@ -63,7 +63,7 @@ class PostsRepository(BaseRepository):
 
     async def create_post(self, *, 
         new_post: PostUpdate,
-        requesting_user: UserInDB) -> PostInDB:
+        requesting_user: Union[UserAuth, UserInDB]) -> PostInDB:
 
         created_post = await self.db.fetch_one(query=CREATE_POST_QUERY, 
                 values={**new_post.dict(exclude={"post_images", "deleted_images"}), 
@@ -1,11 +1,11 @@
-from typing import Optional
+from typing import Optional, Union
 
 from databases import Database
 
 from app.db.repositories.base import BaseRepository
 from app.db.repositories.media import MediaRepository, mediaPublicFromDB
 from app.models.profile import ProfileCreate, ProfileUpdate, ProfileInDB, ProfilePublic
-from app.models.user import UserInDB
+from app.models.user import UserAuth, UserInDB
 from app.models.media import MediaType
 
 
@@ -112,7 +112,7 @@ class ProfilesRepository(BaseRepository):
 
     async def update_profile(self, *, 
             profile_update: ProfileUpdate, 
-            requesting_user: UserInDB, 
+            requesting_user: Union[UserAuth, UserInDB], 
             populate: bool = True) -> ProfilePublic:
 
         profile = await self.get_profile_by_user_id(user_id=requesting_user.id, populate=False)
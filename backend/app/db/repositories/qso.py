@@ -1,15 +1,23 @@
-from typing import List, Optional, AsyncIterator
+from typing import List, Mapping, Optional, AsyncIterator, Iterable, Tuple
+from itertools import count, islice
+import base64
+import binascii
 import json
-from datetime import date
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
 import logging
 
 from pydantic import constr
+from asyncpg.exceptions import ForeignKeyViolationError
 from asyncpg.exceptions._base import UnknownPostgresError
 
 from app.db.repositories.base import BaseRepository
-from app.models.qso import QsoBase, QsoInDB, QsoUpdate, Band, QsoMode, QsoFilter
+from app.models.qso import QsoBase, QsoInDB, QsoUpdate, Band, QsoMode, QsoFilter, QsoOrder
 from app.models.core import FullCallsign
 from app.models.user import UserInDB
+from app.utils.qso_dupes import QsoDupesIndex
+from app.db.ids import IdAllocator
 
 CREATE_QSO_QUERY = """
     INSERT INTO qso (log_id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
@@ -44,18 +52,82 @@ DELETE_QSO_QUERY = """
     WHERE id = :id;
 """
 
+QSO_COLUMNS = """id, log_id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
+        rst_s, rst_r, extra, created_at, updated_at"""
+
+QSO_EXPORT_CORE_COLUMNS = """id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
+        rst_s, rst_r"""
+
+QSO_EXPORT_COLUMNS = f"{QSO_EXPORT_CORE_COLUMNS}, extra"
+
+QSO_EXPORT_BATCH_SIZE = 5000
+
 GET_QSO_BY_LOG_ID_QUERY = """
-    SELECT id, log_id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
-        rst_s, rst_r, extra, created_at, updated_at
+    SELECT {columns}
     FROM qso
-    WHERE log_id = :log_id and 
-        (cast(:callsign_search as text) is null or callsign like :callsign_search) and 
-        (cast(:band as text) is null or band = :band) and
-        (cast(:qso_mode as text) is null or :qso_mode = qso_mode) and
-        (cast(:date_begin as timestamp) is null or :date_begin < qso_datetime) and
-        (cast(:date_end as timestamp) is null or :date_end + interval '1 day' > qso_datetime)
-    order by id desc 
-    limit :limit offset :offset;
+    WHERE log_id = :log_id{predicates}
+    order by {order}{limit}{offset};
+"""
+
+#only the predicates of the filters actually supplied are added to the query
+QSO_FILTER_PREDICATES = {
+    "callsign": "callsign = :callsign",
+    "callsign_prefix": "callsign like :callsign_prefix",
+    "callsign_suffix": "reverse(callsign) like :callsign_suffix",
+    "callsign_infix": "callsign like :callsign_infix",
+    "band": "band = :band",
+    "qso_mode": "qso_mode = :qso_mode",
+    "date_begin": "qso_datetime >= :date_begin",
+    "date_end": "qso_datetime < :date_end",
+}
+
+#order by clause and keyset predicate to continue after the cursor for every order
+QSO_ORDERS = {
+    QsoOrder.id: ("id desc", "id < :cursor_id"),
+    QsoOrder.qso_datetime: ("qso_datetime desc, id desc", 
+        "(qso_datetime, id) < (:cursor_qso_datetime, :cursor_id)"),
+}
+
+#changes after the cursor: qso rows by updated_at and tombstones of the deleted ones
+#only changes older than the start of every open transaction are returned, so a row
+#committed later can't appear behind a cursor a client already has
+GET_QSO_CHANGES_QUERY = """
+    WITH horizon AS (
+        SELECT least(now(), min(xact_start)) as changed_before
+        FROM pg_stat_activity
+        WHERE datname = current_database() and backend_type = 'client backend' and 
+            xact_start is not null
+    )
+    SELECT * FROM (
+        (SELECT id, log_id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
+            rst_s, rst_r, extra, created_at, updated_at, updated_at as changed_at, false as deleted
+        FROM qso
+        WHERE log_id = :log_id and 
+            (updated_at, id) > (:cursor_changed_at, :cursor_id) and
+            updated_at < (SELECT changed_before FROM horizon)
+        order by updated_at, id
+        limit :limit)
+        UNION ALL
+        (SELECT id, log_id, null::text, null::text, null::timestamptz, null::text, null::numeric, 
+            null::text, null::smallint, null::smallint, null::jsonb, null::timestamptz, null::timestamptz, 
+            deleted_at as changed_at, true as deleted
+        FROM qso_tombstones
+        WHERE log_id = :log_id and 
+            (deleted_at, id) > (:cursor_changed_at, :cursor_id) and
+            deleted_at < (SELECT changed_before FROM horizon)
+        order by deleted_at, id
+        limit :limit)
+    ) as changes
+    order by changed_at, id
+    limit :limit;
+"""
+
+QSO_CHANGES_START = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+QSO_EVENTS_CHANNEL = "qso_events"
+
+NOTIFY_QSO_EVENT_QUERY = """
+    SELECT pg_notify(:channel, :payload);
 """
 
 GET_CALLSIGNS_BY_LOG_ID_QUERY = """
@@ -67,6 +139,23 @@ GET_CALLSIGNS_BY_LOG_ID_QUERY = """
 
 
 
+GET_QSO_DUPES_KEYS_BY_LOG_ID_QUERY = """
+    SELECT callsign, band, qso_mode, qso_datetime
+    FROM qso
+    WHERE log_id = :log_id;
+"""
+
+#check_qso_dupes trigger rule, runs on the ix_qso_log_id_dupes index
+IS_QSO_DUPE_QUERY = """
+    SELECT exists (select from qso
+        where log_id = :log_id and
+            callsign = :callsign and 
+            qso_mode = :qso_mode and 
+            band = :band and 
+            qso_datetime > cast(:qso_datetime as timestamptz) - interval '5 minutes' and 
+            qso_datetime < cast(:qso_datetime as timestamptz) + interval '5 minutes');
+"""
+
 GET_QSO_BY_ID_QUERY = """
     SELECT id, log_id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
         rst_s, rst_r, extra, created_at, updated_at
@@ -74,9 +163,209 @@ GET_QSO_BY_ID_QUERY = """
     WHERE id = :id;
 """
 
+GET_QSO_WITH_LOG_OWNER_QUERY = """
+    SELECT qso.id, log_id, qso.callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
+        rst_s, rst_r, extra, qso.created_at, qso.updated_at, qso_logs.user_id as log_user_id
+    FROM qso JOIN qso_logs ON qso_logs.id = qso.log_id
+    WHERE qso.id = :id;
+"""
+
+CREATE_QSO_IMPORT_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE qso_import (
+        seq bigint,
+        id bigint,
+        callsign text,
+        station_callsign text,
+        qso_datetime timestamptz,
+        band text,
+        freq numeric(8,2),
+        qso_mode text,
+        rst_s smallint,
+        rst_r smallint,
+        extra jsonb
+    ) ON COMMIT DROP;
+"""
+
+QSO_IMPORT_COLUMNS = ('seq', 'id', 'callsign', 'station_callsign', 'qso_datetime', 'band', 'freq', 'qso_mode',
+        'rst_s', 'rst_r', 'extra')
+
+SKIP_QSO_DUPES_CHECK_QUERY = """
+    SET LOCAL hambook.skip_qso_dupes_check = 'on';
+"""
+
+CREATE_QSO_IMPORT_DUPES_INDEX_QUERY = """
+    CREATE INDEX ON qso_import (callsign, band, qso_mode, qso_datetime);
+"""
+
+#the writers of the log check dupes one after another, the trigger takes the same lock
+LOCK_QSO_LOG_WRITES_QUERY = """
+    SELECT pg_advisory_xact_lock(:log_id);
+"""
+
+#a staged qso is a dupe of the log or of a qso staged before it
+BULK_INSERT_QSO_QUERY = """
+    WITH inserted AS (
+        INSERT INTO qso (id, log_id, callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
+            rst_s, rst_r, extra)
+        SELECT id, cast(:log_id as bigint), callsign, station_callsign, qso_datetime, band, freq, qso_mode, 
+            rst_s, rst_r, extra
+        FROM qso_import
+        WHERE not exists (select from qso
+                where qso.log_id = :log_id and
+                    qso.callsign = qso_import.callsign and 
+                    qso.qso_mode = qso_import.qso_mode and 
+                    qso.band = qso_import.band and 
+                    qso.qso_datetime > qso_import.qso_datetime - interval '5 minutes' and 
+                    qso.qso_datetime < qso_import.qso_datetime + interval '5 minutes') and
+            not exists (select from qso_import as staged
+                where staged.callsign = qso_import.callsign and 
+                    staged.qso_mode = qso_import.qso_mode and 
+                    staged.band = qso_import.band and 
+                    staged.qso_datetime > qso_import.qso_datetime - interval '5 minutes' and 
+                    staged.qso_datetime < qso_import.qso_datetime + interval '5 minutes' and
+                    staged.seq < qso_import.seq)
+        order by seq
+        RETURNING 1
+    )
+    SELECT count(*) as qso_new FROM inserted;
+"""
+
+QSO_IMPORT_BATCH_SIZE = 10000
+
+@lru_cache(maxsize=None)
+def qso_export_columns(extra_fields_count: Optional[int]) -> str:
+    #only the requested keys of extra are read, the key names are bound as :extra_field_<n>
+    if extra_fields_count is None:
+        return QSO_EXPORT_COLUMNS
+    return QSO_EXPORT_CORE_COLUMNS + ''.join(f", extra ->> cast(:extra_field_{idx} as text) as extra_{idx}" 
+            for idx in range(extra_fields_count))
+
+@lru_cache(maxsize=None)
+def qso_by_log_id_query_text(*, 
+        filters: Tuple[str, ...], 
+        order_by: QsoOrder, 
+        keyset: bool, 
+        limit: bool, 
+        offset: bool,
+        columns: str = QSO_COLUMNS) -> str:
+    #the same text for the same filters shape lets asyncpg reuse its prepared statement
+    order, keyset_predicate = QSO_ORDERS[order_by]
+    predicates = [QSO_FILTER_PREDICATES[qso_filter] for qso_filter in filters]
+    if keyset:
+        predicates.append(keyset_predicate)
+    return GET_QSO_BY_LOG_ID_QUERY.format(
+            columns=columns,
+            predicates=''.join(f" and\n        {predicate}" for predicate in predicates),
+            order=order,
+            limit=" limit :limit" if limit else "",
+            offset=" offset :offset" if offset else "")
+
+class InvalidQsoCursorError(Exception):
+    pass
+
+def create_qso_cursor(*, qso: QsoInDB, order_by: QsoOrder) -> str:
+    cursor = {"order": order_by, "id": qso.id}
+    if order_by == QsoOrder.qso_datetime:
+        cursor["qso_datetime"] = qso.qso_datetime.isoformat()
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+def parse_qso_cursor(*, cursor: str, order_by: QsoOrder) -> dict:
+    try:
+        cursor_data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_data["order"] != order_by:
+            raise InvalidQsoCursorError()
+        values = {"cursor_id": int(cursor_data["id"])}
+        if order_by == QsoOrder.qso_datetime:
+            values["cursor_qso_datetime"] = datetime.fromisoformat(cursor_data["qso_datetime"])
+        return values
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidQsoCursorError()
+
+def create_qso_changes_cursor(*, change: Mapping) -> str:
+    cursor = {"changed_at": change["changed_at"].isoformat(), "id": change["id"]}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+def parse_qso_changes_cursor(cursor: Optional[str]) -> dict:
+    if not cursor:
+        return {"cursor_changed_at": QSO_CHANGES_START, "cursor_id": 0}
+    try:
+        cursor_data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {
+            "cursor_changed_at": datetime.fromisoformat(cursor_data["changed_at"]),
+            "cursor_id": int(cursor_data["id"]),
+        }
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidQsoCursorError()
+
+def like_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def callsign_search_filter(callsign_search: str) -> Tuple[str, str]:
+    """
+    Picks the callsign predicate by the position of * wildcards:
+    no wildcard - equality, trailing - btree prefix search,
+    leading - prefix search on the reversed callsign index,
+    other - trigram index search
+    """
+    parts = callsign_search.split('*')
+    if len(parts) == 1:
+        return "callsign", callsign_search
+    if len(parts) == 2 and not parts[1]:
+        return "callsign_prefix", f"{like_escape(parts[0])}%"
+    if len(parts) == 2 and not parts[0]:
+        return "callsign_suffix", f"{like_escape(parts[1][::-1])}%"
+    return "callsign_infix", '%'.join(like_escape(part) for part in parts)
+
+def qso_by_log_id_query(*,
+        log_id: int,
+        callsign_search: Optional[str] = None,
+        band: Optional[Band] = None,
+        qso_mode: Optional[QsoMode] = None,
+        date_begin: Optional[date] = None,
+        date_end: Optional[date] = None,
+        order_by: QsoOrder = QsoOrder.id,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        cursor_values: Optional[dict] = None,
+        columns: str = QSO_COLUMNS) -> Tuple[str, dict]:
+    filter_values = {}
+    if callsign_search:
+        callsign_filter, callsign_value = callsign_search_filter(callsign_search)
+        filter_values[callsign_filter] = callsign_value
+    if band:
+        filter_values["band"] = band
+    if qso_mode:
+        filter_values["qso_mode"] = qso_mode
+    if date_begin:
+        filter_values["date_begin"] = datetime.combine(date_begin, time.min)
+    if date_end:
+        filter_values["date_end"] = datetime.combine(date_end + timedelta(days=1), time.min)
+
+    query = qso_by_log_id_query_text(
+            filters=tuple(filter_values), 
+            order_by=order_by, 
+            keyset=bool(cursor or cursor_values), 
+            limit=bool(limit), 
+            offset=bool(offset),
+            columns=columns)
+    values = {"log_id": log_id, **filter_values}
+    if cursor:
+        values.update(parse_qso_cursor(cursor=cursor, order_by=order_by))
+    if cursor_values:
+        values.update(cursor_values)
+    if limit:
+        values["limit"] = limit
+    if offset:
+        values["offset"] = offset
+    return query, values
+
 class DuplicateQsoError(Exception):
     pass
 
+class QsoLogNotFoundError(Exception):
+    pass
+
 class QsoRepository(BaseRepository):
 
     async def write_qso(self, *, query: str, values: dict):
@@ -87,6 +376,9 @@ class QsoRepository(BaseRepository):
         except UnknownPostgresError as exc:
             if str(exc) == 'The QSO is already in this log.':
                 raise DuplicateQsoError()
+        except ForeignKeyViolationError:
+            #the log was deleted after its owner was checked
+            raise QsoLogNotFoundError()
 
     async def create_qso(self, *, 
         new_qso: QsoBase,
@@ -102,6 +394,39 @@ class QsoRepository(BaseRepository):
 
         return QsoInDB(**created_qso)
 
+    async def bulk_create_qso(self, *,
+        qsos: Iterable[QsoBase],
+        log_id: int) -> Tuple[int, int]:
+        """
+        COPY the qsos into a staging table and insert the non duplicate ones with a single
+        statement in one transaction. Returns the numbers of new and duplicate qsos.
+        A qso is a dupe of the log or of a qso before it in qsos.
+        """
+        qso_staged = 0
+        id_allocator = IdAllocator('qso_id_seq')
+
+        async with self.db.connection() as connection:
+            async with connection.transaction():
+                await connection.execute(query=CREATE_QSO_IMPORT_TABLE_QUERY)
+                qsos_iter = iter(qsos)
+                while batch := list(islice(qsos_iter, QSO_IMPORT_BATCH_SIZE)):
+                    ids = await id_allocator.reserve(connection, len(batch))
+                    await connection.raw_connection.copy_records_to_table('qso_import', 
+                            records=[(seq, id, qso.callsign, qso.station_callsign, qso.qso_datetime, 
+                                qso.band, Decimal(str(qso.freq)), qso.qso_mode, qso.rst_s, qso.rst_r, 
+                                json.dumps(qso.extra))
+                                for seq, id, qso in zip(count(qso_staged), ids, batch)],
+                            columns=QSO_IMPORT_COLUMNS)
+                    qso_staged += len(batch)
+                await connection.execute(query=CREATE_QSO_IMPORT_DUPES_INDEX_QUERY)
+                await connection.execute(query="ANALYZE qso_import;")
+                await connection.execute(query=LOCK_QSO_LOG_WRITES_QUERY, values={"log_id": log_id})
+                await connection.execute(query=SKIP_QSO_DUPES_CHECK_QUERY)
+                result = await connection.fetch_one(query=BULK_INSERT_QSO_QUERY, 
+                        values={"log_id": log_id})
+
+        return result["qso_new"], qso_staged - result["qso_new"]
+
     async def get_qso_by_log_id(self, *, 
         log_id: int,
         callsign_search: Optional[str] = None,
@@ -109,39 +434,72 @@ class QsoRepository(BaseRepository):
         qso_mode: Optional[QsoMode] = None,
         date_begin: Optional[date] = None,
         date_end: Optional[date] = None,
+        order_by: QsoOrder = QsoOrder.id,
+        cursor: Optional[str] = None,
         limit: Optional[int] = None,
         offset: Optional[int] = None
         ) -> List[QsoInDB]:
-        qsos = await self.db.fetch_all(query=GET_QSO_BY_LOG_ID_QUERY, 
-                values={
-                    "log_id": log_id,
-                    "callsign_search": callsign_search,
-                    "band": band,
-                    "qso_mode": qso_mode,
-                    "date_begin": date_begin,
-                    "date_end": date_end,
-                    "limit": limit,
-                    "offset": offset
-                    })
+        query, values = qso_by_log_id_query(
+                log_id=log_id, 
+                callsign_search=callsign_search, 
+                band=band, 
+                qso_mode=qso_mode, 
+                date_begin=date_begin, 
+                date_end=date_end, 
+                order_by=order_by, 
+                cursor=cursor, 
+                limit=limit, 
+                offset=offset)
+        qsos = await self.db.fetch_all(query=query, values=values)
 
         if not qsos:
             return None
 
         return [QsoInDB(**qso) for qso in qsos]
 
-    async def qso_log_iterator(self, *,
+    async def qso_log_batches(self, *,
+        log_id: int,
+        qso_filter: QsoFilter,
+        extra_fields: Optional[List[str]] = None,
+        batch_size: int = QSO_EXPORT_BATCH_SIZE) -> AsyncIterator[List[Mapping]]:
+        """
+        Raw export rows of the log in batches, newest first. Every batch is a separate
+        keyset query so no connection or cursor is held between batches.
+        With extra_fields only these keys of extra are selected as extra_<n> columns.
+        """
+        columns = qso_export_columns(None if extra_fields is None else len(extra_fields))
+        extra_fields_values = {f"extra_field_{idx}": field 
+                for idx, field in enumerate(extra_fields or [])}
+        cursor_values = None
+        while True:
+            query, values = qso_by_log_id_query(log_id=log_id, 
+                    **qso_filter.dict(), 
+                    limit=batch_size,
+                    cursor_values=cursor_values,
+                    columns=columns)
+            values.update(extra_fields_values)
+            qso_batch = [qso._mapping for qso in await self.db.fetch_all(query=query, values=values)]
+            if qso_batch:
+                yield qso_batch
+            if len(qso_batch) < batch_size:
+                break
+            cursor_values = {"cursor_id": qso_batch[-1]["id"]}
+
+    async def get_qso_changes(self, *,
         log_id: int,
-        qso_filter: QsoFilter) -> AsyncIterator[QsoInDB]:
-        async for qso in self.db.iterate(query=GET_QSO_BY_LOG_ID_QUERY, 
+        cursor: Optional[str],
+        limit: int) -> List[Mapping]:
+        changes = await self.db.fetch_all(query=GET_QSO_CHANGES_QUERY, 
                 values={
-                    "log_id": log_id,
-                    "callsign_search": qso_filter.callsign_search,
-                    "band": qso_filter.band,
-                    "qso_mode": qso_filter.qso_mode,
-                    "date_begin": qso_filter.date_begin,
-                    "date_end": qso_filter.date_end
-                    }):
-            yield QsoInDB(**qso)
+                    "log_id": log_id, 
+                    "limit": limit, 
+                    **parse_qso_changes_cursor(cursor)
+                    })
+        return [change._mapping for change in changes]
+
+    async def notify_qso_event(self, *, payload: str) -> None:
+        await self.db.execute(query=NOTIFY_QSO_EVENT_QUERY, 
+                values={"channel": QSO_EVENTS_CHANNEL, "payload": payload})
 
     async def get_callsigns_by_log_id(self, *, 
         log_id: int,
@@ -153,7 +511,7 @@ class QsoRepository(BaseRepository):
         callsigns = await self.db.fetch_all(query=query, 
                 values={
                     "log_id": log_id,
-                    "callsign_template": f"{callsign_start}%"
+                    "callsign_template": f"{like_escape(callsign_start)}%"
                     })
         if not callsigns:
             return None
@@ -162,6 +520,26 @@ class QsoRepository(BaseRepository):
         return [FullCallsign(callsign['callsign']) for callsign in callsigns]
 
 
+    async def get_qso_dupes_index(self, *, log_id: int) -> QsoDupesIndex:
+        dupes_index = QsoDupesIndex()
+        async for qso in self.db.iterate(query=GET_QSO_DUPES_KEYS_BY_LOG_ID_QUERY, 
+                values={"log_id": log_id}):
+            dupes_index.add(**qso)
+        return dupes_index
+
+    async def is_qso_dupe(self, *, 
+        log_id: int, 
+        callsign: str, 
+        band: str, 
+        qso_mode: str, 
+        qso_datetime: datetime) -> bool:
+        return await self.db.fetch_val(query=IS_QSO_DUPE_QUERY, values={
+            "log_id": log_id,
+            "callsign": str(callsign),
+            "band": str(band),
+            "qso_mode": str(qso_mode),
+            "qso_datetime": qso_datetime})
+
     async def get_qso_by_id(self, *, id: int) -> QsoInDB:
         qso = await self.db.fetch_one(query=GET_QSO_BY_ID_QUERY, 
                 values={"id": id})
@@ -172,6 +550,19 @@ class QsoRepository(BaseRepository):
         return QsoInDB(**qso)
 
 
+    async def get_qso_with_log_owner(self, *, id: int) -> Optional[Tuple[QsoInDB, int]]:
+        qso = await self.db.fetch_one(query=GET_QSO_WITH_LOG_OWNER_QUERY, 
+                values={"id": id})
+
+        if not qso:
+            return None
+
+        qso = dict(qso)
+        log_user_id = qso.pop("log_user_id")
+
+        return QsoInDB(**qso), log_user_id
+
+
     async def update_qso(self, *, qso: QsoInDB, qso_update: QsoBase) -> QsoInDB:
 
         update_params = qso.copy(update=qso_update.dict(exclude_unset=True)).dict(
@@ -1,13 +1,14 @@
-from typing import List
+from typing import List, Optional, Tuple, Union
 
 from app.db.repositories.base import BaseRepository
 from app.models.qso_log import QsoLogBase, QsoLogInDB
-from app.models.user import UserInDB
+from app.models.user import UserAuth, UserInDB
 
 CREATE_QSO_LOG_QUERY = """
     INSERT INTO qso_logs (callsign,  description, user_id)
     VALUES (:callsign, :description, :user_id)
-    RETURNING id, callsign, description, user_id, extra_fields;
+    RETURNING id, callsign, description, user_id, extra_fields, 
+        qso_count, qso_first_datetime, qso_last_datetime;
 """
 
 UPDATE_QSO_LOG_QUERY = """
@@ -17,7 +18,8 @@ UPDATE_QSO_LOG_QUERY = """
         callsign = :callsign,
         extra_fields = :extra_fields
     WHERE id = :id
-    RETURNING id, callsign, description, user_id, extra_fields;
+    RETURNING id, callsign, description, user_id, extra_fields, 
+        qso_count, qso_first_datetime, qso_last_datetime;
 """
 
 
@@ -27,18 +29,41 @@ DELETE_QSO_LOG_QUERY = """
 """
 
 GET_QSO_LOGS_BY_USER_ID_QUERY = """
-    SELECT id, callsign, description, user_id, extra_fields,
-       (SELECT count(*) from qso 
-            WHERE log_id = qso_logs.id) as qso_count
+    SELECT id, callsign, description, user_id, extra_fields, 
+        qso_count, qso_first_datetime, qso_last_datetime
     FROM qso_logs
     WHERE user_id = :user_id
     order by id;
 """
 
+GET_QSO_LOG_OWNER_QUERY = """
+    SELECT user_id
+    FROM qso_logs
+    WHERE id = :id;
+"""
+
+GET_QSO_LOG_VERSION_QUERY = """
+    SELECT qso_version
+    FROM qso_logs
+    WHERE id = :id;
+"""
+
+GET_QSO_LOG_EXPORT_SETTINGS_QUERY = """
+    SELECT qso_version, extra_fields
+    FROM qso_logs
+    WHERE id = :id;
+"""
+
+GET_QSO_LOG_WITH_VERSION_QUERY = """
+    SELECT id, callsign, description, user_id, extra_fields, 
+        qso_count, qso_first_datetime, qso_last_datetime, qso_version
+    FROM qso_logs
+    WHERE id = :id;
+"""
+
 GET_QSO_LOG_BY_ID_QUERY = """
-    SELECT id, callsign, description, user_id, extra_fields,
-       (SELECT count(*) from qso 
-            WHERE log_id = :id) as qso_count
+    SELECT id, callsign, description, user_id, extra_fields, 
+        qso_count, qso_first_datetime, qso_last_datetime
     FROM qso_logs
     WHERE id = :id;
 """
@@ -47,7 +72,7 @@ class QsoLogsRepository(BaseRepository):
 
     async def create_log(self, *, 
         new_log: QsoLogBase,
-        requesting_user: UserInDB) -> QsoLogInDB:
+        requesting_user: Union[UserAuth, UserInDB]) -> QsoLogInDB:
 
         created_log = await self.db.fetch_one(query=CREATE_QSO_LOG_QUERY, 
                 values={**new_log.dict(exclude={"extra_fields"}), "user_id": int(requesting_user.id)})
@@ -72,13 +97,31 @@ class QsoLogsRepository(BaseRepository):
         return QsoLogInDB(**qso_log)
 
 
+    async def get_log_owner(self, *, id: int) -> Optional[int]:
+        return await self.db.fetch_val(query=GET_QSO_LOG_OWNER_QUERY, values={"id": id})
+
+    async def get_log_version(self, *, id: int) -> Optional[int]:
+        return await self.db.fetch_val(query=GET_QSO_LOG_VERSION_QUERY, values={"id": id})
+
+    async def get_log_export_settings(self, *, id: int) -> Optional[Tuple[int, Optional[List[str]]]]:
+        settings = await self.db.fetch_one(query=GET_QSO_LOG_EXPORT_SETTINGS_QUERY, values={"id": id})
+        if settings:
+            return settings["qso_version"], settings["extra_fields"]
+
+    async def get_log_with_version(self, *, id: int) -> Optional[Tuple[QsoLogInDB, int]]:
+        #the log and its qso version as of the same moment
+        qso_log = await self.db.fetch_one(query=GET_QSO_LOG_WITH_VERSION_QUERY, values={"id": id})
+        if qso_log:
+            return QsoLogInDB(**qso_log), qso_log["qso_version"]
+
     async def update_log(self, *, log: QsoLogInDB, log_update: QsoLogBase) -> QsoLogInDB:
 
         update_params = log.copy(update=log_update.dict(exclude_unset=True))
         updated_qso_log = await self.db.fetch_one(
             query=UPDATE_QSO_LOG_QUERY,
             values=update_params.dict(
-                exclude={"user_id", "qso_count", "created_at", "updated_at"}),
+                exclude={"user_id", "qso_count", "qso_first_datetime", "qso_last_datetime", 
+                    "created_at", "updated_at"}),
         )
 
         return QsoLogInDB(**updated_qso_log)
@@ -6,8 +6,8 @@ from starlette.status import HTTP_400_BAD_REQUEST
 from databases import Database
 
 from app.db.repositories.base import BaseRepository
-from app.models.user import UserCreate, UserInDB, UserPublic
-from app.services import auth_service
+from app.models.user import UserCreate, UserInDB, UserPublic, UserAuth
+from app.services import auth_service, auth_users_service, password_hashing_service
 
 from app.db.repositories.profiles import ProfilesRepository
 from app.models.profile import ProfileCreate, ProfilePublic
@@ -32,6 +32,12 @@ GET_USER_BY_ID_QUERY = """
     WHERE id = :id;
 """
 
+GET_USER_AUTH_BY_ID_QUERY = """
+    SELECT id, email_verified, is_admin
+    FROM users
+    WHERE id = :id;
+"""
+
 UPDATE_USER_QUERY = """
     UPDATE users 
     SET email_verified = :email_verified, password = :password, salt = :salt
@@ -61,6 +67,7 @@ class UsersRepository(BaseRepository):
         update_user_params = user.copy(update=update_params, 
                 exclude={"email", "created_at", "updated_at", "access_token", "profile", "is_admin"})
         updated_user = await self.db.fetch_one(query=UPDATE_USER_QUERY, values=update_user_params.dict())
+        auth_users_service.drop(user.id)
         return UserInDB(**updated_user)
 
     async def verify_user_email(self, *, userid: int):
@@ -77,7 +84,7 @@ class UsersRepository(BaseRepository):
         user = await self.get_user_by_id(userid=userid, populate=False)
         if not user:
             return None
-        user_password_update = self.auth_service.create_salt_and_hashed_password(
+        user_password_update = await password_hashing_service.create_salt_and_hashed_password(
             plaintext_password=password)
         return await self.update_user(user=user, update_params=user_password_update.dict())
 
@@ -89,6 +96,11 @@ class UsersRepository(BaseRepository):
                 return await self.populate_user(user=user)                
             return user
 
+    async def get_user_auth_by_id(self, *, userid: int) -> Optional[UserAuth]:
+        user_record = await self.db.fetch_one(query=GET_USER_AUTH_BY_ID_QUERY, values={"id": userid})
+        if user_record:
+            return UserAuth(**user_record)
+
     async def register_new_user(self, *, new_user: UserCreate) -> UserInDB:
         # make sure email isn't already taken
         if await self.get_user_by_email(email=new_user.email):
@@ -97,7 +109,7 @@ class UsersRepository(BaseRepository):
                 detail="That email is already taken. Login with that email or register with another one."
             )
         
-        user_password_update = self.auth_service.create_salt_and_hashed_password(
+        user_password_update = await password_hashing_service.create_salt_and_hashed_password(
             plaintext_password=new_user.password)
         new_user_params = new_user.copy(update=user_password_update.dict())
         created_user = await self.db.fetch_one(query=REGISTER_NEW_USER_QUERY, values=new_user_params.dict())
@@ -111,7 +123,8 @@ class UsersRepository(BaseRepository):
         if not user:
             return None
         # if submitted password doesn't match
-        if not self.auth_service.verify_password(password=password, salt=user.salt, hashed_pw=user.password):
+        if not await password_hashing_service.verify_password(password=password, 
+                salt=user.salt, hashed_pw=user.password):
             return None
         return user
 
@@ -9,9 +9,12 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def database_url() -> str:
+    return f"{DATABASE_URL}_test" if os.environ.get("TESTING") else str(DATABASE_URL)
+
+
 async def connect_to_db(app: Optional[FastAPI] = None) -> Database:
-    FINAL_DB_URL = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
-    database = Database(FINAL_DB_URL, min_size=2, max_size=10)
+    database = Database(database_url(), min_size=2, max_size=10)
 
     try:
         await database.connect()
@@ -1,5 +1,5 @@
-from typing import Optional, Dict
-from pydantic import BaseModel
+from typing import Optional, Dict, List
+from pydantic import BaseModel, constr
 from datetime import datetime, date
 from enum import StrEnum
 import json, logging, traceback
@@ -202,6 +202,33 @@ class QsoPublic(QsoInDB):
     id: str
     log_id: str
 
+class QsoOrder(StrEnum):
+    id = 'id'
+    qso_datetime = 'qso_datetime'
+
+AdifFieldName = constr(regex=r"^\w+$", to_upper=True, strip_whitespace=True)
+
+class AdifExportFormat(StrEnum):
+    adi = 'adi'
+    adi_gz = 'adi.gz'
+
+class QsoChangesFormat(StrEnum):
+    json = 'json'
+    adi = 'adi'
+
+class QsoChange(CoreModel):
+    """
+    Qso created or updated after the sync cursor, or only the id of a deleted one
+    """
+    id: str
+    deleted: bool
+    changed_at: datetime
+    qso: Optional[QsoPublic]
+
+class QsoChanges(CoreModel):
+    changes: List[QsoChange]
+    cursor: Optional[str]
+
 class QsoFilter(BaseModel):
     callsign_search: Optional[CallsignSearch]
     band: Optional[Band]
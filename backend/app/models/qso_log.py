@@ -1,4 +1,5 @@
 from typing import Optional, List
+from datetime import datetime
 from app.models.core import DateTimeModelMixin, IDModelMixin, CoreModel, FullCallsign
 from app.models.qso import QsoExtraField
 
@@ -13,6 +14,8 @@ class QsoLogBase(CoreModel):
 class QsoLogInDB(IDModelMixin, DateTimeModelMixin, QsoLogBase):
     user_id: int
     qso_count: Optional[int]
+    qso_first_datetime: Optional[datetime]
+    qso_last_datetime: Optional[datetime]
 
 class QsoLogPublic(QsoLogInDB):
     id: str
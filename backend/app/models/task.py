@@ -7,6 +7,7 @@ from app.models.core import IDStrModelMixin, CoreModel
 class TaskStatus(StrEnum):
     PENDING = "PENDING"
     STARTED = "STARTED"
+    PROGRESS = "PROGRESS"
     RETRY = "RETRY"
     FAILURE = "FAILURE"
     SUCCESS = "SUCCESS"
@@ -44,6 +44,13 @@ class UserInDB(IDModelMixin, DateTimeModelMixin, UserBase):
     salt: str
     is_admin: bool
 
+class UserAuth(IDModelMixin, CoreModel):
+    """
+    The fields checked on authorization, cheap to load and to cache
+    """
+    email_verified: bool
+    is_admin: bool
+
 class UserPublic(IDStrModelMixin, DateTimeModelMixin, UserBase):
     access_token: Optional[AccessToken]
     profile: Optional[ProfilePublic]
@@ -6,9 +6,27 @@ auth_service = AuthService()
 html_templates_service = HTMLTemplatesService()
 qrz_client_service = QrzClient()
 
+from app.services.password_hashing import PasswordHashingService
+password_hashing_service = PasswordHashingService(auth_service)
+
+from app.services.auth_users import AuthUsersService
+auth_users_service = AuthUsersService()
+
 from app.services.email import EmailService
 email_service = EmailService()
 
-from app.services.callsigns_autocomplete import CallsignsTrie
-callsigns_autocomplete_service = CallsignsTrie()
+from app.services.qso_dupes import QsoDupesService
+qso_dupes_service = QsoDupesService()
+
+from app.services.qso_log_owners import QsoLogOwnersService
+qso_log_owners_service = QsoLogOwnersService()
+
+from app.services.adif_export_cache import AdifExportCache
+adif_export_cache = AdifExportCache()
+
+from app.services.qso_events import QsoEventsService
+qso_events_service = QsoEventsService()
+
+from app.services.callsigns_autocomplete import CallsignsAutocompleteService
+callsigns_autocomplete_service = CallsignsAutocompleteService()
 
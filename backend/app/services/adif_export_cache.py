@@ -0,0 +1,128 @@
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Union
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+import aiofiles
+
+from app.core.config import ADIF_EXPORT_CACHE_MAX_BYTES
+from app.models.qso import QsoFilter, AdifExportFormat
+from app.services.static_files import full_path
+
+ADIF_EXPORT_CACHE_DIR = '/adif/exports'
+
+class AdifExportCache:
+    """
+    Rendered ADIF exports on disk, named by log id, log version and a digest of the
+    filter and format. A qso write bumps the log version so stale files are never
+    served. evict() runs in a thread when an export is stored: it removes the files of
+    older versions of a log and keeps the total size limited. drop() is for deleted logs,
+    both scan the directory and are not called on the event loop.
+    """
+
+    def __init__(self, *, 
+            directory: str = ADIF_EXPORT_CACHE_DIR, 
+            max_bytes: int = ADIF_EXPORT_CACHE_MAX_BYTES):
+        self._directory = directory
+        self._max_bytes = max_bytes
+
+    def key(self, *, 
+            log_id: int, 
+            version: int, 
+            qso_filter: QsoFilter, 
+            export_format: AdifExportFormat,
+            extra_fields: Optional[List[str]] = None) -> str:
+        digest = hashlib.sha1(json.dumps(
+            {"filter": qso_filter.dict(), "format": export_format, "fields": extra_fields}, 
+            sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return f"{log_id}-{version}-{digest}"
+
+    def path(self, *, key: str, export_format: AdifExportFormat) -> str:
+        return os.path.join(self._directory, f"{key}.{export_format}")
+
+    def get(self, *, key: str, export_format: AdifExportFormat) -> Optional[str]:
+        file_path = full_path(self.path(key=key, export_format=export_format))
+        try:
+            #mtime is the last use for eviction
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        return file_path
+
+    async def store(self, *, 
+            key: str, 
+            export_format: AdifExportFormat,
+            chunks: AsyncIterator[Union[str, bytes]],
+            is_current: Callable[[], Awaitable[bool]]) -> AsyncIterator[Union[str, bytes]]:
+        """
+        Passes the chunks through while writing them to the cache. The file is kept
+        only if the whole export was rendered and the log version is still current.
+        """
+        os.makedirs(full_path(self._directory), exist_ok=True)
+        file_path = full_path(self.path(key=key, export_format=export_format))
+        tmp_path = f"{file_path}.{uuid.uuid4()}.tmp"
+        complete = False
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as out_file:
+                async for chunk in chunks:
+                    await out_file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                    yield chunk
+            complete = await is_current()
+        finally:
+            if complete:
+                os.replace(tmp_path, file_path)
+                #scans the whole directory, off the event loop
+                await asyncio.to_thread(self.evict)
+            elif os.path.isfile(tmp_path):
+                os.unlink(tmp_path)
+
+    def _files(self):
+        directory = full_path(self._directory)
+        if not os.path.isdir(directory):
+            return []
+        with os.scandir(directory) as entries:
+            return [entry for entry in entries if entry.is_file() and not entry.name.endswith('.tmp')]
+
+    def drop(self, log_id: int) -> None:
+        for entry in self._files():
+            if entry.name.startswith(f"{log_id}-"):
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self) -> None:
+        entries = []
+        versions = {}
+        for entry in self._files():
+            try:
+                log_id, version, _ = entry.name.split('-', 2)
+                version = int(version)
+            except ValueError:
+                continue
+            entries.append((entry, log_id, version))
+            versions[log_id] = max(version, versions.get(log_id, version))
+
+        files = []
+        for entry, log_id, version in entries:
+            try:
+                if version < versions[log_id]:
+                    os.unlink(entry.path)
+                else:
+                    files.append((entry.stat(), entry.path))
+            except FileNotFoundError:
+                pass
+        files.sort(key=lambda file: file[0].st_mtime)
+        total = sum(stat.st_size for stat, _ in files)
+        for stat, file_path in files:
+            if total <= self._max_bytes:
+                break
+            try:
+                os.unlink(file_path)
+                total -= stat.st_size
+            except FileNotFoundError:
+                pass
+        logging.debug("ADIF export cache size %s bytes", total)
@@ -0,0 +1,40 @@
+from typing import Optional
+from collections import OrderedDict
+import time
+
+from app.core.config import AUTH_USERS_CACHE_TTL, AUTH_USERS_CACHE_MAX
+from app.models.user import UserAuth
+
+class AuthUsersService:
+    """
+    Short lived cache of the user fields the auth dependencies need, keyed by the
+    user id from the token. Entries are dropped when the user is updated in this
+    process, other workers see the change after ttl seconds.
+    """
+
+    def __init__(self, *, 
+            ttl: int = AUTH_USERS_CACHE_TTL, 
+            max_users: int = AUTH_USERS_CACHE_MAX):
+        self._ttl = ttl
+        self._max_users = max_users
+        self._users = OrderedDict()
+
+    def get(self, userid: int) -> Optional[UserAuth]:
+        entry = self._users.get(int(userid))
+        if not entry:
+            return None
+        expires, user = entry
+        if expires < time.monotonic():
+            del self._users[int(userid)]
+            return None
+        self._users.move_to_end(int(userid))
+        return user
+
+    def set(self, user: UserAuth) -> None:
+        self._users[int(user.id)] = (time.monotonic() + self._ttl, user)
+        self._users.move_to_end(int(user.id))
+        while len(self._users) > self._max_users:
+            self._users.popitem(last=False)
+
+    def drop(self, userid: int) -> None:
+        self._users.pop(int(userid), None)
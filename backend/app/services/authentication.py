@@ -1,5 +1,8 @@
 import jwt  
 import bcrypt
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta  
 from typing import Optional, Type
 
@@ -7,7 +10,8 @@ from fastapi import HTTPException, status
 from pydantic import ValidationError
 from passlib.context import CryptContext
 
-from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import (SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, 
+        ACCESS_TOKEN_EXPIRE_MINUTES, JWT_CACHE_MAX_TOKENS)
 from app.models.token import JWTMeta, JWTCreds, JWTPayload
 from app.models.user import UserPasswordUpdate, UserBase
 
@@ -23,6 +27,13 @@ class AuthException(BaseException):
 
 
 class AuthService:
+    def __init__(self, *, token_cache_size: int = JWT_CACHE_MAX_TOKENS):
+        #verified token payloads by hash of secret and token, dropped when the token expires
+        self._token_cache_size = token_cache_size
+        self._verified_tokens = OrderedDict()
+        self.token_cache_hits = 0
+        self.token_cache_misses = 0
+
     def create_salt_and_hashed_password(self, *, plaintext_password: str) -> UserPasswordUpdate:
         salt = self.generate_salt()
         hashed_password = self.hash_password(password=plaintext_password, salt=salt)
@@ -71,12 +82,18 @@ class AuthService:
         token_type: str = 'bearer',
         ) -> Optional[str]:
         not_valid = False
-        try:
-            decoded_token = jwt.decode(token, str(secret_key), audience=JWT_AUDIENCE, algorithms=[JWT_ALGORITHM])
-            payload = JWTPayload(**decoded_token)
+        token_key = hashlib.sha256(f"{secret_key}:{token}".encode()).digest()
+        payload = self._get_verified_token(token_key)
+        if payload:
             not_valid = payload.type != token_type
-        except (jwt.PyJWTError, ValidationError):
-            not_valid = True
+        else:
+            try:
+                decoded_token = jwt.decode(token, str(secret_key), audience=JWT_AUDIENCE, algorithms=[JWT_ALGORITHM])
+                payload = JWTPayload(**decoded_token)
+                not_valid = payload.type != token_type
+                self._set_verified_token(token_key, payload)
+            except (jwt.PyJWTError, ValidationError):
+                not_valid = True
         if not_valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -85,3 +102,30 @@ class AuthService:
             )
         return payload.id
 
+    def _get_verified_token(self, token_key: bytes) -> Optional[JWTPayload]:
+        payload = self._verified_tokens.get(token_key)
+        if payload and payload.exp <= time.time():
+            del self._verified_tokens[token_key]
+            payload = None
+        if payload:
+            self.token_cache_hits += 1
+            self._verified_tokens.move_to_end(token_key)
+        else:
+            self.token_cache_misses += 1
+        return payload
+
+    def _set_verified_token(self, token_key: bytes, payload: JWTPayload) -> None:
+        if not self._token_cache_size:
+            return
+        self._verified_tokens[token_key] = payload
+        while len(self._verified_tokens) > self._token_cache_size:
+            self._verified_tokens.popitem(last=False)
+
+    def token_cache_metrics(self) -> dict:
+        lookups = self.token_cache_hits + self.token_cache_misses
+        return {
+            "size": len(self._verified_tokens),
+            "hits": self.token_cache_hits,
+            "misses": self.token_cache_misses,
+            "hit_rate": self.token_cache_hits / lookups if lookups else 0.0,
+        }
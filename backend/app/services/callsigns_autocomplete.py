@@ -1,51 +1,133 @@
+from typing import Iterator, List, Optional, Tuple
 import logging
+import os
+import resource
+import threading
+import time
 
-from app.core.config import STATIC_WWW_ROOT
+from app.core.config import CALLSIGNS_RELOAD_CHECK_INTERVAL
+from app.utils.callsigns_index import (CallsignsIndex, InvalidSnapshotError,
+        CALLSIGNS_SNAPSHOT_PATH, TOP_K, current_corpus_path)
 
-class TrieNode:
-    __slots__ = ('value', 'end_of_word', 'children', 'weight')
+def file_version(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
 
-    def __init__(self, value: str, end_of_word=False):
-        self.value = value
-        self.end_of_word = end_of_word
-        self.children = {}
-        self.weight = -1
+class CallsignsAutocompleteService:
+    """
+    The callsigns index, mapped from the snapshot on first use. Without a current
+    snapshot the index is built from the corpus in this process.
+    Lookups check the corpus and snapshot files at most every check_interval seconds,
+    a new version is loaded in a background thread and swapped in with one assignment:
+    lookups already running keep the old index until they finish, then it is released.
+    """
 
-    def add(self, word_part: str, *, weight: int=-1) -> None:
-        if len(word_part) == 0:
-            self.end_of_word = True
-            self.weight = weight
-            return
-
-        first_char = word_part[0]
-        node = self.children.setdefault(first_char, TrieNode(first_char))
-        node.add(word_part[1:], weight=weight)
+    def __init__(self, *,
+            corpus_path: Optional[str] = None,
+            snapshot_path: str = CALLSIGNS_SNAPSHOT_PATH,
+            check_interval: int = CALLSIGNS_RELOAD_CHECK_INTERVAL):
+        self._corpus_path = corpus_path
+        self._snapshot_path = snapshot_path
+        self._check_interval = check_interval
+        self._index: Optional[CallsignsIndex] = None
+        self._version = None
+        self._checked = time.monotonic()
+        self._reload_lock = threading.Lock()
+        self._metrics = {
+            "reloads": 0,
+            "reload_errors": 0,
+            "last_reload_seconds": None,
+            "last_reload_at": None,
+            "last_reload_memory_growth_kb": None,
+            "memory_high_water_kb": None,
+        }
 
-    def find_all(self, word_part: str, path: str=""):
-        if self.end_of_word and word_part == "":
-            yield path + self.value, self.weight
+    def _files_version(self) -> tuple:
+        corpus_path = self._corpus_path or current_corpus_path()
+        return corpus_path, file_version(corpus_path), file_version(self._snapshot_path)
 
-        if len(word_part) > 0:
-            char = word_part[0]
-            node = self.children.get(char)
+    def load(self) -> CallsignsIndex:
+        corpus_path = self._corpus_path or current_corpus_path()
+        try:
+            if os.path.getmtime(self._snapshot_path) >= os.path.getmtime(corpus_path):
+                return CallsignsIndex.from_snapshot(self._snapshot_path)
+            logging.warning("Callsigns snapshot is older than the corpus")
+        except (OSError, InvalidSnapshotError) as exc:
+            logging.warning("Callsigns snapshot is not available: %s", exc)
+        return CallsignsIndex.from_file(corpus_path)
 
-            if node is not None:
-                yield from node.find_all(word_part[1:], path + self.value)
-        else:
-            for node in self.children.values():
-                yield from node.find_all("", path + self.value)
+    def reload(self) -> bool:
+        """
+        Loads the current version of the files unless it is loaded already or
+        another reload is running. Returns True if the index was swapped.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            version = self._files_version()
+            if version == self._version:
+                return False
+            start = time.perf_counter()
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            index = self.load()
+            self._index, self._version = index, version
+            #ru_maxrss is the process peak in KB, it grows if the reload raised it
+            high_water = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self._metrics.update({
+                "reloads": self._metrics["reloads"] + 1,
+                "last_reload_seconds": time.perf_counter() - start,
+                "last_reload_at": time.time(),
+                "last_reload_memory_growth_kb": high_water - max_rss,
+                "memory_high_water_kb": high_water,
+            })
+            logging.info("Callsigns index is loaded: %s callsigns in %.2f s",
+                    len(index), self._metrics["last_reload_seconds"])
+            return True
+        except Exception:
+            self._metrics["reload_errors"] += 1
+            logging.exception("Callsigns index reload failed")
+            return False
+        finally:
+            self._reload_lock.release()
 
-def CallsignsTrie():
-    logging.info("Reading callsigns")
-    with open(f"{STATIC_WWW_ROOT}/callsigns.txt") as f:
-        callsigns = f.readlines()
+    def _check_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < self._check_interval:
+            return
+        self._checked = now
+        version = self._files_version()
+        if version == self._version:
+            return
+        #the snapshot is rebuilt right after the corpus is written, wait for it
+        #instead of building the index from the corpus in every worker
+        _, corpus_version, snapshot_version = version
+        if (corpus_version and (not snapshot_version or snapshot_version[2] < corpus_version[2]) and
+                time.time() - corpus_version[2] / 1e9 < self._check_interval):
+            return
+        threading.Thread(target=self.reload, name="callsigns-reload", daemon=True).start()
 
-    root = TrieNode("")
+    @property
+    def index(self) -> CallsignsIndex:
+        if self._index is None:
+            self.reload()
+            if self._index is None:
+                raise RuntimeError("Callsigns index is not available")
+        else:
+            self._check_reload()
+        return self._index
 
-    logging.info("Building callsigns trie")
-    for callsign in callsigns:
-        root.add(callsign.rstrip("\n"), weight=1)
-    logging.info("Callsigns trie is ready")
+    def find_all(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        return self.index.find_all(prefix)
 
-    return root
+    def top(self, prefix: str, limit: int = TOP_K) -> List[Tuple[str, int]]:
+        return self.index.top(prefix, limit)
 
+    def metrics(self) -> dict:
+        return {
+            **self._metrics,
+            "callsigns": len(self._index) if self._index is not None else None,
+            "reloading": self._reload_lock.locked(),
+        }
@@ -0,0 +1,81 @@
+from typing import Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import time
+
+from fastapi import HTTPException, status
+
+from app.core.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+from app.models.user import UserPasswordUpdate
+from app.services.authentication import AuthService
+
+class PasswordHashingService:
+    """
+    Runs the bcrypt calls of AuthService in a small thread pool so they don't block
+    the event loop. When more than max_queue calls are waiting for a worker new ones
+    are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, auth_service: AuthService, *,
+            workers: int = PASSWORD_HASH_WORKERS,
+            max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self._auth_service = auth_service
+        self._workers = workers
+        self._max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._max_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+
+    async def _run(self, fn: Callable, **kwargs):
+        if self._pending >= self._workers + self._max_queue:
+            self._rejected += 1
+            logging.warning("Password hashing queue is full: %s", self.metrics())
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login requests, try again later.",
+                headers={"Retry-After": "1"},
+            )
+
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, 
+                    thread_name_prefix="password-hashing")
+
+        self._pending += 1
+        self._max_pending = max(self._max_pending, self._pending)
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, 
+                    lambda: fn(**kwargs))
+        finally:
+            self._pending -= 1
+            self._completed += 1
+            self._wait_seconds += time.perf_counter() - start
+
+    async def create_salt_and_hashed_password(self, *, plaintext_password: str) -> UserPasswordUpdate:
+        return await self._run(self._auth_service.create_salt_and_hashed_password, 
+                plaintext_password=plaintext_password)
+
+    async def verify_password(self, *, password: str, salt: str, hashed_pw: str) -> bool:
+        return await self._run(self._auth_service.verify_password, 
+                password=password, salt=salt, hashed_pw=hashed_pw)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self._workers,
+            "max_queue": self._max_queue,
+            "pending": self._pending,
+            "queued": max(0, self._pending - self._workers),
+            "max_pending": self._max_pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_seconds": self._wait_seconds / self._completed if self._completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
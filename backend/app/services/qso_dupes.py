@@ -0,0 +1,63 @@
+from typing import Optional
+from collections import OrderedDict
+from datetime import datetime
+import time
+
+from app.core.config import QSO_DUPES_INDEX_TTL, QSO_DUPES_INDEX_MAX_LOGS
+from app.db.repositories.qso import QsoRepository
+from app.utils.qso_dupes import QsoDupesIndex
+
+class QsoDupesService:
+    """
+    Dupe indexes of the logs being worked on in this process. An index is loaded
+    on first use and dropped after ttl seconds so qso written by other workers are
+    picked up. The index may be stale: is_dupe confirms a hit in the db before
+    a qso is reported as a dupe, misses are left to the check_qso_dupes trigger.
+    """
+
+    def __init__(self, *, 
+            ttl: int = QSO_DUPES_INDEX_TTL, 
+            max_logs: int = QSO_DUPES_INDEX_MAX_LOGS):
+        self._ttl = ttl
+        self._max_logs = max_logs
+        self._indexes = OrderedDict()
+
+    def loaded(self, log_id: int) -> Optional[QsoDupesIndex]:
+        entry = self._indexes.get(int(log_id))
+        if not entry:
+            return None
+        expires, index = entry
+        if expires < time.monotonic():
+            del self._indexes[int(log_id)]
+            return None
+        self._indexes.move_to_end(int(log_id))
+        return index
+
+    async def get_index(self, *, log_id: int, qso_repo: QsoRepository) -> QsoDupesIndex:
+        index = self.loaded(log_id)
+        if index is None:
+            index = await qso_repo.get_qso_dupes_index(log_id=log_id)
+            self._indexes[int(log_id)] = (time.monotonic() + self._ttl, index)
+            while len(self._indexes) > self._max_logs:
+                self._indexes.popitem(last=False)
+        return index
+
+    async def is_dupe(self, *, 
+            log_id: int, 
+            qso_repo: QsoRepository, 
+            callsign: str, 
+            band: str, 
+            qso_mode: str, 
+            qso_datetime: datetime) -> bool:
+        dupe_key = {"callsign": callsign, "band": band, "qso_mode": qso_mode, "qso_datetime": qso_datetime}
+        index = await self.get_index(log_id=log_id, qso_repo=qso_repo)
+        if not index.is_dupe(**dupe_key):
+            return False
+        if await qso_repo.is_qso_dupe(log_id=log_id, **dupe_key):
+            return True
+        #the qso was deleted or updated by another worker, reload the index on next use
+        self.drop(log_id)
+        return False
+
+    def drop(self, log_id: int) -> None:
+        self._indexes.pop(int(log_id), None)
@@ -0,0 +1,139 @@
+from typing import AsyncIterator, Dict, Optional, Set
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+
+import asyncpg
+
+from app.core.config import QSO_EVENTS_QUEUE_SIZE, QSO_EVENTS_MAX_SUBSCRIBERS
+from app.db.tasks import database_url
+from app.db.repositories.qso import QSO_EVENTS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+#NOTIFY payloads are limited to 8000 bytes, bigger qso are sent by id only
+QSO_EVENT_MAX_PAYLOAD = 7900
+
+class QsoEventsSubscribersLimitError(Exception):
+    pass
+
+class QsoEventsSubscription:
+
+    def __init__(self, log_id: int, queue_size: int):
+        self.log_id = log_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflow = False
+
+class QsoEventsService:
+    """
+    Fan-out of qso events to the subscribers of this process. Every worker LISTENs
+    on one dedicated connection (opened with the first subscription), the events are
+    NOTIFYed by the worker that wrote the qso after the write is committed.
+    A subscriber that falls behind by more than queue_size events is dropped,
+    the client reconnects and catches up with qso:changes-since.
+    A log has at most max_subscribers subscriptions in the process.
+    """
+
+    def __init__(self, *, 
+            queue_size: int = QSO_EVENTS_QUEUE_SIZE,
+            max_subscribers: int = QSO_EVENTS_MAX_SUBSCRIBERS):
+        self._queue_size = queue_size
+        self._max_subscribers = max_subscribers
+        self._subscriptions: Dict[int, Set[QsoEventsSubscription]] = {}
+        self._connection: Optional[asyncpg.Connection] = None
+        self._connecting = asyncio.Lock()
+
+    @staticmethod
+    def event_payload(*, event: str, log_id: int, qso_id: int, qso: Optional[str] = None) -> str:
+        #qso is the QsoPublic json, ids are strings like in the api
+        payload = json.dumps({"event": event, "log_id": str(log_id), "id": str(qso_id)})
+        if qso and len(payload) + len(qso) + 10 < QSO_EVENT_MAX_PAYLOAD:
+            payload = f'{payload[:-1]}, "qso": {qso}}}'
+        return payload
+
+    async def _listen(self) -> None:
+        async with self._connecting:
+            if self._connection and not self._connection.is_closed():
+                return
+            self._connection = await asyncpg.connect(database_url())
+            self._connection.add_termination_listener(self._terminated)
+            await self._connection.add_listener(QSO_EVENTS_CHANNEL, self._dispatch)
+
+    def _terminated(self, connection: asyncpg.Connection) -> None:
+        #events sent while the connection was down are lost, drop everyone so clients resync
+        logger.warning("qso events connection lost")
+        self._connection = None
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                self._drop(subscription)
+
+    def _drop(self, subscription: QsoEventsSubscription) -> None:
+        subscription.overflow = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def _dispatch(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            log_id, event_name = int(event["log_id"]), event["event"]
+        except (ValueError, KeyError, TypeError):
+            logger.error("invalid qso event: %s", payload)
+            return
+        self.publish_local(log_id=log_id, message=f"event: {event_name}\ndata: {payload}\n\n")
+
+    def publish_local(self, *, log_id: int, message: str) -> None:
+        #the server-sent events message is rendered once for all the subscribers of the log
+        for subscription in self._subscriptions.get(log_id, ()):
+            if subscription.overflow:
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def subscribers(self, log_id: int) -> int:
+        return len(self._subscriptions.get(int(log_id), ()))
+
+    def is_full(self, log_id: int) -> bool:
+        return self.subscribers(log_id) >= self._max_subscribers
+
+    @asynccontextmanager
+    async def subscribe(self, log_id: int, *, listen: bool = True) -> AsyncIterator[QsoEventsSubscription]:
+        if listen:
+            await self._listen()
+        #checked after the await: the subscription is added right away
+        if self.is_full(log_id):
+            raise QsoEventsSubscribersLimitError()
+        subscription = QsoEventsSubscription(int(log_id), self._queue_size)
+        self._subscriptions.setdefault(subscription.log_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscriptions = self._subscriptions[subscription.log_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.log_id]
+
+    async def messages(self, subscription: QsoEventsSubscription,
+            timeout: float) -> AsyncIterator[Optional[str]]:
+        """
+        Yields the event messages, None after timeout seconds without events
+        (for keepalives). Ends when the subscription is dropped.
+        """
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if message is None:
+                return
+            yield message
+
+    async def close(self) -> None:
+        if self._connection and not self._connection.is_closed():
+            self._connection.remove_termination_listener(self._terminated)
+            await self._connection.close()
+        self._connection = None
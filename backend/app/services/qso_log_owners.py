@@ -0,0 +1,49 @@
+from typing import Optional
+from collections import OrderedDict
+import time
+
+from app.core.config import QSO_LOG_OWNERS_TTL, QSO_LOG_OWNERS_MAX
+from app.db.repositories.qso_logs import QsoLogsRepository
+
+class QsoLogOwnersService:
+    """
+    Short lived log id -> owner user id mapping for the ownership checks on qso writes.
+    An entry is dropped when the log is deleted in this process, other workers keep it
+    for up to ttl seconds: a qso written to the deleted log meanwhile fails the log
+    foreign key and is answered with 404.
+    """
+
+    def __init__(self, *, 
+            ttl: int = QSO_LOG_OWNERS_TTL, 
+            max_logs: int = QSO_LOG_OWNERS_MAX):
+        self._ttl = ttl
+        self._max_logs = max_logs
+        self._owners = OrderedDict()
+
+    def get(self, log_id: int) -> Optional[int]:
+        entry = self._owners.get(int(log_id))
+        if not entry:
+            return None
+        expires, user_id = entry
+        if expires < time.monotonic():
+            del self._owners[int(log_id)]
+            return None
+        self._owners.move_to_end(int(log_id))
+        return user_id
+
+    def set(self, log_id: int, user_id: int) -> None:
+        self._owners[int(log_id)] = (time.monotonic() + self._ttl, int(user_id))
+        self._owners.move_to_end(int(log_id))
+        while len(self._owners) > self._max_logs:
+            self._owners.popitem(last=False)
+
+    async def get_owner(self, *, log_id: int, qso_logs_repo: QsoLogsRepository) -> Optional[int]:
+        user_id = self.get(log_id)
+        if user_id is None:
+            user_id = await qso_logs_repo.get_log_owner(id=log_id)
+            if user_id is not None:
+                self.set(log_id, user_id)
+        return user_id
+
+    def drop(self, log_id: int) -> None:
+        self._owners.pop(int(log_id), None)
@@ -1,156 +1,381 @@
-from typing import AsyncIterator, Any, Iterator, List, Dict
+from typing import (AsyncIterator, Any, Iterable, Iterator, List, Dict, Mapping, Optional, Sequence, TextIO, 
+        Tuple)
 from decimal import Decimal
+from collections import defaultdict, deque
+from itertools import islice
+import io
+import os
 import time
 import logging
 import re
+import zlib
 from datetime import datetime
 import json
 
+from billiard.pool import Pool
 from chardet.universaldetector import UniversalDetector
 from pydantic import ValidationError
 
 from app.models.qso import QsoBase, QsoMode, Band, def_freq, freq_to_band
 from app.models.core import FullCallsign
 
-def adif_field(name: str, data: Any) -> str:
-    dataStr = str(data) if data else ''
-    return f"<{name.upper()}:{len(dataStr)}>{dataStr} "
+ADIF_EXPORT_CHUNK_SIZE = 64 * 1024
 
+#field name prefixes of the export, the value length and data are appended
+ADIF_EXPORT_PREFIXES = {}
 
-async def create_adif(qsos: AsyncIterator[QsoBase]) -> AsyncIterator[str]:
-    yield f"""ADIF Export from HAMBOOK.net
+def adif_export_prefix(name: str) -> str:
+    prefix = ADIF_EXPORT_PREFIXES.get(name)
+    if prefix is None:
+        prefix = ADIF_EXPORT_PREFIXES[name] = f"<{name.upper()}:"
+    return prefix
+
+def adif_export_freq(freq: Optional[Decimal]) -> str:
+    #freq is stored in kHz, ADIF wants MHz
+    return str(Decimal(freq) / 1000) if freq else ''
+
+def adif_export_fields(fields: Optional[List[str]], 
+        log_extra_fields: Optional[List[str]]) -> Optional[List[str]]:
+    #the extra fields to export: requested ones, else the log's ones, else the whole extra
+    if fields is not None:
+        return fields
+    return log_extra_fields or None
+
+def adif_export_record(qso: Mapping[str, Any], extra_fields: Optional[Sequence[str]] = None) -> str:
+    qso_datetime = qso["qso_datetime"]
+    qso_date = qso_datetime.strftime("%Y%m%d")
+    qso_time = qso_datetime.strftime("%H%M%S")
+    callsign = qso["callsign"] or ''
+    station_callsign = qso["station_callsign"] or ''
+    band = qso["band"] or ''
+    qso_mode = qso["qso_mode"] or ''
+    freq = adif_export_freq(qso["freq"])
+    rst_r = str(qso["rst_r"]) if qso["rst_r"] else ''
+    rst_s = str(qso["rst_s"]) if qso["rst_s"] else ''
+    record = (f"<CALL:{len(callsign)}>{callsign}  "
+        f"<QSO_DATE:{len(qso_date)}>{qso_date}  "
+        f"<TIME_ON:{len(qso_time)}>{qso_time}  "
+        f"<TIME_OFF:{len(qso_time)}>{qso_time}  "
+        f"<BAND:{len(band)}>{band}  "
+        f"<STATION_CALLSIGN:{len(station_callsign)}>{station_callsign}  "
+        f"<FREQ:{len(freq)}>{freq}  "
+        f"<MODE:{len(qso_mode)}>{qso_mode}  "
+        f"<RST_RCVD:{len(rst_r)}>{rst_r}  "
+        f"<RST_SENT:{len(rst_s)}>{rst_s} ")
+
+    fields = []
+    if extra_fields is None:
+        extra = qso["extra"]
+        if isinstance(extra, str):
+            extra = json.loads(extra)
+        if extra:
+            for name, value in extra.items():
+                value = str(value) if value else ''
+                fields.append(f"{adif_export_prefix(name)}{len(value)}>{value} ")
+    else:
+        #projected extra fields come as extra_<n> columns, missing ones are skipped
+        for idx, name in enumerate(extra_fields):
+            value = qso[f"extra_{idx}"]
+            if value is not None:
+                fields.append(f"{adif_export_prefix(name)}{len(value)}>{value} ")
+    if fields:
+        record += ' '.join(fields)
+
+    return record + " <EOR>\n"
+
+async def create_adif(qso_batches: AsyncIterator[Iterable[Mapping[str, Any]]], 
+        chunk_size: int = ADIF_EXPORT_CHUNK_SIZE,
+        extra_fields: Optional[Sequence[str]] = None) -> AsyncIterator[str]:
+    """
+    Renders batches of raw qso rows to ADIF and yields the text in chunks of about
+    chunk_size chars instead of a string per record. With extra_fields the rows
+    hold only these extra fields (see qso_log_batches), otherwise the whole extra.
+    """
+    chunk = [f"""ADIF Export from HAMBOOK.net
+Logs generated @ {time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())}
+<EOH>"""]
+    chunk_len = len(chunk[0])
+
+    async for qso_batch in qso_batches:
+        for qso in qso_batch:
+            record = adif_export_record(qso, extra_fields)
+            chunk.append(record)
+            chunk_len += len(record)
+            if chunk_len >= chunk_size:
+                yield ''.join(chunk)
+                chunk, chunk_len = [], 0
+
+    if chunk:
+        yield ''.join(chunk)
+
+def create_adif_changes(changes: Iterable[Mapping[str, Any]]) -> str:
+    """
+    Renders a page of qso changes (see QsoRepository.get_qso_changes),
+    every record carries the qso id, deleted qso are records of the id only
+    """
+    records = [f"""ADIF Changes from HAMBOOK.net
 Logs generated @ {time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())}
-<EOH>"""
-
-    async for qso in qsos:
-        yield ' '.join((
-            adif_field("CALL", qso.callsign),
-            adif_field("QSO_DATE", qso.qso_datetime.strftime("%Y%m%d")),
-            adif_field("TIME_ON", qso.qso_datetime.strftime("%H%M%S")),
-            adif_field("TIME_OFF", qso.qso_datetime.strftime("%H%M%S")),
-            adif_field("BAND", qso.band),
-            adif_field("STATION_CALLSIGN", qso.station_callsign),
-            adif_field("FREQ", Decimal(qso.freq)/1000),
-            adif_field("MODE", qso.qso_mode),
-            adif_field("RST_RCVD", qso.rst_r),
-            adif_field("RST_SENT", qso.rst_s)))
-        if qso.extra:
-            yield ' '.join([adif_field(field, value) for field, value in qso.extra.items()])
-        yield " <EOR>\n"
-
-def parse_adif(file_path: str, log_settings: dict, qso_errors: Dict) -> Iterator[QsoBase]:
-    re_field = re.compile(r"<(\w+):(\d+):?\w*>")
-    re_digits = re.compile(r"\D.*")
-
-    def get_rst(rst_str):
-        sign = 1
-        if rst_str.startswith('-'):
-            sign = -1
-            rst_str = rst_str[1:]
-        return int(re_digits.sub('', rst_str.lstrip('0+')) or '0') * sign
+<EOH>"""]
+    for change in changes:
+        qso_id = str(change["id"])
+        id_field = f"<APP_HAMBOOK_ID:{len(qso_id)}>{qso_id} "
+        if change["deleted"]:
+            records.append(f"{id_field} <APP_HAMBOOK_DELETED:1>Y  <EOR>\n")
+        else:
+            records.append(f"{id_field} {adif_export_record(change)}")
+    return ''.join(records)
 
+async def gzip_adif(chunks: AsyncIterator[str], level: int = 6) -> AsyncIterator[bytes]:
+    """
+    Compresses the create_adif chunks to a gzip stream as they come,
+    memory use doesn't depend on the log size
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+ADIF_READ_BLOCK_SIZE = 1024 * 1024
+ADIF_PARSE_CHUNK_SIZE = 16 * 1024 * 1024
+ADIF_CORE_FIELDS = ("CALL", "QSO_DATE", "TIME_ON", "TIME_OFF", "BAND",
+        "FREQ", "MODE", "STATION_CALLSIGN", "RST_RCVD", "RST_SENT")
+
+RE_DIGITS = re.compile(r"\D.*")
+RE_ADIF_TAG = re.compile(r"<(\w+)(?::(\d+)(?::\w*)?)?>")
+
+def detect_encoding(file_path: str, block_size: int = ADIF_READ_BLOCK_SIZE) -> str:
     detector = UniversalDetector()
     detector.reset()
     with open(file_path, 'rb') as file:
-        for line in file:
-            detector.feed(line)
+        while block := file.read(block_size):
+            detector.feed(block)
             if detector.done:
                 break
         detector.close()
-        encoding = detector.result['encoding']
-        if (not encoding):
-            encoding = 'ascii'
+    return detector.result['encoding'] or 'ascii'
 
-    with open(file_path, 'r', encoding=encoding) as file:
-        eoh = False
-        buf = ''
-
-        for line in file:
-            line = line.upper()
-            if not eoh and '<EOH>' in line:
-                eoh = True
-                buf = line.split('<EOH>')[1]
+def adif_records(file: TextIO, block_size: int = ADIF_READ_BLOCK_SIZE) -> Iterator[Dict[str, str]]:
+    """
+    Single pass ADIF tokenizer: reads the file in fixed size blocks and uses the
+    <NAME:LEN> length prefix to slice field data instead of scanning it.
+    Yields a dict of non-empty fields (names and values uppercased) per record.
+    Fields found before <EOH> belong to the header and are dropped.
+    """
+    buf, pos = '', 0
+    fields = {}
+    search_tag = RE_ADIF_TAG.search
+
+    def fill(need: int) -> bool:
+        #drop the consumed part of the buffer and read blocks until it holds `need` chars
+        nonlocal buf, pos
+        buf = buf[pos:]
+        pos = 0
+        while len(buf) < need:
+            block = file.read(block_size)
+            if not block:
+                return False
+            buf += block
+        return True
+
+    while True:
+        match = search_tag(buf, pos)
+        if not match:
+            #keep a possibly incomplete tag at the end of the buffer and read further
+            tail = buf.rfind('<', pos)
+            pos = len(buf) if tail == -1 else tail
+            if not fill(len(buf) - pos + 1):
+                break
+            continue
+
+        name, length = match.groups()
+        name = name.upper()
+        pos = match.end()
+        if length is None:
+            if name == 'EOR':
+                if fields:
+                    yield fields
+                fields = {}
+            elif name == 'EOH':
+                fields = {}
+            continue
+
+        length = int(length)
+        if not length:
+            continue
+        if len(buf) < pos + length:
+            fill(length)
+        fields[name] = buf[pos : pos + length].upper()
+        pos += length
+
+def get_rst(rst_str: str) -> int:
+    sign = 1
+    if rst_str.startswith('-'):
+        sign = -1
+        rst_str = rst_str[1:]
+    return int(RE_DIGITS.sub('', rst_str.lstrip('0+')) or '0') * sign
+
+def qso_from_fields(qso_fields: Dict[str, str], log_settings: dict, qso_errors: Dict) -> Optional[QsoBase]:
+    try:
+        qso_data = {}
+        try:
+            qso_data['callsign'] = FullCallsign(qso_fields.get("CALL"))
+        except Exception:
+            qso_errors['Missing or invalid field CALL'] += 1
+            return None
+        qso_time = qso_fields.get("TIME_ON") or qso_fields.get("TIME_OFF")
+        if not qso_time:
+            qso_errors['Missing or invalid fields TIME_ON and TIME_OFF'] += 1
+            return None
+        datetime_format = '%Y%m%d %H%M%S' if len(qso_time) == 6 else '%Y%m%d %H%M'
+        try:
+            qso_data['qso_datetime'] = datetime.strptime(
+                    f'{qso_fields.get("QSO_DATE")} {qso_time}',
+                    datetime_format)
+        except Exception:
+            qso_errors['Missing or invalid field QSO_DATE'] += 1
+            return None
+        qso_data['station_callsign'] = (qso_fields.get("STATION_CALLSIGN") or 
+                log_settings.get('callsign'))
+
+        try:
+            qso_data['qso_mode'] = QsoMode(qso_fields.get("MODE"))
+        except Exception:
+            qso_errors['Missing or invalid field MODE'] += 1
+            logging.error('Invalid mode value: %s', qso_fields.get("MODE"))
+            return None
+
+        try:
+            qso_data['band'] = Band(qso_fields.get("BAND"))
+        except Exception:
+            qso_data['band'] = None
+
+        try:
+            qso_data['freq'] = Decimal(qso_fields.get("FREQ"))*1000
+        except Exception:
+            qso_data['freq'] = None
+
+        if not qso_data['freq']:
+            if qso_data['band']:
+                qso_data['freq'] = def_freq(qso_data['band'], qso_data['qso_mode'])
             else:
-                buf += line
-
-            if '<EOR>' in buf:
-                if buf.strip().endswith('<EOR>'):
-                    qso_lines, buf = buf, ''
-                else:
-                    qso_lines, buf = buf.rsplit('<EOR>', 1)
-                qso_lines = qso_lines.split('<EOR>')
-                for qso_line in qso_lines:
-                    if '<' in qso_line:
-                        qso_fields = {}
-                        for match in re_field.finditer(qso_line):
-                            name, length = match.groups()
-                            if length != '0':
-                                field_start = match.end()
-                                qso_fields[name] = qso_line[field_start : field_start + int(length)]
-                        try:
-                            qso_data = {}
-                            try:
-                                qso_data['callsign'] = FullCallsign(qso_fields.get("CALL"))
-                            except Exception:
-                                qso_errors['Missing or invalid field CALL'] += 1
-                                continue
-                            qso_time = qso_fields.get("TIME_ON") or qso_fields.get("TIME_OFF")
-                            if not qso_time:
-                                qso_errors['Missing or invalid fields TIME_ON and TIME_OFF'] += 1
-                                continue
-                            datetime_format = '%Y%m%d %H%M%S' if len(qso_time) == 6 else '%Y%m%d %H%M'
-                            try:
-                                qso_data['qso_datetime'] = datetime.strptime(
-                                        f'{qso_fields.get("QSO_DATE")} {qso_time}',
-                                        datetime_format)
-                            except Exception:
-                                qso_errors['Missing or invalid field QSO_DATE'] += 1
-                                continue
-                            qso_data['station_callsign'] = (qso_fields.get("STATION_CALLSIGN") or 
-                                    log_settings.get('callsign'))
-
-                            try:
-                                qso_data['qso_mode'] = QsoMode(qso_fields.get("MODE"))
-                            except Exception:
-                                qso_errors['Missing or invalid field MODE'] += 1
-                                logging.error('Invalid mode value: %s', qso_fields.get("MODE"))
-                                continue
-
-                            try:
-                                qso_data['band'] = Band(qso_fields.get("BAND"))
-                            except Exception:
-                                qso_data['band'] = None
-
-                            try:
-                                qso_data['freq'] = Decimal(qso_fields.get("FREQ"))*1000
-                            except Exception:
-                                qso_data['freq'] = None
-
-                            if not qso_data['freq']:
-                                if qso_data['band']:
-                                    qso_data['freq'] = def_freq(qso_data['band'], qso_data['qso_mode'])
-                                else:
-                                    qso_errors['Missing or invalid fields BAND and FREQ'] += 1
-                                    continue
-                            if not qso_data['band']:
-                                qso_data['band'] = freq_to_band(qso_data['freq'])
- 
-                            qso_data['rst_r'] = get_rst(qso_fields.get("RST_RCVD"))
-                            qso_data['rst_s'] = get_rst(qso_fields.get("RST_SENT"))
-                            qso_data['extra'] = {field: value for field, value in qso_fields.items() 
-                                    if field not in ("CALL", "QSO_DATE", "TIME_ON", "TIME_OFF", "BAND",
-                                            "FREQ", "MODE", "STATION_CALLSIGN", "RST_RCVD", "RST_SENT") 
-                                        and value}
-                            yield QsoBase(**qso_data)
-                        except ValidationError as exc:
-                            exc_data = json.loads(exc.json())
-                            for err in exc_data:
-                                if 'callsign' in err['loc']:
-                                    qso_errors['Missing or invalid field CALL'] += 1
-                                else:
-                                    logging.error(err)
-                                    logging.error(qso_line)
-                        except Exception as exc:
-                            logging.exception(exc)
-                            logging.error(qso_line)
+                qso_errors['Missing or invalid fields BAND and FREQ'] += 1
+                return None
+        if not qso_data['band']:
+            qso_data['band'] = freq_to_band(qso_data['freq'])
 
+        qso_data['rst_r'] = get_rst(qso_fields.get("RST_RCVD"))
+        qso_data['rst_s'] = get_rst(qso_fields.get("RST_SENT"))
+        qso_data['extra'] = {field: value for field, value in qso_fields.items() 
+                if field not in ADIF_CORE_FIELDS}
+        return QsoBase(**qso_data)
+    except ValidationError as exc:
+        exc_data = json.loads(exc.json())
+        for err in exc_data:
+            if 'callsign' in err['loc']:
+                qso_errors['Missing or invalid field CALL'] += 1
+            else:
+                logging.error(err)
+                logging.error(qso_fields)
+    except Exception as exc:
+        logging.exception(exc)
+        logging.error(qso_fields)
+
+def adif_text_chunks(file: TextIO, 
+        chunk_size: int = ADIF_PARSE_CHUNK_SIZE, 
+        block_size: int = ADIF_READ_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Splits the ADIF text into chunks of about chunk_size chars. The tags are found
+    the same way as in adif_records (field data is skipped by its length), so every
+    chunk except the last one ends right after a real <EOR> tag.
+    """
+    buf, pos = '', 0
+    search_tag = RE_ADIF_TAG.search
+
+    def fill(need: int) -> bool:
+        #unlike adif_records the buffer holds the whole current chunk
+        nonlocal buf
+        while len(buf) < need:
+            block = file.read(block_size)
+            if not block:
+                return False
+            buf += block
+        return True
+
+    while True:
+        match = search_tag(buf, pos)
+        if not match:
+            tail = buf.rfind('<', pos)
+            pos = len(buf) if tail == -1 else tail
+            if not fill(len(buf) + 1):
+                break
+            continue
+
+        name, length = match.groups()
+        pos = match.end()
+        if length is None:
+            if pos >= chunk_size and name.upper() == 'EOR':
+                yield buf[:pos]
+                buf, pos = buf[pos:], 0
+            continue
+        pos += int(length)
+        fill(pos)
+
+    if buf:
+        yield buf
+
+def parse_adif_chunk(data: str, log_settings: dict) -> Tuple[List[QsoBase], Dict[str, int]]:
+    qso_errors = defaultdict(int)
+    qsos = [qso for qso in (qso_from_fields(qso_fields, log_settings, qso_errors)
+            for qso_fields in adif_records(io.StringIO(data))) if qso]
+    return qsos, dict(qso_errors)
+
+def parse_adif_parallel(file: TextIO,
+        log_settings: dict, 
+        qso_errors: Dict, 
+        workers: int,
+        chunk_size: int = ADIF_PARSE_CHUNK_SIZE,
+        block_size: int = ADIF_READ_BLOCK_SIZE) -> Iterator[QsoBase]:
+    """
+    Parses the file chunks in a process pool, QSO are yielded and errors are counted
+    in file order. At most 2 * workers chunks are pending at a time.
+    The pool is billiard's: unlike multiprocessing it can be started from
+    a celery prefork worker, which is a daemon process itself.
+    """
+    chunks = adif_text_chunks(file, chunk_size=chunk_size, block_size=block_size)
+    with Pool(processes=workers) as pool:
+        pending = deque()
+        while True:
+            for data in islice(chunks, workers * 2 - len(pending)):
+                pending.append(pool.apply_async(parse_adif_chunk, (data, log_settings)))
+            if not pending:
+                break
+            qsos, chunk_errors = pending.popleft().get()
+            for error, count in chunk_errors.items():
+                qso_errors[error] += count
+            yield from qsos
+
+def parse_adif(file_path: str, 
+        log_settings: dict, 
+        qso_errors: Dict, 
+        block_size: int = ADIF_READ_BLOCK_SIZE,
+        workers: int = 1,
+        chunk_size: int = ADIF_PARSE_CHUNK_SIZE) -> Iterator[QsoBase]:
+    encoding = detect_encoding(file_path, block_size=block_size)
+
+    if workers > 1 and os.path.getsize(file_path) > chunk_size:
+        with open(file_path, 'r', encoding=encoding) as file:
+            yield from parse_adif_parallel(file, 
+                    log_settings=log_settings, 
+                    qso_errors=qso_errors, 
+                    workers=workers, 
+                    chunk_size=chunk_size,
+                    block_size=block_size)
+        return
+
+    with open(file_path, 'r', encoding=encoding) as file:
+        for qso_fields in adif_records(file, block_size=block_size):
+            qso = qso_from_fields(qso_fields, log_settings, qso_errors)
+            if qso:
+                yield qso
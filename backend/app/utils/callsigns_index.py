@@ -0,0 +1,275 @@
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from array import array
+from bisect import bisect_left
+from heapq import nlargest
+import logging
+import mmap
+import os
+import struct
+import sys
+
+from app.core.config import STATIC_WWW_ROOT, CALLSIGN_REGISTERED_WEIGHT
+
+CALLSIGNS_PATH = f"{STATIC_WWW_ROOT}/callsigns.txt"
+#callsigns.txt with popularity weights, written by the callsign_weights task
+CALLSIGNS_WEIGHTED_PATH = f"{STATIC_WWW_ROOT}/callsigns_weighted.txt"
+CALLSIGNS_SNAPSHOT_PATH = f"{STATIC_WWW_ROOT}/callsigns.idx"
+SAMPLE_STEP = 32
+#the best callsigns by weight are kept for the prefixes up to TOP_PREFIX_LEN chars
+TOP_K = 20
+TOP_PREFIX_LEN = 3
+CALLSIGN_MIN_QSO = 3
+
+#snapshot layout: header, callsigns data, offsets (uint32, from the file start), weights (int32),
+#top lists (int32, TOP_K callsign indexes per prefix), top prefix offsets (uint32), top prefixes
+#the arrays are in native byte order, the snapshot is built on the host that uses it
+SNAPSHOT_HEADER = struct.Struct("<4sIIIII")
+SNAPSHOT_MAGIC = b"HBCI"
+SNAPSHOT_VERSION = 2
+
+class InvalidSnapshotError(Exception):
+    pass
+
+class CallsignsIndex:
+    """
+    Sorted callsigns packed back to back in one bytes buffer, the i-th callsign is
+    data[offsets[i]:offsets[i + 1]]. The callsigns starting with a prefix are a
+    contiguous range of the array found with two binary searches, the index is
+    three flat buffers (and a sample of every SAMPLE_STEP-th callsign) instead of
+    a python object per trie node.
+    Short prefixes matching more than TOP_K callsigns have their TOP_K best
+    callsigns by weight precomputed, so ranked lookups don't scan their range.
+    """
+    __slots__ = ('_data', '_offsets', '_weights', '_sample', '_top', '_top_prefixes')
+
+    def __init__(self, data: bytes, offsets: Sequence[int], weights: Sequence[int],
+            top: Optional[Sequence[int]] = None, 
+            top_prefixes: Optional[Iterable[bytes]] = None):
+        self._data = data
+        self._offsets = offsets
+        self._weights = weights
+        #every SAMPLE_STEP-th callsign for a first binary search in C
+        self._sample = [data[offsets[idx]:offsets[idx + 1]] for idx in range(0, len(weights), SAMPLE_STEP)]
+        if top is None:
+            top_prefixes, top = self._top_lists()
+        self._top = top
+        self._top_prefixes = {prefix: slot for slot, prefix in enumerate(top_prefixes)}
+
+    @classmethod
+    def build(cls, callsigns: Iterable[Tuple[str, int]]) -> 'CallsignsIndex':
+        #a repeated callsign keeps the last weight
+        entries = {}
+        for callsign, weight in callsigns:
+            if callsign:
+                entries[callsign.encode()] = weight
+        keys = sorted(entries)
+
+        offsets = array('I', [0])
+        weights = array('i')
+        position = 0
+        for key in keys:
+            position += len(key)
+            offsets.append(position)
+            weights.append(entries[key])
+        return cls(b''.join(keys), offsets, weights)
+
+    @classmethod
+    def from_file(cls, path: str = CALLSIGNS_PATH) -> 'CallsignsIndex':
+        logging.info("Building callsigns index")
+        with open(path) as file:
+            index = cls.build(read_corpus(file))
+        logging.info("Callsigns index is ready: %s callsigns", len(index))
+        return index
+
+    @classmethod
+    def from_snapshot(cls, path: str = CALLSIGNS_SNAPSHOT_PATH) -> 'CallsignsIndex':
+        """
+        Maps the snapshot read only: nothing is copied, the pages are read on demand
+        and shared by all the processes mapping the file
+        """
+        with open(path, 'rb') as file:
+            snapshot = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(snapshot) < SNAPSHOT_HEADER.size:
+            raise InvalidSnapshotError(path)
+        magic, version, count, data_size, top_k, top_count = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or top_k != TOP_K:
+            raise InvalidSnapshotError(path)
+        offsets_start = snapshot_offsets_start(data_size)
+        weights_start = offsets_start + (count + 1) * 4
+        top_start = weights_start + count * 4
+        top_offsets_start = top_start + top_count * TOP_K * 4
+        top_prefixes_start = top_offsets_start + (top_count + 1) * 4
+        if len(snapshot) < top_prefixes_start:
+            raise InvalidSnapshotError(path)
+
+        view = memoryview(snapshot)
+        top_offsets = view[top_offsets_start:top_prefixes_start].cast('I')
+        if len(snapshot) != top_prefixes_start + top_offsets[-1]:
+            raise InvalidSnapshotError(path)
+        top_prefixes = snapshot[top_prefixes_start:]
+        return cls(snapshot, 
+                view[offsets_start:weights_start].cast('I'), 
+                view[weights_start:top_start].cast('i'),
+                view[top_start:top_offsets_start].cast('i'),
+                (top_prefixes[top_offsets[slot]:top_offsets[slot + 1]] for slot in range(top_count)))
+
+    def save(self, path: str = CALLSIGNS_SNAPSHOT_PATH) -> None:
+        data_start, data_end = self._offsets[0], self._offsets[-1]
+        shift = SNAPSHOT_HEADER.size - data_start
+        offsets = array('I', (offset + shift for offset in self._offsets))
+        weights = array('i', self._weights)
+        data_size = data_end - data_start
+        padding = snapshot_offsets_start(data_size) - SNAPSHOT_HEADER.size - data_size
+        top = array('i', self._top)
+        top_offsets = array('I', [0])
+        for prefix in self._top_prefixes:
+            top_offsets.append(top_offsets[-1] + len(prefix))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(self), data_size,
+                TOP_K, len(self._top_prefixes)))
+            file.write(self._data[data_start:data_end])
+            file.write(b'\0' * padding)
+            offsets.tofile(file)
+            weights.tofile(file)
+            top.tofile(file)
+            top_offsets.tofile(file)
+            file.write(b''.join(self._top_prefixes))
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def callsign(self, idx: int) -> str:
+        return self._data[self._offsets[idx]:self._offsets[idx + 1]].decode()
+
+    def _top_lists(self) -> Tuple[List[bytes], array]:
+        #walks the prefix ranges of every length up to TOP_PREFIX_LEN, jumping from range to range
+        prefixes, top = [], array('i')
+        data, offsets, count = self._data, self._offsets, len(self)
+        by_weight = self._weights.__getitem__
+        for prefix_len in range(TOP_PREFIX_LEN + 1):
+            start = 0
+            while start < count:
+                if offsets[start + 1] - offsets[start] < prefix_len:
+                    start += 1
+                    continue
+                prefix = data[offsets[start]:offsets[start] + prefix_len]
+                end = self._prefix_range(prefix)[1]
+                if end - start > TOP_K:
+                    prefixes.append(prefix)
+                    #nlargest is stable, equal weights stay in callsigns order
+                    top.extend(nlargest(TOP_K, range(start, end), key=by_weight))
+                start = end
+        return prefixes, top
+
+    def _lower_bound(self, key: bytes) -> int:
+        #index of the first callsign >= key: the sample narrows the range to SAMPLE_STEP callsigns
+        data, offsets = self._data, self._offsets
+        sample_idx = bisect_left(self._sample, key)
+        lo = (sample_idx - 1) * SAMPLE_STEP + 1 if sample_idx else 0
+        hi = min(sample_idx * SAMPLE_STEP, len(self))
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[offsets[mid]:offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """
+        (start, end) indexes of the callsigns starting with prefix
+        """
+        return self._prefix_range(prefix.encode())
+
+    def _prefix_range(self, prefix: bytes) -> Tuple[int, int]:
+        start = self._lower_bound(prefix)
+
+        #the range ends at the first callsign >= the next prefix of the same length
+        prefix = prefix.rstrip(b'\xff')
+        if not prefix:
+            return start, len(self)
+        return start, self._lower_bound(prefix[:-1] + bytes((prefix[-1] + 1,)))
+
+    def find_all(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """
+        Yields (callsign, weight) of the callsigns starting with prefix in sorted order
+        """
+        start, end = self.prefix_range(prefix)
+        for idx in range(start, end):
+            yield self.callsign(idx), self._weights[idx]
+
+    def top(self, prefix: str, limit: int = TOP_K) -> List[Tuple[str, int]]:
+        """
+        (callsign, weight) of the best limit callsigns starting with prefix,
+        by weight descending then in sorted order
+        """
+        key = prefix.encode()
+        slot = self._top_prefixes.get(key)
+        if slot is not None and limit <= TOP_K:
+            indexes = self._top[slot * TOP_K:slot * TOP_K + limit]
+        else:
+            start, end = self._prefix_range(key)
+            indexes = nlargest(limit, range(start, end), key=self._weights.__getitem__)
+        return [(self.callsign(idx), self._weights[idx]) for idx in indexes]
+
+def read_corpus(lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    #a callsign per line, optionally followed by a tab and the weight
+    for line in lines:
+        callsign, _, weight = line.strip().partition('\t')
+        yield callsign, int(weight) if weight else 1
+
+def current_corpus_path() -> str:
+    #the weighted corpus once the callsign_weights task has written it
+    return CALLSIGNS_WEIGHTED_PATH if os.path.exists(CALLSIGNS_WEIGHTED_PATH) else CALLSIGNS_PATH
+
+def write_weighted_corpus(weights: Iterable[Tuple[str, int, bool]],
+        path: str = CALLSIGNS_WEIGHTED_PATH,
+        base_path: str = CALLSIGNS_PATH,
+        registered_weight: int = CALLSIGN_REGISTERED_WEIGHT) -> int:
+    """
+    Writes the base corpus with weights from (callsign, qso count, registered):
+    1 + qso count, registered callsigns get registered_weight more. Worked callsigns
+    missing in the base corpus are added when registered or worked CALLSIGN_MIN_QSO times,
+    so a typo in a single qso doesn't become a suggestion. Returns the callsigns count.
+    """
+    with open(base_path) as file:
+        corpus = dict(read_corpus(file))
+    corpus.pop('', None)
+    for callsign, qso_count, registered in weights:
+        if callsign in corpus or registered or qso_count >= CALLSIGN_MIN_QSO:
+            corpus[callsign] = (corpus.get(callsign, 1) + qso_count + 
+                    (registered_weight if registered else 0))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.writelines(f"{callsign}\t{weight}\n" for callsign, weight in corpus.items())
+    os.replace(tmp_path, path)
+    return len(corpus)
+
+def snapshot_offsets_start(data_size: int) -> int:
+    #the offsets array is 4 bytes aligned
+    return (SNAPSHOT_HEADER.size + data_size + 3) // 4 * 4
+
+def build_snapshot(corpus_path: Optional[str] = None, 
+        snapshot_path: str = CALLSIGNS_SNAPSHOT_PATH, 
+        force: bool = False) -> bool:
+    """
+    Compiles the corpus to the snapshot if it is missing or older than the corpus
+    """
+    corpus_path = corpus_path or current_corpus_path()
+    if (not force and os.path.exists(snapshot_path) and 
+            os.path.getmtime(snapshot_path) >= os.path.getmtime(corpus_path)):
+        return False
+    CallsignsIndex.from_file(corpus_path).save(snapshot_path)
+    return True
+
+if __name__ == '__main__':
+    #build step: python -m app.utils.callsigns_index [--force]
+    logging.basicConfig(level=logging.INFO)
+    if build_snapshot(force='--force' in sys.argv):
+        logging.info("Callsigns snapshot is written to %s", CALLSIGNS_SNAPSHOT_PATH)
+    else:
+        logging.info("Callsigns snapshot is up to date")
@@ -0,0 +1,52 @@
+from typing import Tuple
+from collections import defaultdict
+from datetime import datetime, timezone
+
+#check_qso_dupes trigger rule: same callsign, band and mode within 5 minutes in the same log
+DUPE_INTERVAL_SECONDS = 300
+
+def qso_timestamp(qso_datetime: datetime) -> float:
+    #naive datetimes are stored as utc by the db driver
+    if qso_datetime.tzinfo is None:
+        qso_datetime = qso_datetime.replace(tzinfo=timezone.utc)
+    return qso_datetime.timestamp()
+
+class QsoDupesIndex:
+    """
+    In-memory copy of a log's dupe keys. QSO timestamps are grouped in
+    DUPE_INTERVAL_SECONDS buckets so a check looks at three short lists at most.
+    """
+    __slots__ = ('_buckets', 'size')
+
+    def __init__(self):
+        self._buckets = defaultdict(list)
+        self.size = 0
+
+    @staticmethod
+    def _key(callsign: str, band: str, qso_mode: str, bucket: int) -> Tuple[str, str, str, int]:
+        return (str(callsign), str(band), str(qso_mode), bucket)
+
+    def is_dupe(self, *, callsign: str, band: str, qso_mode: str, qso_datetime: datetime) -> bool:
+        timestamp = qso_timestamp(qso_datetime)
+        bucket = int(timestamp // DUPE_INTERVAL_SECONDS)
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            for other in self._buckets.get(self._key(callsign, band, qso_mode, neighbour), ()):
+                if abs(other - timestamp) < DUPE_INTERVAL_SECONDS:
+                    return True
+        return False
+
+    def add(self, *, callsign: str, band: str, qso_mode: str, qso_datetime: datetime) -> None:
+        timestamp = qso_timestamp(qso_datetime)
+        bucket = int(timestamp // DUPE_INTERVAL_SECONDS)
+        self._buckets[self._key(callsign, band, qso_mode, bucket)].append(timestamp)
+        self.size += 1
+
+    def remove(self, *, callsign: str, band: str, qso_mode: str, qso_datetime: datetime) -> None:
+        timestamp = qso_timestamp(qso_datetime)
+        key = self._key(callsign, band, qso_mode, int(timestamp // DUPE_INTERVAL_SECONDS))
+        timestamps = self._buckets.get(key)
+        if timestamps and timestamp in timestamps:
+            timestamps.remove(timestamp)
+            self.size -= 1
+            if not timestamps:
+                del self._buckets[key]
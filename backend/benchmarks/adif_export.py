@@ -0,0 +1,101 @@
+"""
+ADIF export rendering throughput: legacy QsoInDB + string per field/record vs
+create_adif over raw row batches. Rows are synthetic, no database is needed.
+
+    python -m benchmarks.adif_export [qso_count ...]
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, List
+
+from app.models.qso import QsoInDB
+from app.utils.adif import create_adif
+from benchmarks.common import BANDS_FREQS, MODES, random_callsign, timer
+
+BATCH_SIZE = 5000
+
+def legacy_adif_field(name: str, data: Any) -> str:
+    dataStr = str(data) if data else ''
+    return f"<{name.upper()}:{len(dataStr)}>{dataStr} "
+
+async def legacy_create_adif(qsos: AsyncIterator[QsoInDB]) -> AsyncIterator[str]:
+    #create_adif before the chunked export
+    yield f"""ADIF Export from HAMBOOK.net
+Logs generated @ {time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())}
+<EOH>"""
+
+    async for qso in qsos:
+        yield ' '.join((
+            legacy_adif_field("CALL", qso.callsign),
+            legacy_adif_field("QSO_DATE", qso.qso_datetime.strftime("%Y%m%d")),
+            legacy_adif_field("TIME_ON", qso.qso_datetime.strftime("%H%M%S")),
+            legacy_adif_field("TIME_OFF", qso.qso_datetime.strftime("%H%M%S")),
+            legacy_adif_field("BAND", qso.band),
+            legacy_adif_field("STATION_CALLSIGN", qso.station_callsign),
+            legacy_adif_field("FREQ", Decimal(qso.freq)/1000),
+            legacy_adif_field("MODE", qso.qso_mode),
+            legacy_adif_field("RST_RCVD", qso.rst_r),
+            legacy_adif_field("RST_SENT", qso.rst_s)))
+        if qso.extra:
+            yield ' '.join([legacy_adif_field(field, value) for field, value in qso.extra.items()])
+        yield " <EOR>\n"
+
+def synthetic_rows(qso_count: int, seed: int = 1) -> List[dict]:
+    #shaped like the asyncpg records of QSO_EXPORT_COLUMNS
+    rnd = random.Random(seed)
+    qso_datetime = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for qso_id in range(qso_count, 0, -1):
+        qso_datetime += timedelta(seconds=rnd.randint(10, 120))
+        band, freq = rnd.choice(BANDS_FREQS)
+        rows.append({
+            "id": qso_id, 
+            "log_id": 1,
+            "callsign": random_callsign(rnd), 
+            "station_callsign": "TE1ST",
+            "qso_datetime": qso_datetime, 
+            "band": band, 
+            "freq": Decimal(f"{freq * 1000:.2f}"),
+            "qso_mode": rnd.choice(MODES), 
+            "rst_s": 599, 
+            "rst_r": 599,
+            "extra": json.dumps({"GRIDSQUARE": "KO85", "NAME": "Synthetic operator"}),
+        })
+    return rows
+
+async def legacy_export(rows: List[dict]) -> int:
+    async def qsos():
+        for row in rows:
+            yield QsoInDB(**row)
+    sends = 0
+    async for _ in legacy_create_adif(qsos()):
+        sends += 1
+    return sends
+
+async def chunked_export(rows: List[dict]) -> int:
+    async def batches():
+        for start in range(0, len(rows), BATCH_SIZE):
+            yield rows[start:start + BATCH_SIZE]
+    sends = 0
+    async for _ in create_adif(batches()):
+        sends += 1
+    return sends
+
+async def run(qso_count: int) -> None:
+    rows = synthetic_rows(qso_count)
+    print(f"{qso_count} QSO")
+    for name, export in (('legacy', legacy_export), ('chunked', chunked_export)):
+        result = {}
+        with timer(result):
+            sends = await export(rows)
+        print(f"  {name:8} {result['seconds']:7.2f} s {qso_count / result['seconds']:10.0f} rows/s "
+                f"{sends:8} sends")
+
+if __name__ == '__main__':
+    for qso_count in [int(arg) for arg in sys.argv[1:]] or [200_000]:
+        asyncio.run(run(qso_count))
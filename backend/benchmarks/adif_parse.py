@@ -0,0 +1,67 @@
+"""
+ADIF parser throughput: legacy line/regex tokenizer vs adif_records
+
+    python -m benchmarks.adif_parse [qso_count ...]
+"""
+import os
+import re
+import sys
+from collections import defaultdict
+from typing import Dict, Iterator
+
+from app.utils.adif import adif_records, parse_adif
+from benchmarks.common import adif_file, timer
+
+def legacy_records(file_path: str) -> Iterator[Dict[str, str]]:
+    #tokenizer part of parse_adif before the streaming tokenizer
+    re_field = re.compile(r"<(\w+):(\d+):?\w*>")
+    with open(file_path, 'r', encoding='ascii') as file:
+        eoh = False
+        buf = ''
+        for line in file:
+            line = line.upper()
+            if not eoh and '<EOH>' in line:
+                eoh = True
+                buf = line.split('<EOH>')[1]
+            else:
+                buf += line
+            if '<EOR>' in buf:
+                if buf.strip().endswith('<EOR>'):
+                    qso_lines, buf = buf, ''
+                else:
+                    qso_lines, buf = buf.rsplit('<EOR>', 1)
+                for qso_line in qso_lines.split('<EOR>'):
+                    if '<' in qso_line:
+                        qso_fields = {}
+                        for match in re_field.finditer(qso_line):
+                            name, length = match.groups()
+                            if length != '0':
+                                field_start = match.end()
+                                qso_fields[name] = qso_line[field_start : field_start + int(length)]
+                        yield qso_fields
+
+def streaming_records(file_path: str) -> Iterator[Dict[str, str]]:
+    with open(file_path, 'r', encoding='ascii') as file:
+        yield from adif_records(file)
+
+def full_parse(file_path: str) -> Iterator:
+    return parse_adif(file_path, log_settings={'callsign': 'TE1ST'}, qso_errors=defaultdict(int))
+
+def run(qso_count: int, single_line: bool) -> None:
+    with adif_file(qso_count, single_line=single_line) as path:
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        layout = 'single line' if single_line else 'multi line'
+        print(f"{qso_count} QSO, {size_mb:.1f} MB, {layout}")
+        for name, parser in (('tokenizer (streaming)', streaming_records),
+                ('tokenizer (legacy)', legacy_records),
+                ('parse_adif', full_parse)):
+            result = {}
+            with timer(result):
+                records = sum(1 for _ in parser(path))
+            print(f"  {name:24} {records:8} records {result['seconds']:7.2f} s "
+                    f"{size_mb / result['seconds']:8.1f} MB/s")
+
+if __name__ == '__main__':
+    for qso_count in [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]:
+        run(qso_count, single_line=False)
+        run(qso_count, single_line=True)
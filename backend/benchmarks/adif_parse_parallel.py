@@ -0,0 +1,35 @@
+"""
+parse_adif scaling with the number of process pool workers
+
+    python -m benchmarks.adif_parse_parallel [qso_count] [max_workers]
+"""
+import os
+import sys
+from collections import defaultdict
+
+from app.utils.adif import parse_adif
+from benchmarks.common import adif_file, timer
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+def run(qso_count: int, max_workers: int) -> None:
+    with adif_file(qso_count) as path:
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"{qso_count} QSO, {size_mb:.1f} MB, chunk size {CHUNK_SIZE // 1024 // 1024} MB")
+        base = None
+        for workers in range(1, max_workers + 1):
+            result, qso_errors = {}, defaultdict(int)
+            with timer(result):
+                records = sum(1 for _ in parse_adif(path, 
+                    log_settings={'callsign': 'TE1ST'}, 
+                    qso_errors=qso_errors,
+                    workers=workers,
+                    chunk_size=CHUNK_SIZE))
+            base = base or result['seconds']
+            print(f"  {workers:2} workers {records:8} QSO {result['seconds']:7.2f} s "
+                    f"{size_mb / result['seconds']:8.1f} MB/s x{base / result['seconds']:.2f}")
+
+if __name__ == '__main__':
+    qso_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    run(qso_count, max_workers)
@@ -0,0 +1,109 @@
+"""
+Callsign autocomplete index: legacy object-per-node TrieNode vs the packed
+sorted CallsignsIndex, built in process or mapped from a snapshot, on a
+synthetic corpus. Reports the process heap held after the build (tracemalloc,
+snapshot pages are shared and not counted), build or load time and latency of
+route-like lookups (the first 20 matches) for random 1 to 4 char prefixes.
+
+    python -m benchmarks.callsigns_index [callsign_count] [--no-legacy]
+"""
+import gc
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+from typing import Callable, List
+
+from app.utils.callsigns_index import CallsignsIndex
+from benchmarks.common import random_callsign, timer
+
+LOOKUPS = 20000
+LIMIT = 20
+
+class TrieNode:
+    #app.services.callsigns_autocomplete.TrieNode before the packed index
+    __slots__ = ('value', 'end_of_word', 'children', 'weight')
+
+    def __init__(self, value: str, end_of_word=False):
+        self.value = value
+        self.end_of_word = end_of_word
+        self.children = {}
+        self.weight = -1
+
+    def add(self, word_part: str, *, weight: int=-1) -> None:
+        if len(word_part) == 0:
+            self.end_of_word = True
+            self.weight = weight
+            return
+
+        first_char = word_part[0]
+        node = self.children.setdefault(first_char, TrieNode(first_char))
+        node.add(word_part[1:], weight=weight)
+
+    def find_all(self, word_part: str, path: str=""):
+        if self.end_of_word and word_part == "":
+            yield path + self.value, self.weight
+
+        if len(word_part) > 0:
+            char = word_part[0]
+            node = self.children.get(char)
+
+            if node is not None:
+                yield from node.find_all(word_part[1:], path + self.value)
+        else:
+            for node in self.children.values():
+                yield from node.find_all("", path + self.value)
+
+def build_trie(callsigns: List[str]) -> TrieNode:
+    root = TrieNode("")
+    for callsign in callsigns:
+        root.add(callsign, weight=1)
+    return root
+
+def build_index(callsigns: List[str]) -> CallsignsIndex:
+    return CallsignsIndex.build((callsign, 1) for callsign in callsigns)
+
+def measure(name: str, build: Callable, callsigns: List[str], prefixes: List[str]) -> None:
+    result = {}
+    gc.collect()
+    with timer(result, 'build'):
+        index = build(callsigns)
+    del index
+    gc.collect()
+
+    tracemalloc.start()
+    index = build(callsigns)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        list(islice(index.find_all(prefix), LIMIT))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    print(f"  {name:8} memory {memory / 1024 / 1024:8.1f} MB  build {result['build']:6.2f} s  "
+            f"lookup p50 {latencies[len(latencies) // 2] * 1e6:7.1f} us "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:7.1f} us")
+
+def run(callsign_count: int, legacy: bool) -> None:
+    rnd = random.Random(1)
+    callsigns = [random_callsign(rnd) for _ in range(callsign_count)]
+    prefixes = [rnd.choice(callsigns)[:rnd.randint(1, 4)] for _ in range(LOOKUPS)]
+    print(f"{callsign_count} callsigns ({len(set(callsigns))} unique), {LOOKUPS} lookups of {LIMIT}")
+
+    measure("packed", build_index, callsigns, prefixes)
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        snapshot_path = f"{snapshot_dir}/callsigns.idx"
+        build_index(callsigns).save(snapshot_path)
+        measure("snapshot", lambda _: CallsignsIndex.from_snapshot(snapshot_path), callsigns, prefixes)
+    if legacy:
+        measure("trie", build_trie, callsigns, prefixes)
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    run(int(args[0]) if args else 2_000_000, '--no-legacy' not in sys.argv)
@@ -0,0 +1,69 @@
+"""
+Ranked callsign autocomplete for 1 and 2 char prefixes: legacy trie walk
+(first 20 in dict order, unranked), a ranked scan of the prefix range and
+the precomputed top lists of CallsignsIndex.top. Weights are random with
+a long tail like qso counts.
+
+    python -m benchmarks.callsigns_top [callsign_count] [--no-legacy]
+"""
+import random
+import statistics
+import sys
+import time
+from heapq import nlargest
+from itertools import islice
+from typing import Callable, List
+
+from app.utils.callsigns_index import CallsignsIndex, TOP_K
+from benchmarks.callsigns_index import TrieNode
+from benchmarks.common import random_callsign, timer
+
+REPEATS = 5
+
+def time_lookups(lookup: Callable, prefixes: List[str]) -> List[float]:
+    latencies = []
+    for _ in range(REPEATS):
+        for prefix in prefixes:
+            start = time.perf_counter()
+            lookup(prefix)
+            latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+def report(name: str, latencies: List[float]) -> None:
+    print(f"    {name:12} p50 {statistics.median(latencies) * 1e6:9.1f} us "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:9.1f} us")
+
+def run(callsign_count: int, legacy: bool) -> None:
+    rnd = random.Random(1)
+    weighted = [(random_callsign(rnd), int(rnd.paretovariate(1.2))) for _ in range(callsign_count)]
+
+    result = {}
+    with timer(result):
+        index = CallsignsIndex.build(weighted)
+    print(f"{callsign_count} callsigns ({len(index)} unique), index with top lists built in "
+            f"{result['seconds']:.2f} s, {len(index._top_prefixes)} prefixes with top {TOP_K}")
+
+    trie = None
+    if legacy:
+        trie = TrieNode("")
+        for callsign, weight in weighted:
+            trie.add(callsign, weight=weight)
+
+    weights = index._weights.__getitem__
+    def ranked_scan(prefix: str) -> list:
+        start, end = index.prefix_range(prefix)
+        return [(index.callsign(idx), weights(idx))
+                for idx in nlargest(TOP_K, range(start, end), key=weights)]
+
+    for prefix_len in (1, 2):
+        prefixes = sorted({callsign[:prefix_len] for callsign, _ in weighted})
+        print(f"  {len(prefixes)} prefixes of {prefix_len} chars, limit {TOP_K}")
+        if trie:
+            report("trie walk", time_lookups(lambda prefix: list(islice(trie.find_all(prefix), TOP_K)),
+                prefixes))
+        report("ranked scan", time_lookups(ranked_scan, prefixes))
+        report("top lists", time_lookups(lambda prefix: index.top(prefix, TOP_K), prefixes))
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    run(int(args[0]) if args else 2_000_000, '--no-legacy' not in sys.argv)
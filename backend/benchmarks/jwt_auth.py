@@ -0,0 +1,32 @@
+"""
+Per request cost of AuthService.get_userid_from_token for a repeated bearer token,
+with and without the verified token cache.
+
+    python -m benchmarks.jwt_auth [requests]
+"""
+import sys
+
+from app.core.config import SECRET_KEY
+from app.models.user import UserBase
+from app.services.authentication import AuthService
+from benchmarks.common import timer
+
+class BenchUser(UserBase):
+    id: int
+
+def run(requests: int) -> None:
+    user = BenchUser(id=1, email='bench@hambook.net')
+    print(f"{requests} requests")
+
+    for name, token_cache_size in (('no cache', 0), ('cache', 1000)):
+        auth_service = AuthService(token_cache_size=token_cache_size)
+        token = auth_service.create_access_token_for_user(user=user)
+        result = {}
+        with timer(result):
+            for _ in range(requests):
+                auth_service.get_userid_from_token(token=token, secret_key=str(SECRET_KEY))
+        print(f"  {name:8} {result['seconds'] / requests * 1e6:7.2f} us/request  "
+                f"{auth_service.token_cache_metrics()}")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
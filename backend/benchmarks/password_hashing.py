@@ -0,0 +1,67 @@
+"""
+Event loop latency seen by other requests while logins verify bcrypt passwords,
+inline in the handler vs in the PasswordHashingService pool. 
+
+    python -m benchmarks.password_hashing [logins] [concurrency]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from app.services import auth_service
+from app.services.password_hashing import PasswordHashingService
+
+TICK_SECONDS = 0.005
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    #a cheap request: how late does it get scheduled
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+async def inline_login(password_update) -> None:
+    auth_service.verify_password(password='password', 
+            salt=password_update.salt, hashed_pw=password_update.password)
+
+async def pool_login(password_update, pool: PasswordHashingService) -> None:
+    await pool.verify_password(password='password', 
+            salt=password_update.salt, hashed_pw=password_update.password)
+
+async def measure(name: str, logins: int, concurrency: int, login) -> None:
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await login()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(logins)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    lags.sort()
+    print(f"  {name:8} {seconds:6.2f} s {logins / seconds:7.1f} logins/s  "
+            f"loop lag p50 {statistics.median(lags) * 1000:7.1f} ms "
+            f"p99 {lags[int(len(lags) * 0.99)] * 1000:7.1f} ms "
+            f"max {lags[-1] * 1000:7.1f} ms")
+
+async def run(logins: int, concurrency: int) -> None:
+    password_update = auth_service.create_salt_and_hashed_password(plaintext_password='password')
+    print(f"{logins} logins, {concurrency} concurrent")
+
+    await measure('inline', logins, concurrency, lambda: inline_login(password_update))
+
+    pool = PasswordHashingService(auth_service, max_queue=concurrency)
+    await measure('pool', logins, concurrency, lambda: pool_login(password_update, pool))
+    print(f"  {pool.metrics()}")
+    pool.shutdown()
+
+if __name__ == '__main__':
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8))
@@ -0,0 +1,91 @@
+"""
+Wildcard callsign searches inside a log: plain LIKE on the original btree
+index vs routed prefix/suffix/infix predicates on the callsign search
+indexes. Builds a scratch copy of the qso columns it needs in a temporary
+table. Needs the app database settings (.env).
+
+    python -m benchmarks.qso_callsign_search [row_count] [log_count]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from app.db.tasks import connect_to_db
+from app.db.repositories.qso import callsign_search_filter, QSO_FILTER_PREDICATES
+
+SEARCHES = ('R7*', '*/P', '*7C*', 'U*/M', 'R7CL')
+REPEATS = 20
+
+CREATE_BENCH_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE qso (
+        id bigint primary key,
+        log_id bigint,
+        callsign text
+    ) ON COMMIT DROP;
+"""
+
+#prefix and digit come from a hash of n: they don't follow the log id
+FILL_BENCH_TABLE_QUERY = """
+    INSERT INTO qso (id, log_id, callsign)
+    SELECT n, n % cast(:log_count as integer),
+        (array['R', 'U', 'UA', 'DL', 'K', 'W', 'JA'])[1 + h % 7] || 
+            ((h / 7) % 10)::text || 
+            chr(65 + (n / 10) % 26) || chr(65 + (n / 260) % 26) ||
+            (array['', '', '', '/P', '/M', '/QRP'])[1 + (n / 6760) % 6]
+    FROM generate_series(1, cast(:row_count as integer)) as n,
+        LATERAL (SELECT hashint8(n) & 9223372036854775807 as h) as hashed;
+"""
+
+ORIGINAL_INDEXES = ("CREATE INDEX ON qso (callsign);", "CREATE INDEX ON qso (log_id);")
+
+SEARCH_INDEXES = (
+    "CREATE INDEX ON qso (log_id, callsign text_pattern_ops);",
+    "CREATE INDEX ON qso (log_id, reverse(callsign) text_pattern_ops);",
+    "CREATE INDEX ON qso USING gin (log_id, callsign gin_trgm_ops);",
+)
+
+async def time_query(connection, query: str, values: dict) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        await connection.fetch_all(query=query, values=values)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+async def run(row_count: int, log_count: int) -> None:
+    db = await connect_to_db()
+    print(f"{row_count} QSO in {log_count} logs, median of {REPEATS} runs")
+
+    async with db.connection() as connection:
+        async with connection.transaction():
+            await connection.execute(query=CREATE_BENCH_TABLE_QUERY)
+            await connection.execute(query=FILL_BENCH_TABLE_QUERY, 
+                    values={"row_count": row_count, "log_count": log_count})
+            for index in ORIGINAL_INDEXES:
+                await connection.execute(query=index)
+            await connection.execute(query="ANALYZE qso;")
+
+            legacy = {}
+            for search in SEARCHES:
+                legacy[search] = await time_query(connection, 
+                        "SELECT id FROM qso WHERE log_id = :log_id and callsign like :callsign_search",
+                        {"log_id": 1, "callsign_search": search.replace('*', '%')})
+
+            for index in SEARCH_INDEXES:
+                await connection.execute(query=index)
+            await connection.execute(query="ANALYZE qso;")
+
+            for search in SEARCHES:
+                callsign_filter, value = callsign_search_filter(search)
+                routed = await time_query(connection, 
+                        f"SELECT id FROM qso WHERE log_id = :log_id and {QSO_FILTER_PREDICATES[callsign_filter]}",
+                        {"log_id": 1, callsign_filter: value})
+                print(f"  {search:8} {callsign_filter:16} like: {legacy[search]:8.2f} ms "
+                        f"routed: {routed:8.2f} ms")
+
+    await db.disconnect()
+
+if __name__ == '__main__':
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000, 
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20))
@@ -0,0 +1,82 @@
+"""
+Qso events fan-out load test: subscribers per log receive every event published
+for their log, reports the delivery latency from publish to subscriber.
+With --notify the events go through the database NOTIFY and the LISTEN
+connection of the service (needs the app database settings, .env),
+otherwise they are dispatched in process.
+
+    python -m benchmarks.qso_events [subscribers] [logs] [events] [--notify]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from app.db.tasks import connect_to_db
+from app.db.repositories.qso import QsoRepository
+from app.services.qso_events import QsoEventsService
+
+async def subscriber(service: QsoEventsService, log_id: int, events: int,
+        ready: asyncio.Event, latencies: list) -> None:
+    async with service.subscribe(log_id, listen=False) as subscription:
+        ready.set()
+        received = 0
+        async for message in service.messages(subscription, 30):
+            if message is None:
+                break
+            data = json.loads(message.split("data: ", 1)[1])
+            latencies.append(time.perf_counter() - data["qso"]["sent"])
+            received += 1
+            if received == events:
+                break
+
+async def run(subscribers: int, logs: int, events: int, notify: bool) -> None:
+    service = QsoEventsService(queue_size=events + 1)
+    db = None
+    if notify:
+        db = await connect_to_db()
+        qso_repo = QsoRepository(db)
+        await service._listen()
+
+    latencies = []
+    tasks, ready = [], []
+    for log_id in range(1, logs + 1):
+        for _ in range(subscribers):
+            ready.append(asyncio.Event())
+            tasks.append(asyncio.create_task(subscriber(service, log_id, events, ready[-1], latencies)))
+    await asyncio.gather(*(event.wait() for event in ready))
+
+    start = time.perf_counter()
+    for idx in range(events):
+        for log_id in range(1, logs + 1):
+            payload = service.event_payload(event="create_qso", log_id=log_id, qso_id=idx,
+                    qso=json.dumps({"sent": time.perf_counter()}))
+            if notify:
+                await qso_repo.notify_qso_event(payload=payload)
+            else:
+                service._dispatch(None, 0, "", payload)
+                await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    delivered = len(latencies)
+    latencies.sort()
+    print(f"{subscribers} subscribers x {logs} logs, {events} events per log "
+            f"({'notify' if notify else 'in process'})")
+    print(f"  delivered {delivered} of {subscribers * logs * events} in {elapsed:.2f} s, "
+            f"{delivered / elapsed:,.0f} deliveries/s")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.2f} ms "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms "
+            f"max {latencies[-1] * 1000:.2f} ms")
+
+    await service.close()
+    if db:
+        await db.disconnect()
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    asyncio.run(run(int(args[0]) if len(args) > 0 else 300,
+        int(args[1]) if len(args) > 1 else 4,
+        int(args[2]) if len(args) > 2 else 200,
+        '--notify' in sys.argv))
@@ -0,0 +1,58 @@
+"""
+Insert throughput with server side generate_id() defaults vs ids reserved
+by IdAllocator and sent with COPY. Needs the app database settings (.env).
+
+    python -m benchmarks.qso_ids [row_count]
+"""
+import asyncio
+import sys
+from itertools import islice
+
+from app.db.tasks import connect_to_db
+from app.db.ids import IdAllocator
+from benchmarks.common import timer
+
+BATCH_SIZE = 10000
+
+CREATE_BENCH_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE bench_ids (
+        id bigint primary key default generate_id('qso_id_seq'::text),
+        payload text
+    ) ON COMMIT DROP;
+"""
+
+async def run(row_count: int) -> None:
+    db = await connect_to_db()
+    print(f"{row_count} rows")
+
+    async with db.connection() as connection:
+        async with connection.transaction():
+            await connection.execute(query=CREATE_BENCH_TABLE_QUERY)
+            result = {}
+            with timer(result):
+                await connection.execute(query="""
+                    INSERT INTO bench_ids (payload) 
+                    SELECT 'payload' FROM generate_series(1, cast(:row_count as integer));
+                    """, values={"row_count": row_count})
+            print(f"  generate_id() default  {result['seconds']:7.2f} s "
+                    f"{row_count / result['seconds']:10.0f} rows/s")
+
+    id_allocator = IdAllocator('qso_id_seq')
+    async with db.connection() as connection:
+        async with connection.transaction():
+            await connection.execute(query=CREATE_BENCH_TABLE_QUERY)
+            result = {}
+            with timer(result):
+                rows = iter(range(row_count))
+                while batch := list(islice(rows, BATCH_SIZE)):
+                    ids = await id_allocator.reserve(connection, len(batch))
+                    await connection.raw_connection.copy_records_to_table('bench_ids',
+                            records=[(id, 'payload') for id in ids], 
+                            columns=('id', 'payload'))
+            print(f"  IdAllocator + COPY     {result['seconds']:7.2f} s "
+                    f"{row_count / result['seconds']:10.0f} rows/s")
+
+    await db.disconnect()
+
+if __name__ == '__main__':
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
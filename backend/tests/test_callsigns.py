@@ -0,0 +1,190 @@
+import random
+import time
+from typing import Callable
+
+import pytest
+
+from fastapi import FastAPI
+from async_asgi_testclient import TestClient
+from databases import Database
+
+from app.models.qso_log import QsoLogInDB
+from app.models.user import UserInDB
+from app.db.repositories.callsigns import CallsignsRepository
+from app.services.callsigns_autocomplete import CallsignsAutocompleteService
+from app.utils.callsigns_index import (CallsignsIndex, InvalidSnapshotError, SAMPLE_STEP, TOP_K, 
+        build_snapshot, read_corpus, write_weighted_corpus)
+
+CALLSIGNS = ("R7CL", "R7C", "R7", "UA1AAA", "R7CLA", "R8", "R7CL", "UA1", "")
+
+class TestCallsignsIndex:
+
+    @pytest.mark.parametrize(
+        "prefix, callsigns",
+        (
+            ("R7", ["R7", "R7C", "R7CL", "R7CLA"]),
+            ("R7CL", ["R7CL", "R7CLA"]),
+            ("UA", ["UA1", "UA1AAA"]),
+            ("", ["R7", "R7C", "R7CL", "R7CLA", "R8", "UA1", "UA1AAA"]),
+            ("R7CLX", []),
+            ("Z", []),
+        ),
+    )
+    def test_find_all(self, prefix: str, callsigns: list) -> None:
+        index = CallsignsIndex.build((callsign, 1) for callsign in CALLSIGNS)
+        assert [callsign for callsign, _ in index.find_all(prefix)] == callsigns
+
+    def test_prefix_ranges_match_scan(self) -> None:
+        rnd = random.Random(1)
+        callsigns = {''.join(rnd.choice("AB0/") for _ in range(rnd.randint(1, 6)))
+                for _ in range(SAMPLE_STEP * 50)}
+        index = CallsignsIndex.build((callsign, weight) for weight, callsign in enumerate(callsigns))
+        weights = {callsign: weight for weight, callsign in enumerate(callsigns)}
+
+        for prefix in ("A", "AB", "B0/", "//", "0A0", "ABAB0"):
+            expected = sorted(callsign for callsign in callsigns if callsign.startswith(prefix))
+            found = list(index.find_all(prefix))
+            assert [callsign for callsign, _ in found] == expected
+            assert all(weights[callsign] == weight for callsign, weight in found)
+
+    def test_top_by_weight(self, tmp_path) -> None:
+        rnd = random.Random(2)
+        weights = {''.join(rnd.choice("AB0/") for _ in range(rnd.randint(1, 6))): rnd.randint(0, 50)
+                for _ in range(SAMPLE_STEP * 50)}
+        index = CallsignsIndex.build(weights.items())
+        index.save(tmp_path / "callsigns.idx")
+        snapshot = CallsignsIndex.from_snapshot(tmp_path / "callsigns.idx")
+
+        for prefix in ("", "A", "B0", "AB/", "0A0/", "ABAB0", "X"):
+            ranked = sorted((callsign for callsign in weights if callsign.startswith(prefix)),
+                    key=lambda callsign: (-weights[callsign], callsign))
+            for limit in (1, 5, TOP_K, TOP_K * 3):
+                expected = [(callsign, weights[callsign]) for callsign in ranked[:limit]]
+                assert index.top(prefix, limit) == expected
+                assert snapshot.top(prefix, limit) == expected
+
+    def test_snapshot_round_trip(self, tmp_path) -> None:
+        corpus_path, snapshot_path = tmp_path / "callsigns.txt", tmp_path / "callsigns.idx"
+        corpus_path.write_text("\n".join(CALLSIGNS) + "\n")
+
+        assert build_snapshot(corpus_path, snapshot_path)
+        assert not build_snapshot(corpus_path, snapshot_path)
+
+        index = CallsignsIndex.from_file(corpus_path)
+        snapshot = CallsignsIndex.from_snapshot(snapshot_path)
+        assert len(snapshot) == len(index)
+        for prefix in ("", "R7", "R7CL", "UA1", "Z"):
+            assert list(snapshot.find_all(prefix)) == list(index.find_all(prefix))
+
+        snapshot.save(tmp_path / "copy.idx")
+        assert (tmp_path / "copy.idx").read_bytes() == snapshot_path.read_bytes()
+
+    def test_invalid_snapshot(self, tmp_path) -> None:
+        snapshot_path = tmp_path / "callsigns.idx"
+        snapshot_path.write_bytes(b"HBCI" + bytes(20))
+        with pytest.raises(InvalidSnapshotError):
+            CallsignsIndex.from_snapshot(snapshot_path)
+
+    @pytest.mark.anyio
+    async def test_autocomplete_limit_is_capped(self, *, app: FastAPI, client: TestClient) -> None:
+        res = await client.get(app.url_path_for("callsigns:autocomplete", start="R"), 
+                query_string={"limit": TOP_K + 1})
+        assert res.status_code == 422
+
+class TestCallsignWeights:
+
+    def test_weighted_corpus(self, tmp_path) -> None:
+        base_path, weighted_path = tmp_path / "callsigns.txt", tmp_path / "callsigns_weighted.txt"
+        base_path.write_text("R7CL\nUA1AAA\nR8\n")
+
+        callsigns = write_weighted_corpus(
+                [("R7CL", 5, False), ("R8", 0, True), ("TYP0", 1, False), ("DL1ABC", 3, False)],
+                path=weighted_path, base_path=base_path, registered_weight=100)
+
+        assert callsigns == 4
+        with open(weighted_path) as file:
+            assert dict(read_corpus(file)) == {"R7CL": 6, "UA1AAA": 1, "R8": 101, "DL1ABC": 4}
+        index = CallsignsIndex.from_file(weighted_path)
+        assert [callsign for callsign, _ in index.top("R")] == ["R8", "R7CL"]
+
+    @pytest.mark.anyio
+    async def test_qso_counts_are_incremental(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_log_created: QsoLogInDB,
+        db: Database) -> None:
+
+        callsigns_repo = CallsignsRepository(db)
+
+        async def create_qso(qso_datetime: str) -> None:
+            res = await authorized_client.post(
+                app.url_path_for("qso:create-qso", log_id=test_qso_log_created.id), 
+                json={"new_qso": {
+                    "callsign": "R7WGT",
+                    "station_callsign": "ADM1N",
+                    "qso_datetime": qso_datetime,
+                    "band": "20M",
+                    "freq": 14000,
+                    "qso_mode": "CW",
+                    "rst_s": 599,
+                    "rst_r": 599}})
+            assert res.status_code == 200
+
+        async def qso_count() -> int:
+            return {callsign: qso_count async for callsign, qso_count, _ 
+                    in callsigns_repo.callsign_weights()}.get("R7WGT", 0)
+
+        await callsigns_repo.count_new_qso()
+        counted = await qso_count()
+
+        await create_qso("2022-12-08T08:55:17Z")
+        await create_qso("2022-12-08T09:55:17Z")
+        assert await callsigns_repo.count_new_qso() >= 1
+        assert await qso_count() == counted + 2
+
+        await create_qso("2022-12-08T10:55:17Z")
+        await callsigns_repo.count_new_qso()
+        await callsigns_repo.count_new_qso()
+        assert await qso_count() == counted + 3
+
+class TestCallsignsReload:
+
+    def test_new_snapshot_is_swapped_in(self, tmp_path) -> None:
+        corpus_path, snapshot_path = tmp_path / "callsigns.txt", tmp_path / "callsigns.idx"
+        corpus_path.write_text("R7CL\nR8\n")
+        build_snapshot(corpus_path, snapshot_path)
+        service = CallsignsAutocompleteService(corpus_path=corpus_path, snapshot_path=snapshot_path,
+                check_interval=0)
+
+        assert service.top("R") == [("R7CL", 1), ("R8", 1)]
+        old_index = service.index
+        assert service.metrics()["reloads"] == 1
+
+        corpus_path.write_text("R7CL\t1\nR8\t5\nR9\t3\n")
+        build_snapshot(corpus_path, snapshot_path, force=True)
+        service.top("R")
+        for _ in range(100):
+            if service.metrics()["reloads"] == 2:
+                break
+            time.sleep(0.05)
+
+        assert service.top("R") == [("R8", 5), ("R9", 3), ("R7CL", 1)]
+        assert old_index.top("R") == [("R7CL", 1), ("R8", 1)]
+        metrics = service.metrics()
+        assert metrics["callsigns"] == 3
+        assert metrics["last_reload_seconds"] is not None
+        assert metrics["memory_high_water_kb"] > 0
+
+    @pytest.mark.anyio
+    async def test_autocomplete_metrics_are_admin_only(self, *,
+        app: FastAPI, 
+        client: TestClient, 
+        create_authorized_client: Callable, 
+        test_user: UserInDB) -> None:
+
+        res = await client.get(app.url_path_for("callsigns:autocomplete-metrics"))
+        assert res.status_code == 401
+
+        res = await create_authorized_client(user=test_user).get(
+                app.url_path_for("callsigns:autocomplete-metrics"))
+        assert res.status_code == (200 if test_user.is_admin else 403)
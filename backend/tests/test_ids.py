@@ -0,0 +1,27 @@
+import pytest
+
+from app.db.ids import make_id, ID_EPOCH_MILLIS, ID_TIME_SHIFT, ID_CLIENT_FLAG
+
+def server_id(seq_value: int, now_millis: int) -> int:
+    #generate_id() from the users table migration
+    return ((now_millis - ID_EPOCH_MILLIS) << ID_TIME_SHIFT) | (seq_value % 1024)
+
+class TestIdAllocation:
+
+    def test_client_ids_keep_time_order(self) -> None:
+        now_millis = 1670000000000
+        assert make_id(1, now_millis) < make_id(1, now_millis + 1)
+        assert make_id(1, now_millis) >> ID_TIME_SHIFT == server_id(1, now_millis) >> ID_TIME_SHIFT
+
+    @pytest.mark.parametrize("seq_start", (1, 1023, 1 << 22, (1 << 40) + 17))
+    def test_client_ids_are_unique_within_millisecond(self, seq_start: int) -> None:
+        now_millis = 1670000000000
+        ids = {make_id(seq_value, now_millis) for seq_value in range(seq_start, seq_start + 100000)}
+        assert len(ids) == 100000
+
+    def test_client_ids_never_collide_with_server_ids(self) -> None:
+        for now_millis in (1670000000000, 1670000000001):
+            client_ids = {make_id(seq_value, now_millis) for seq_value in range(0, 5000)}
+            server_ids = {server_id(seq_value, now_millis) for seq_value in range(0, 5000)}
+            assert all(id & ID_CLIENT_FLAG for id in client_ids)
+            assert not client_ids & server_ids
@@ -1,18 +1,41 @@
 from os import path
-from typing import Callable
+from typing import Callable, List, Optional
+from datetime import date, datetime, timedelta, timezone
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from decimal import Decimal
+import asyncio
+import gzip
+import io
+import json
+import os
+import random
+import threading
 
 import pytest
 
+from celery import states
 from fastapi import FastAPI, status
 from async_asgi_testclient import TestClient
 from async_asgi_testclient.response import Response
 
 from databases import Database
 from app.models.user import UserInDB, UserPublic
-from app.models.qso_log import QsoLogInDB
-from app.models.qso import QsoInDB, QsoBase
+from app.models.qso_log import QsoLogInDB, QsoLogBase
+from app.models.qso import QsoInDB, QsoBase, QsoOrder, QsoFilter, AdifExportFormat
+from app.models.task import TaskStatus
 
-from app.db.repositories.qso import QsoRepository
+from app.db.repositories.qso import (QsoRepository, DuplicateQsoError, qso_by_log_id_query, 
+        SKIP_QSO_DUPES_CHECK_QUERY)
+from app.db.repositories.qso_logs import QsoLogsRepository
+from app.db.tasks import connect_to_db
+from app.services import qso_events_service
+from app.services.qso_events import QsoEventsService, QsoEventsSubscribersLimitError
+from app.services.adif_export_cache import AdifExportCache
+from app.services.static_files import full_path
+from app.celery.worker import task_adif_export
+from app.core.config import SRV_URI, QSO_EVENTS_MAX_SUBSCRIBERS
+from app.utils.adif import adif_records, adif_text_chunks, adif_export_freq, parse_adif
 
 pytestmark = pytest.mark.anyio
 
@@ -148,6 +171,25 @@ class TestQsoCreate:
         ) 
         assert res.status_code == 403
 
+    async def test_create_qso_in_log_deleted_by_another_worker(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_log_created: QsoLogInDB,
+        test_qso_params: dict,
+        test_qso_created: QsoInDB,
+        db: Database) -> None:
+
+        #the owner of the log is cached by the first write, the log is deleted elsewhere
+        await QsoLogsRepository(db).delete_log(id=test_qso_log_created.id)
+
+        res = await qso_create_helper(
+            app=app, 
+            client=authorized_client, 
+            qso_params={**test_qso_params, "qso_datetime": "2022-12-09T10:00:00Z"},
+            log_id=test_qso_log_created.id
+        ) 
+        assert res.status_code == 404
+
 class TestQsoDelete:
     
     @pytest.mark.parametrize(
@@ -191,6 +233,42 @@ class TestQsoDelete:
             else:
                 assert qso_in_db
 
+class TestQsoLogStats:
+
+    async def test_log_stats_follow_qso_changes(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        db: Database) -> None:
+
+        qso_logs_repo = QsoLogsRepository(db)
+
+        qso_log = await qso_logs_repo.get_log_by_id(id=test_qso_log_created.id)
+        assert qso_log.qso_count == 0
+        assert qso_log.qso_first_datetime is None
+
+        qsos = []
+        for qso_datetime in ("2022-12-08T08:55:17Z", "2022-12-09T10:00:00Z"):
+            res = await qso_create_helper(app=app, 
+                client=authorized_client, 
+                qso_params={**test_qso_params, "qso_datetime": qso_datetime},
+                log_id=test_qso_log_created.id)
+            assert res.status_code == 200
+            qsos.append(QsoInDB(**res.json()))
+
+        qso_log = await qso_logs_repo.get_log_by_id(id=test_qso_log_created.id)
+        assert qso_log.qso_count == 2
+        assert qso_log.qso_first_datetime == qsos[0].qso_datetime
+        assert qso_log.qso_last_datetime == qsos[1].qso_datetime
+
+        res = await qso_delete_helper(app=app, client=authorized_client, qso_id=qsos[1].id)
+        assert res.status_code == 200
+
+        qso_log = await qso_logs_repo.get_log_by_id(id=test_qso_log_created.id)
+        assert qso_log.qso_count == 1
+        assert qso_log.qso_last_datetime == qsos[0].qso_datetime
+
 class TestQsoUpdate:
     
     @pytest.mark.parametrize(
@@ -292,6 +370,49 @@ class TestQsoQueries:
             assert len(qso_search)
             cmp_qso(test_qso_created, qso_search[0])
  
+    @pytest.mark.parametrize("order_by", ("id", "qso_datetime"))
+    async def test_query_by_log_id_pages(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_log_created: QsoLogInDB,
+        test_qso_params: dict,
+        order_by: str,
+        )-> None:
+
+        for hour in range(3):
+            await qso_create_helper(
+                app=app, 
+                client=authorized_client, 
+                qso_params={**test_qso_params, "qso_datetime": f"2022-12-09T1{hour}:00:00Z"},
+                log_id=test_qso_log_created.id)
+
+        url = app.url_path_for("qso:query-by-log", log_id=test_qso_log_created.id)
+        res = await authorized_client.get(url, query_string={"limit": 2, "order_by": order_by})
+        assert res.status_code == 200
+        first_page = res.json()
+        assert len(first_page) == 2
+
+        first_page_cursor = res.headers["X-Next-Cursor"]
+
+        res = await authorized_client.get(url, query_string={"limit": 2, "order_by": order_by, 
+            "cursor": first_page_cursor})
+        assert res.status_code == 200
+        second_page = res.json()
+        assert len(second_page) == 1
+        assert "X-Next-Cursor" not in res.headers
+
+        qsos = first_page + second_page
+        assert ([qso[order_by] for qso in qsos] == 
+                sorted([qso[order_by] for qso in qsos], key=lambda value: int(value) if order_by == "id" else value, 
+                    reverse=True))
+
+        res = await authorized_client.get(url, query_string={"order_by": order_by, "cursor": "bad cursor"})
+        assert res.status_code == 400
+
+        res = await authorized_client.get(url, query_string={"limit": 2, "order_by": order_by, 
+            "cursor": first_page_cursor, "offset": 1})
+        assert res.status_code == 422
+
     @pytest.mark.parametrize(
         "qso_id, status_code",
         (
@@ -318,3 +439,605 @@ class TestQsoQueries:
         if status_code == 200:
             cmp_qso(test_qso_created, res.json())
 
+    @pytest.mark.parametrize(
+        "params, dupe",
+        (
+            ({}, True),
+            ({"qso_datetime": "2022-12-08T08:59:17Z"}, True),
+            ({"qso_datetime": "2022-12-08T09:05:17Z"}, False),
+            ({"band": "80M"}, False),
+            ({"qso_mode": "SSB"}, False),
+            ({"callsign": "ADM1N"}, False),
+        ),
+    )
+    async def test_dupe_check(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_created: QsoInDB,
+        test_qso_params: dict,
+        params: dict,
+        dupe: bool,
+        )-> None:
+
+        query = {field: test_qso_params[field] 
+                for field in ("callsign", "band", "qso_mode", "qso_datetime")}
+        query.update(params)
+        res = await authorized_client.get(app.url_path_for("qso:dupe-check", 
+            log_id=test_qso_created.log_id), query_string=query)
+
+        assert res.status_code == 200
+        assert res.json()["dupe"] == dupe
+
+    async def test_dupe_check_is_owner_only(self, *,
+        app: FastAPI, 
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_qso_created: QsoInDB,
+        test_qso_params: dict,
+        )-> None:
+
+        query = {field: test_qso_params[field] 
+                for field in ("callsign", "band", "qso_mode", "qso_datetime")}
+        url = app.url_path_for("qso:dupe-check", log_id=test_qso_created.log_id)
+
+        res = await create_authorized_client(user=None).get(url, query_string=query)
+        assert res.status_code == 401
+        res = await create_authorized_client(user=test_user2).get(url, query_string=query)
+        assert res.status_code == 403
+
+    async def test_stale_dupes_index_is_confirmed_in_db(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_created: QsoInDB,
+        test_qso_params: dict,
+        db: Database,
+        )-> None:
+
+        #the qso is deleted by another worker, the dupes index of this one still has it
+        await QsoRepository(db).delete_qso(id=test_qso_created.id)
+
+        res = await qso_create_helper(
+            app=app, 
+            client=authorized_client, 
+            qso_params=test_qso_params,
+            log_id=test_qso_created.log_id
+        ) 
+        assert res.status_code == 200
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for subplan in plan.get("Plans", ()):
+        yield from plan_nodes(subplan)
+
+class TestQsoExport:
+
+    async def test_export_adif(self, *,
+        app: FastAPI, 
+        client: TestClient,
+        test_qso_created: QsoInDB,
+        )-> None:
+
+        res = await client.post(app.url_path_for("qso:export-adif", 
+            log_id=test_qso_created.log_id), json={"qso_filter": {}})
+
+        assert res.status_code == 200
+        assert res.headers["Content-Disposition"] == f"attachment; filename={test_qso_created.log_id}.adi"
+        header, records = res.text.split("<EOH>")
+        assert header.startswith("ADIF Export from HAMBOOK.net")
+        assert records == ("<CALL:9>ADM1N/QRP  <QSO_DATE:8>20221208  <TIME_ON:6>085517  "
+            "<TIME_OFF:6>085517  <BAND:4>160M  <STATION_CALLSIGN:9>U3/R7CL/M  <FREQ:8>18.00059  "
+            "<MODE:2>CW  <RST_RCVD:3>599  <RST_SENT:3>599 <FOO:3>bar  <EOR>\n")
+
+    async def test_export_adif_gzip(self, *,
+        app: FastAPI, 
+        client: TestClient,
+        test_qso_created: QsoInDB,
+        )-> None:
+
+        res = await client.post(app.url_path_for("qso:export-adif", 
+            log_id=test_qso_created.log_id), json={"qso_filter": {}}, query_string={"format": "adi.gz"})
+
+        assert res.status_code == 200
+        assert res.headers["Content-Disposition"] == f"attachment; filename={test_qso_created.log_id}.adi.gz"
+        adif = gzip.decompress(res.content).decode()
+        assert adif.startswith("ADIF Export from HAMBOOK.net")
+        assert adif.endswith("<FOO:3>bar  <EOR>\n")
+
+    @pytest.mark.parametrize(
+        "fields, extra_adif",
+        (
+            (None, "<NAME:4>Oleg  <GRIDSQUARE:4>KO85 "),
+            ([], ""),
+            (["gridsquare"], "<GRIDSQUARE:4>KO85 "),
+            (["NAME", "QTH"], "<NAME:4>Oleg "),
+        ),
+    )
+    async def test_export_adif_fields(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        fields: Optional[List[str]],
+        extra_adif: str,
+        )-> None:
+
+        res = await qso_create_helper(app=app, 
+            client=authorized_client, 
+            qso_params={**test_qso_params, "extra": {"GRIDSQUARE": "KO85", "NAME": "Oleg"}},
+            log_id=test_qso_log_created.id)
+        assert res.status_code == 200
+
+        res = await authorized_client.post(app.url_path_for("qso:export-adif", 
+            log_id=test_qso_log_created.id), json={"qso_filter": {}, "fields": fields})
+
+        assert res.status_code == 200
+        assert res.text.endswith(f"<RST_SENT:3>599 {extra_adif} <EOR>\n")
+
+    async def test_export_adif_etag(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_created: QsoInDB,
+        )-> None:
+
+        export_url = app.url_path_for("qso:export-adif", log_id=test_qso_created.log_id)
+        res = await authorized_client.post(export_url, json={"qso_filter": {}})
+        assert res.status_code == 200
+        etag = res.headers["ETag"]
+
+        res = await authorized_client.post(export_url, json={"qso_filter": {}}, 
+                headers={"If-None-Match": etag})
+        assert res.status_code == 304
+
+        res = await authorized_client.post(export_url, json={"qso_filter": {}})
+        assert res.status_code == 200
+        assert res.headers["ETag"] == etag
+        assert res.text.count("<EOR>") == 1
+
+        res = await qso_create_helper(app=app, 
+            client=authorized_client, 
+            qso_params={**test_qso_params, "qso_datetime": "2022-12-09T10:00:00Z"},
+            log_id=test_qso_created.log_id)
+        assert res.status_code == 200
+
+        res = await authorized_client.post(export_url, json={"qso_filter": {}}, 
+                headers={"If-None-Match": etag})
+        assert res.status_code == 200
+        assert res.headers["ETag"] != etag
+        assert res.text.count("<EOR>") == 2
+
+    async def test_export_adif_task_is_owner_only(self, *,
+        app: FastAPI, 
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_qso_created: QsoInDB,
+        )-> None:
+
+        export_url = app.url_path_for("qso:export-adif-task", log_id=test_qso_created.log_id)
+        res = await create_authorized_client(user=test_user2).post(export_url, json={"qso_filter": {}})
+        assert res.status_code == 403
+
+        res = await create_authorized_client(user=None).post(export_url, json={"qso_filter": {}})
+        assert res.status_code == 401
+
+    async def test_export_adif_task(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_created: QsoInDB,
+        db: Database,
+        monkeypatch,
+        )-> None:
+
+        progress = []
+        monkeypatch.setattr(task_adif_export, "update_state", 
+                lambda **kwargs: progress.append(kwargs["meta"]))
+        log = await QsoLogsRepository(db).get_log_by_id(id=test_qso_created.log_id)
+
+        #the task runs its own event loop
+        task = await asyncio.to_thread(task_adif_export.apply, kwargs={"log_id": log.id, 
+                "qso_filter": QsoFilter(), "fields": None, "export_format": AdifExportFormat.adi})
+
+        assert task.status == TaskStatus.SUCCESS
+        assert task.result["qso"] == log.qso_count
+        assert progress[-1] == {"exported": log.qso_count, "total": log.qso_count}
+        with open(full_path(task.result["url"][len(SRV_URI):])) as file:
+            assert file.read().count("<EOR>") == log.qso_count
+
+    async def test_export_adif_task_for_deleted_log(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_log_created: QsoLogInDB,
+        monkeypatch,
+        )-> None:
+
+        updates = []
+        monkeypatch.setattr(task_adif_export, "update_state", 
+                lambda **kwargs: updates.append((kwargs["state"], kwargs["meta"])))
+
+        res = await authorized_client.delete(app.url_path_for("qso-logs:delete-log", 
+            log_id=test_qso_log_created.id))
+        assert res.status_code == 200
+
+        task = await asyncio.to_thread(task_adif_export.apply, kwargs={"log_id": test_qso_log_created.id, 
+                "qso_filter": QsoFilter(), "fields": None, "export_format": AdifExportFormat.adi})
+
+        assert task.status == states.IGNORED
+        [(state, result)] = updates
+        assert state == TaskStatus.FAILURE
+        assert str(result) == "Qso log not found"
+
+    @pytest.mark.parametrize(
+        "freq, adif_freq",
+        (
+            (Decimal("14000.00"), "14.00"),
+            (Decimal("14074.00"), "14.074"),
+            (Decimal("18000.59"), "18.00059"),
+            (Decimal("0.00"), ""),
+        ),
+    )
+    def test_export_freq_format(self, freq: Decimal, adif_freq: str) -> None:
+        #as the original export wrote it: str(Decimal(freq)/1000)
+        assert adif_export_freq(freq) == adif_freq
+
+    def test_export_cache_evicts_old_versions(self, tmp_path) -> None:
+        cache = AdifExportCache(directory=str(tmp_path), max_bytes=35)
+        directory = full_path(str(tmp_path))
+        os.makedirs(directory)
+        for name in ("1-1-aaaa.adi", "1-2-aaaa.adi", "1-2-bbbb.adi.gz", "2-1-aaaa.adi", "2-1-bbbb.adi"):
+            with open(os.path.join(directory, name), "w") as file:
+                file.write("x" * 10)
+        os.utime(os.path.join(directory, "2-1-bbbb.adi"), (0, 0))
+
+        cache.evict()
+        assert sorted(os.listdir(directory)) == ["1-2-aaaa.adi", "1-2-bbbb.adi.gz", "2-1-aaaa.adi"]
+
+    async def test_export_cache_evicts_off_the_event_loop(self, tmp_path, monkeypatch) -> None:
+        cache = AdifExportCache(directory=str(tmp_path))
+        evict_threads = []
+        monkeypatch.setattr(cache, "evict", lambda: evict_threads.append(threading.get_ident()))
+
+        async def chunks():
+            yield "<EOR>"
+
+        async def is_current() -> bool:
+            return True
+
+        async for _ in cache.store(key="1-1-aaaa", export_format=AdifExportFormat.adi, 
+                chunks=chunks(), is_current=is_current):
+            pass
+        assert cache.get(key="1-1-aaaa", export_format=AdifExportFormat.adi)
+        assert len(evict_threads) == 1 and evict_threads[0] != threading.get_ident()
+
+ADIF_HEADER = "hambook test <ADIF_VER:5>3.1.0 <PROGRAMID:4>test <EOH>\n"
+
+def adif_record(idx: int) -> str:
+    fields = {
+        "CALL": f"R{idx % 10}AB{idx}",
+        "QSO_DATE": "20221208",
+        "TIME_ON": f"{idx % 24:02}{idx % 60:02}",
+        "BAND": "20M",
+        "MODE": "CW" if idx % 7 else "NOPE",
+        "RST_SENT": "599",
+        "RST_RCVD": "579",
+        #tags in field data must not split records
+        "COMMENT": f"<EOR> <eor>{idx}<CALL:4>ZZ9Z" if idx % 3 else "Тест",
+    }
+    return " ".join(f"<{name}:{len(value)}>{value}" for name, value in fields.items()) + " <EOR>\n"
+
+class TestAdifParse:
+
+    @pytest.mark.parametrize("chunk_size", (1, 100, 1000, 100000))
+    def test_text_chunks(self, chunk_size: int) -> None:
+        text = ADIF_HEADER + "".join(adif_record(idx) for idx in range(50))
+        chunks = list(adif_text_chunks(io.StringIO(text), chunk_size=chunk_size, block_size=64))
+
+        assert "".join(chunks) == text
+        assert all(chunk.endswith("<EOR>") for chunk in chunks[:-1])
+        assert ([fields for chunk in chunks for fields in adif_records(io.StringIO(chunk))] ==
+                list(adif_records(io.StringIO(text))))
+
+    def test_parallel_parse_matches_sequential(self, tmp_path) -> None:
+        file_path = tmp_path / "log.adi"
+        file_path.write_text(ADIF_HEADER + "".join(adif_record(idx) for idx in range(300)), 
+                encoding="utf-8")
+
+        def parse(**kwargs) -> tuple:
+            qso_errors = defaultdict(int)
+            qsos = list(parse_adif(str(file_path), {"callsign": "R7CL"}, qso_errors, **kwargs))
+            return qsos, dict(qso_errors)
+
+        qsos, qso_errors = parse()
+        assert len(qsos) == 300 - 43
+        assert qso_errors == {"Missing or invalid field MODE": 43}
+        assert qsos[0].extra["COMMENT"] == "<EOR> <EOR>1<CALL:4>ZZ9Z"
+        assert parse(workers=2, chunk_size=1000, block_size=256) == (qsos, qso_errors)
+
+class TestQsoBulkImport:
+
+    def qso(self, test_qso_params: dict, qso_datetime: str, callsign: str = "R7BLK") -> QsoBase:
+        return QsoBase(**{**test_qso_params, "callsign": callsign, "qso_datetime": qso_datetime})
+
+    async def test_bulk_dupes_are_checked_against_staged_qso(self, *,
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        db: Database) -> None:
+
+        qso_repo = QsoRepository(db)
+        log_id = test_qso_log_created.id
+        await qso_repo.create_qso(new_qso=self.qso(test_qso_params, "2022-12-08T12:00:00Z", "R7OLD"),
+                log_id=log_id)
+
+        qso_new, qso_dupes = await qso_repo.bulk_create_qso(log_id=log_id, qsos=[
+            #B is a dupe of A, C is a dupe of B: only A is kept
+            self.qso(test_qso_params, "2022-12-08T10:04:00Z"),
+            self.qso(test_qso_params, "2022-12-08T10:00:00Z"),
+            self.qso(test_qso_params, "2022-12-08T10:08:00Z"),
+            #dupe of the qso in the log
+            self.qso(test_qso_params, "2022-12-08T12:03:00Z", "R7OLD"),
+            self.qso(test_qso_params, "2022-12-08T10:20:00Z"),
+            ])
+        assert (qso_new, qso_dupes) == (2, 3)
+
+        qso_list = await qso_repo.get_qso_by_log_id(log_id=log_id, callsign_search="R7BLK")
+        assert sorted(qso.qso_datetime.isoformat() for qso in qso_list) == [
+                "2022-12-08T10:04:00+00:00", "2022-12-08T10:20:00+00:00"]
+        assert {float(qso.freq) for qso in qso_list} == {test_qso_params["freq"]}
+
+    async def test_concurrent_writes_are_not_duplicated(self, *,
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        db: Database) -> None:
+
+        log_id = test_qso_log_created.id
+        qso = self.qso(test_qso_params, "2022-12-08T18:00:00Z")
+
+        #a qso written but not committed yet on another connection: the import waits for it
+        writer_db, import_db = await connect_to_db(), await connect_to_db()
+        try:
+            async with writer_db.transaction():
+                await QsoRepository(writer_db).create_qso(new_qso=qso, log_id=log_id)
+                bulk_import = asyncio.create_task(
+                        QsoRepository(import_db).bulk_create_qso(log_id=log_id, qsos=[qso]))
+                await asyncio.sleep(0.5)
+                assert not bulk_import.done()
+            assert await bulk_import == (0, 1)
+        finally:
+            await writer_db.disconnect()
+            await import_db.disconnect()
+
+        qso_list = await QsoRepository(db).get_qso_by_log_id(log_id=log_id, callsign_search="R7BLK")
+        assert [qso.qso_datetime.hour for qso in qso_list].count(18) == 1
+
+    async def test_dupes_check_bypass_is_transaction_local(self, *,
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        db: Database) -> None:
+
+        qso_repo = QsoRepository(db)
+        log_id = test_qso_log_created.id
+        await qso_repo.create_qso(new_qso=self.qso(test_qso_params, "2022-12-08T10:00:00Z"), 
+                log_id=log_id)
+
+        async with db.transaction():
+            await db.execute(query=SKIP_QSO_DUPES_CHECK_QUERY)
+            await qso_repo.create_qso(new_qso=self.qso(test_qso_params, "2022-12-08T10:01:00Z"), 
+                    log_id=log_id)
+
+        with pytest.raises(DuplicateQsoError):
+            await qso_repo.create_qso(new_qso=self.qso(test_qso_params, "2022-12-08T10:02:00Z"), 
+                    log_id=log_id)
+        assert not await db.fetch_val(query="SELECT current_setting('hambook.skip_qso_dupes_check', true)")
+
+class TestQsoChanges:
+
+    async def test_changes_since_cursor(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        )-> None:
+
+        changes_url = app.url_path_for("qso:changes-since", log_id=test_qso_log_created.id)
+
+        qsos = []
+        for qso_datetime in ("2022-12-08T08:55:17Z", "2022-12-09T10:00:00Z"):
+            res = await qso_create_helper(app=app, 
+                client=authorized_client, 
+                qso_params={**test_qso_params, "qso_datetime": qso_datetime},
+                log_id=test_qso_log_created.id)
+            assert res.status_code == 200
+            qsos.append(QsoInDB(**res.json()))
+
+        res = await authorized_client.get(changes_url)
+        assert res.status_code == 200
+        changes = res.json()
+        assert [change["id"] for change in changes["changes"]] == [str(qso.id) for qso in qsos]
+        assert not any(change["deleted"] for change in changes["changes"])
+        assert changes["changes"][1]["qso"]["callsign"] == test_qso_params["callsign"]
+        cursor = changes["cursor"]
+        assert res.headers["X-Next-Cursor"] == cursor
+
+        res = await authorized_client.get(changes_url, query_string={"cursor": cursor})
+        assert res.status_code == 200
+        assert res.json() == {"changes": [], "cursor": cursor}
+
+        res = await qso_delete_helper(app=app, client=authorized_client, qso_id=qsos[0].id)
+        assert res.status_code == 200
+        res = await authorized_client.put(app.url_path_for("qso:update-qso", qso_id=qsos[1].id), 
+                json={"qso_update": {"rst_s": 559}})
+        assert res.status_code == 200
+
+        res = await authorized_client.get(changes_url, query_string={"cursor": cursor})
+        assert res.status_code == 200
+        changes = res.json()["changes"]
+        assert [(change["id"], change["deleted"]) for change in changes] == [
+                (str(qsos[0].id), True), (str(qsos[1].id), False)]
+        assert changes[0]["qso"] is None
+        assert changes[1]["qso"]["rst_s"] == 559
+
+        res = await authorized_client.get(changes_url, 
+                query_string={"cursor": cursor, "format": "adi", "limit": 1})
+        assert res.status_code == 200
+        assert res.text.endswith(f"<APP_HAMBOOK_ID:{len(str(qsos[0].id))}>{qsos[0].id}  "
+                "<APP_HAMBOOK_DELETED:1>Y  <EOR>\n")
+        next_cursor = res.headers["X-Next-Cursor"]
+
+        res = await authorized_client.get(changes_url, 
+                query_string={"cursor": next_cursor, "format": "adi"})
+        assert res.status_code == 200
+        assert f"<APP_HAMBOOK_ID:{len(str(qsos[1].id))}>{qsos[1].id}  <CALL:" in res.text
+        assert "<RST_SENT:3>559" in res.text
+
+        res = await authorized_client.get(changes_url, query_string={"cursor": "bad"})
+        assert res.status_code == 400
+
+class TestQsoEvents:
+
+    async def test_qso_events_are_notified(self, *,
+        app: FastAPI, 
+        authorized_client: TestClient,
+        test_qso_params: dict,
+        test_qso_log_created: QsoLogInDB,
+        )-> None:
+
+        async def next_event(subscription) -> dict:
+            message = await asyncio.wait_for(subscription.queue.get(), 5)
+            event_line, data_line = message.strip().split("\n")
+            event = json.loads(data_line.removeprefix("data: "))
+            assert event_line == f"event: {event['event']}"
+            return event
+
+        async with qso_events_service.subscribe(test_qso_log_created.id) as subscription:
+            res = await qso_create_helper(app=app, 
+                client=authorized_client, 
+                qso_params=test_qso_params,
+                log_id=test_qso_log_created.id)
+            assert res.status_code == 200
+            qso_id = res.json()["id"]
+
+            event = await next_event(subscription)
+            assert event["event"] == "create_qso"
+            assert event["log_id"] == str(test_qso_log_created.id)
+            assert event["qso"] == res.json()
+
+            res = await authorized_client.put(app.url_path_for("qso:update-qso", qso_id=qso_id), 
+                    json={"qso_update": {"rst_s": 559}})
+            assert res.status_code == 200
+            event = await next_event(subscription)
+            assert (event["event"], event["id"], event["qso"]["rst_s"]) == ("update_qso", qso_id, 559)
+
+            res = await qso_delete_helper(app=app, client=authorized_client, qso_id=qso_id)
+            assert res.status_code == 200
+            event = await next_event(subscription)
+            assert (event["event"], event["id"]) == ("delete_qso", qso_id)
+            assert "qso" not in event
+
+    async def test_qso_events_missing_log(self, *,
+        app: FastAPI, 
+        client: TestClient,
+        )-> None:
+
+        res = await client.get(app.url_path_for("qso:events", log_id=999999))
+        assert res.status_code == 404
+
+    async def test_qso_events_subscribers_limit(self) -> None:
+        events_service = QsoEventsService(max_subscribers=2)
+
+        async with events_service.subscribe(1, listen=False), events_service.subscribe(1, listen=False):
+            assert events_service.is_full(1)
+            with pytest.raises(QsoEventsSubscribersLimitError):
+                async with events_service.subscribe(1, listen=False):
+                    pass
+            async with events_service.subscribe(2, listen=False):
+                assert not events_service.is_full(2)
+
+        assert not events_service.is_full(1)
+        async with events_service.subscribe(1, listen=False):
+            assert events_service.subscribers(1) == 1
+
+    async def test_qso_events_full_log(self, *,
+        app: FastAPI, 
+        client: TestClient,
+        test_qso_log_created: QsoLogInDB,
+        )-> None:
+
+        async with AsyncExitStack() as stack:
+            for _ in range(QSO_EVENTS_MAX_SUBSCRIBERS):
+                await stack.enter_async_context(
+                        qso_events_service.subscribe(test_qso_log_created.id, listen=False))
+
+            res = await client.get(app.url_path_for("qso:events", log_id=test_qso_log_created.id))
+            assert res.status_code == 503
+
+#filter shape, order and the index the query is expected to run on. The planner may pick
+#the second index: a btree skip scan (postgres 18) for band and mode, and with the C
+#collation a plain btree index serves like prefix searches too
+QSO_FILTER_PLANS = (
+    ({}, QsoOrder.id, ("ix_qso_log_id_id",)),
+    ({}, QsoOrder.qso_datetime, ("ix_qso_log_id_qso_datetime_id",)),
+    ({"band": "20M"}, QsoOrder.id, ("ix_qso_log_id_id",)),
+    ({"qso_mode": "CW"}, QsoOrder.id, ("ix_qso_log_id_id",)),
+    ({"band": "20M", "qso_mode": "CW"}, QsoOrder.id, ("ix_qso_log_id_id", "ix_qso_log_id_dupes")),
+    ({"date_begin": date(2023, 6, 1)}, QsoOrder.qso_datetime, ("ix_qso_log_id_qso_datetime_id",)),
+    ({"date_end": date(2020, 3, 31)}, QsoOrder.qso_datetime, ("ix_qso_log_id_qso_datetime_id",)),
+    ({"date_begin": date(2022, 3, 1), "date_end": date(2022, 3, 31)}, QsoOrder.id, 
+        ("ix_qso_log_id_qso_datetime_id",)),
+    ({"band": "20M", "qso_mode": "CW", "date_begin": date(2022, 3, 1), "date_end": date(2022, 3, 31)}, 
+        QsoOrder.qso_datetime, ("ix_qso_log_id_qso_datetime_id",)),
+    ({"callsign_search": "R7AB5"}, QsoOrder.id, ("ix_qso_log_id_callsign_pattern", "ix_qso_log_id_dupes")),
+    ({"callsign_search": "R7A*"}, QsoOrder.id, ("ix_qso_log_id_callsign_pattern", "ix_qso_log_id_dupes")),
+    ({"callsign_search": "*/QRP"}, QsoOrder.id, ("ix_qso_log_id_callsign_reverse",)),
+    ({"callsign_search": "*7AB1*"}, QsoOrder.id, ("ix_qso_log_id_callsign_trgm",)),
+    ({"callsign_search": "R7*/QRP"}, QsoOrder.id, 
+        ("ix_qso_log_id_callsign_pattern", "ix_qso_log_id_callsign_trgm")),
+)
+
+class TestQsoQueryPlans:
+
+    def qsos(self) -> List[QsoBase]:
+        rnd = random.Random(1)
+        bands = ("160M", "80M", "40M", "30M", "20M", "17M", "15M", "12M", "10M")
+        qso_modes = ("CW", "SSB", "FT8", "RTTY")
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        return [QsoBase(
+            callsign=f"{rnd.choice('RUDK')}{rnd.randint(0, 9)}{rnd.choice('ABC')}{rnd.choice('ABC')}{idx}" + 
+                ("/QRP" if idx % 50 == 0 else ""),
+            station_callsign="R7CL",
+            qso_datetime=start + timedelta(minutes=idx * 1000 + rnd.randint(0, 500)),
+            band=rnd.choice(bands),
+            freq=14000,
+            qso_mode=rnd.choice(qso_modes),
+            rst_s=599,
+            rst_r=599) for idx in range(2000)]
+
+    async def test_qso_filters_use_indexes(self, *,
+        authorized_client: TestClient,
+        test_user: UserInDB,
+        test_qso_log_created: QsoLogInDB,
+        db: Database,
+        )-> None:
+
+        #the planner picks the indexes by the table statistics: the log is one of many
+        #of a realistic size, no planner method is switched off
+        qso_repo, qso_logs_repo = QsoRepository(db), QsoLogsRepository(db)
+        qsos = self.qsos()
+        await qso_repo.bulk_create_qso(qsos=qsos, log_id=test_qso_log_created.id)
+        for _ in range(20):
+            qso_log = await qso_logs_repo.create_log(requesting_user=test_user, 
+                    new_log=QsoLogBase(callsign="R7CL", description="query plans"))
+            await qso_repo.bulk_create_qso(qsos=qsos, log_id=qso_log.id)
+        await db.execute(query="ANALYZE qso;")
+
+        for qso_filter, order_by, indexes in QSO_FILTER_PLANS:
+            query, values = qso_by_log_id_query(log_id=test_qso_log_created.id, limit=50, 
+                    order_by=order_by, **qso_filter)
+            plan = await db.fetch_one(query=f"EXPLAIN (FORMAT JSON) {query}", values=values)
+
+            scans = [node.get("Index Name", node["Node Type"]) 
+                    for node in plan_nodes(json.loads(plan[0])[0]["Plan"]) 
+                    if "Index Name" in node or node["Node Type"] == "Seq Scan"]
+            assert scans[0] in indexes, (qso_filter, order_by, scans)
@@ -11,6 +11,7 @@ from databases import Database
 from app.models.user import UserInDB, UserPublic
 from app.models.qso_log import QsoLogBase, QsoLogInDB
 from app.db.repositories.qso_logs import QsoLogsRepository
+from app.services import qso_log_owners_service
 
 pytestmark = pytest.mark.anyio
 
@@ -43,6 +44,7 @@ class TestQsoLogDelete:
         qso_logs_repo = QsoLogsRepository(db)
         qso_log_in_db = await qso_logs_repo.get_log_by_id(id=test_qso_log_created.id)
         assert qso_log_in_db is None
+        assert qso_log_owners_service.get(test_qso_log_created.id) is None
 
     async def test_user_cannot_delete_non_existent_logs(self, *,
         app: FastAPI, 
@@ -1,5 +1,5 @@
 import pytest
-from typing import List, Union, Type, Optional
+from typing import Callable, List, Union, Type, Optional
 import jwt
 
 from pydantic import ValidationError
@@ -16,8 +16,8 @@ from starlette.status import (
     HTTP_422_UNPROCESSABLE_ENTITY,
 )
 
-from app.models.user import UserCreate, UserInDB, UserPublic
-from app.services import auth_service
+from app.models.user import UserCreate, UserInDB, UserPublic, UserAuth
+from app.services import auth_service, auth_users_service
 from databases import Database
 from app.db.repositories.users import UsersRepository
 from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES
@@ -195,6 +195,21 @@ class TestAuthTokens:
             userid = auth_service.get_userid_from_token(token=wrong_token, secret_key=str(secret))    
 
 
+    async def test_verified_tokens_are_cached(
+        self, app: FastAPI, client: TestClient, test_user: UserInDB
+    ) -> None:
+        token = auth_service.create_access_token_for_user(user=test_user, secret_key=str(SECRET_KEY))
+        auth_service.get_userid_from_token(token=token, secret_key=str(SECRET_KEY))
+        hits = auth_service.token_cache_hits
+        userid = auth_service.get_userid_from_token(token=token, secret_key=str(SECRET_KEY))
+        assert userid == test_user.id
+        assert auth_service.token_cache_hits == hits + 1
+        with pytest.raises(HTTPException):
+            auth_service.get_userid_from_token(token=token, secret_key=str(SECRET_KEY), 
+                    token_type='password reset')
+        with pytest.raises(HTTPException):
+            auth_service.get_userid_from_token(token=token, secret_key="ABC123")
+
 class TestUserLogin:
 	async def test_user_can_login_successfully_and_receives_valid_token(
 		self, app: FastAPI, client: TestClient, test_user: UserInDB, test_user_password_plain: str
@@ -279,6 +294,16 @@ class TestUserMe:
         )
         assert res.status_code == HTTP_401_UNAUTHORIZED
 
+class TestLoginMetrics:
+    async def test_login_metrics_are_admin_only(
+        self, app: FastAPI, client: TestClient, create_authorized_client: Callable, test_user: UserInDB,
+    ) -> None:
+        res = await client.get(app.url_path_for("users:login-metrics"))
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+        res = await create_authorized_client(user=test_user).get(app.url_path_for("users:login-metrics"))
+        assert res.status_code == (HTTP_200_OK if test_user.is_admin else status.HTTP_403_FORBIDDEN)
+
 class TestEmailVerification:
     async def test_authenticated_user_can_request_email_verification(
         self, app: FastAPI, authorized_client: TestClient, test_user: UserInDB,
@@ -303,11 +328,13 @@ class TestEmailVerification:
                 user=test_user, 
                 secret_key=str(SECRET_KEY), 
                 token_type='email verification')
+        auth_users_service.set(UserAuth(**test_user.dict()))
         res = await client.get(app.url_path_for("users:email-verification", token=token))
         assert res.status_code == HTTP_200_OK
         user_repo = UsersRepository(db)
         user_in_db = await user_repo.get_user_by_email(email=test_user.email)
         assert user_in_db.email_verified
+        assert auth_users_service.get(test_user.id) is None
 
     async def test_user_cannnot_verify_email_if_already_verified(
         self, 